@@ -35,9 +35,29 @@ def create_app(config_class=Config):
     # Initialize JWT
     jwt = JWTManager(app)
     
+    @jwt.token_in_blocklist_loader
+    def check_token_revoked(jwt_header, jwt_payload):
+        # Only access tokens carry role/company claims that can go stale
+        if jwt_payload.get('type') != 'access':
+            return False
+        from models.token_revocation_model import TOKEN_VERSION_CLAIM, is_token_revoked
+        return is_token_revoked(jwt_payload['sub'], jwt_payload.get(TOKEN_VERSION_CLAIM))
+    
     # Initialize database
     init_db(app)
     
+    # Warm in-process caches used by terminal hot paths
+    from services.employee_directory import warm_directory
+    warm_directory()
+    
+    from services.employee_search import build_search_index
+    build_search_index()
+    
+    # Monthly vacation accrual and ledger reconciliation
+    if app.config.get('BACKGROUND_JOBS_ENABLED'):
+        from services.vacation_balance import schedule_balance_jobs
+        schedule_balance_jobs()
+    
     # Register blueprints
     from routes.auth_routes import auth_bp
     from routes.user_routes import user_bp
@@ -50,6 +70,9 @@ def create_app(config_class=Config):
     from routes.fingerprint_routes import fingerprint_bp
     from routes.attendance_routes import attendance_bp
     from routes.terminal_routes import terminal_bp
+    from routes.device_routes import device_bp
+    from routes.job_routes import job_bp
+    from routes.holiday_routes import holiday_bp
     
     # Register the IN-APP notification routes (for navbar)
     from routes.notif_routes import notif_bp  # This should have /unread-count route
@@ -71,6 +94,9 @@ def create_app(config_class=Config):
     app.register_blueprint(fingerprint_bp, url_prefix='/api/fingerprint')
     app.register_blueprint(attendance_bp, url_prefix='/api/attendance')
     app.register_blueprint(terminal_bp, url_prefix='/api/terminal')
+    app.register_blueprint(device_bp, url_prefix='/api/devices')
+    app.register_blueprint(job_bp, url_prefix='/api/jobs')
+    app.register_blueprint(holiday_bp, url_prefix='/api/holidays')
 
     @app.route('/api/health', methods=['GET'])
     def health_check():
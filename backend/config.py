@@ -28,6 +28,26 @@ class Config:
     SMTP_USE_TLS = os.environ.get('SMTP_USE_TLS', 'True') == 'True'
     SMTP_FROM_EMAIL = os.environ.get('SMTP_FROM_EMAIL') or 'noreply@hrmanagement.com'
     
+    # Terminal API rate limiting (token bucket per device_id, or per IP)
+    TERMINAL_RATE_LIMIT_PER_SECOND = float(os.environ.get('TERMINAL_RATE_LIMIT_PER_SECOND') or 5)
+    TERMINAL_RATE_LIMIT_BURST = int(os.environ.get('TERMINAL_RATE_LIMIT_BURST') or 30)
+    # Checked on every request as well, whatever device_id is sent (size it for the terminals behind one NAT)
+    TERMINAL_IP_RATE_LIMIT_PER_SECOND = float(os.environ.get('TERMINAL_IP_RATE_LIMIT_PER_SECOND') or 50)
+    TERMINAL_IP_RATE_LIMIT_BURST = int(os.environ.get('TERMINAL_IP_RATE_LIMIT_BURST') or 300)
+    
+    # Password hashing (bcrypt cost and bounded worker pool)
+    PASSWORD_HASH_ROUNDS = int(os.environ.get('PASSWORD_HASH_ROUNDS') or 12)
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS') or os.cpu_count() or 2)
+    PASSWORD_HASH_MAX_QUEUE = int(os.environ.get('PASSWORD_HASH_MAX_QUEUE') or 256)
+    PASSWORD_HASH_QUEUE_TIMEOUT = float(os.environ.get('PASSWORD_HASH_QUEUE_TIMEOUT') or 5)
+    # Bulk imports hash on a process pool; a lower cost is upgraded to
+    # PASSWORD_HASH_ROUNDS on each user's first login
+    PASSWORD_IMPORT_HASH_ROUNDS = int(os.environ.get('PASSWORD_IMPORT_HASH_ROUNDS') or 10)
+    PASSWORD_IMPORT_WORKERS = int(os.environ.get('PASSWORD_IMPORT_WORKERS') or os.cpu_count() or 2)
+    
+    # Periodic background jobs (vacation accrual, ledger reconciliation)
+    BACKGROUND_JOBS_ENABLED = os.environ.get('BACKGROUND_JOBS_ENABLED', 'True') == 'True'
+    
     # Application
     APP_NAME = 'HR Management System'
     FRONTEND_URL = os.environ.get('FRONTEND_URL') or 'http://localhost:3000'
@@ -29,6 +29,18 @@ def init_db(app):
         # Create default admin if not exists
         create_default_admin()
         
+        # Align the ID allocator with existing users
+        from models.counter_model import seed_employee_sequence
+        seed_employee_sequence()
+        
+        # Backfill canonical project membership on older projects
+        from models.project_model import migrate_project_members
+        migrate_project_members()
+        
+        # Backfill real leave dates (start_at/end_at) on older leaves
+        from models.leave_model import migrate_leave_dates
+        migrate_leave_dates()
+        
     except ConnectionFailure as e:
         logger.error(f"Failed to connect to MongoDB: {e}")
         raise
@@ -40,20 +52,71 @@ def create_indexes():
         db.users.create_index([("email", ASCENDING)], unique=True)
         db.users.create_index([("employee_id", ASCENDING)], unique=True)
         db.users.create_index([("company_id", ASCENDING)])
+        db.users.create_index([("company_id", ASCENDING), ("site_id", ASCENDING)])
         db.users.create_index([("role", ASCENDING)])
+        db.users.create_index([("biometric_id", ASCENDING)])
+        db.users.create_index([("sync_version", ASCENDING)])
+        
+        # Enrollment work queue (pending users, oldest first)
+        db.users.create_index([("has_fingerprint", ASCENDING), ("created_at", ASCENDING)])
+        db.users.create_index([("fingerprint_status", ASCENDING), ("created_at", ASCENDING)])
+        
+        # Employees dashboard: role/company filters with the default (last_name, _id) sort
+        db.users.create_index([("role", ASCENDING), ("last_name", ASCENDING), ("_id", ASCENDING)])
+        db.users.create_index([("company_id", ASCENDING), ("role", ASCENDING), ("last_name", ASCENDING), ("_id", ASCENDING)])
+        db.users.create_index([("department", ASCENDING), ("role", ASCENDING)])
+        
+        # Leased ID blocks (offline terminal enrollment)
+        db.id_blocks.create_index([("device_id", ASCENDING), ("start", ASCENDING)])
         
         # Leaves collection
         db.leaves.create_index([("user_id", ASCENDING)])
         db.leaves.create_index([("status", ASCENDING)])
         db.leaves.create_index([("start_date", DESCENDING)])
+        db.leaves.create_index([("user_id", ASCENDING), ("start_date", DESCENDING)])
+        # Leave statistics per company / per employee
+        db.leaves.create_index([("company_id", ASCENDING), ("status", ASCENDING)])
+        db.leaves.create_index([("user_id", ASCENDING), ("status", ASCENDING)])
+        # Used vacation days ($group of approved annual leaves per user)
+        db.leaves.create_index([("status", ASCENDING), ("leave_type", ASCENDING), ("user_id", ASCENDING)])
+        # Team calendar / overlap checks (intervals intersecting a date range)
+        db.leaves.create_index([("company_id", ASCENDING), ("start_at", ASCENDING), ("end_at", ASCENDING)])
+        db.leaves.create_index([("company_id", ASCENDING), ("end_at", ASCENDING)])
+        
+        # Attendance logs (per-employee history, newest first)
+        db.attendance.create_index([("employee_id", ASCENDING), ("timestamp", DESCENDING)])
+        
+        # Employee documents
+        db.documents.create_index([("user_id", ASCENDING)])
         
         # Salary advances collection
         db.salary_advances.create_index([("user_id", ASCENDING)])
         db.salary_advances.create_index([("status", ASCENDING)])
         db.salary_advances.create_index([("request_date", DESCENDING)])
+        db.salary_advances.create_index([("company_id", ASCENDING), ("status", ASCENDING)])
+        db.salary_advances.create_index([("user_id", ASCENDING), ("status", ASCENDING)])
+        
+        # Devices collection (terminal registry)
+        db.devices.create_index([("device_id", ASCENDING)], unique=True)
+        
+        # Terminal telemetry (one bucket per device per hour, 30 days retention)
+        db.terminal_telemetry.create_index([("device_id", ASCENDING), ("hour", ASCENDING)], unique=True)
+        db.terminal_telemetry.create_index([("hour", ASCENDING)], expireAfterSeconds=30 * 24 * 3600)
+        
+        # Token revocations (only needed while revoked access tokens can still be valid)
+        db.token_revocations.create_index([("user_id", ASCENDING)], unique=True)
+        db.token_revocations.create_index([("revoked_at", ASCENDING)], expireAfterSeconds=2 * 24 * 3600)
+        
+        # Background jobs (active job lookup per type)
+        db.jobs.create_index([("type", ASCENDING), ("status", ASCENDING), ("created_at", DESCENDING)])
         
         # Projects collection
-        db.projects.create_index([("company_id", ASCENDING)])
+        db.projects.create_index([("company_id", ASCENDING), ("status", ASCENDING)])
+        db.projects.create_index([("member_ids", ASCENDING)])
+        
+        # Holiday calendars (company_id null = every company)
+        db.holidays.create_index([("company_id", ASCENDING), ("date", ASCENDING)], unique=True)
+        db.holidays.create_index([("company_id", ASCENDING), ("year", ASCENDING)])
         
         # Companies collection
         db.companies.create_index([("name", ASCENDING)])
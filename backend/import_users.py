@@ -0,0 +1,54 @@
+"""
+Bulk import employees from a CSV or NDJSON file
+Usage: python import_users.py <file> --company-id <id> [--format csv|ndjson]
+                              [--default-password <pw>] [--dry-run]
+"""
+from database import init_db
+from flask import Flask
+from config import Config
+import argparse
+import json
+import time
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def run_import():
+    """Validate and import every row, printing per-row errors"""
+    parser = argparse.ArgumentParser(description='Bulk import employees')
+    parser.add_argument('file', help='CSV (with header row) or NDJSON file')
+    parser.add_argument('--company-id', required=True)
+    parser.add_argument('--format', choices=['csv', 'ndjson'])
+    parser.add_argument('--default-password', help='Password for rows without one')
+    parser.add_argument('--dry-run', action='store_true', help='Validate only')
+    args = parser.parse_args()
+    
+    # Initialize Flask app and database
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    init_db(app)
+    
+    from services.user_import import detect_format, import_users
+    
+    with open(args.file, encoding='utf-8-sig') as f:
+        text = f.read()
+    
+    started = time.monotonic()
+    summary = import_users(
+        text,
+        detect_format(args.file, explicit=args.format),
+        args.company_id,
+        default_password=args.default_password,
+        dry_run=args.dry_run
+    )
+    elapsed = time.monotonic() - started
+    
+    for error in summary['errors']:
+        logger.warning(f"Row {error['row']}: {error['error']}")
+    
+    logger.info(json.dumps({key: summary[key] for key in ('total', 'valid', 'created', 'failed', 'dry_run')}))
+    logger.info(f"✅ Import finished in {elapsed:.1f}s")
+
+if __name__ == '__main__':
+    run_import()
@@ -0,0 +1,27 @@
+"""
+Rebuild canonical project membership (member_ids) from assigned_users/assigned_employees
+Safe to run repeatedly; only projects whose membership differs are rewritten
+"""
+from database import init_db
+from flask import Flask
+from config import Config
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def migrate_members():
+    """Normalize mixed ObjectId/string assignment arrays into member_ids"""
+    # Initialize Flask app and database
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    init_db(app)
+    
+    from models.project_model import sync_project_members
+    
+    updated = sync_project_members()
+    
+    logger.info(f"✅ Updated member_ids on {updated} projects")
+
+if __name__ == '__main__':
+    migrate_members()
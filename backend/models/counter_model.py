@@ -0,0 +1,222 @@
+"""
+Counter Model - Atomic sequence allocation backed by the counters collection
+"""
+from database import get_db
+from pymongo import ReturnDocument
+from datetime import datetime, timedelta
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Shared sequence used for both employee_id (EMP####) and biometric_id (####)
+EMPLOYEE_SEQUENCE = 'employee_number'
+
+# Device slots 1-21 are reserved on the biometric terminals
+MIN_EMPLOYEE_NUMBER = 22
+
+# Bumped on every user write; terminals sync deltas against it
+USERS_VERSION_SEQUENCE = 'users_version'
+
+# An in-flight users version older than this belongs to a writer that died
+USERS_VERSION_STAMP_TIMEOUT = timedelta(minutes=1)
+
+def get_next_sequence(name, count=1):
+    """
+    Atomically reserve `count` consecutive values from a named sequence.
+    Returns the first reserved value.
+    """
+    db = get_db()
+    counter = db.counters.find_one_and_update(
+        {'_id': name},
+        {'$inc': {'seq': count}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return counter['seq'] - count + 1
+
+def bump_sequence(name, value):
+    """
+    Make sure a sequence never hands out `value` or anything below it
+    (used when an ID is assigned explicitly instead of allocated)
+    """
+    db = get_db()
+    db.counters.update_one(
+        {'_id': name},
+        {'$max': {'seq': int(value)}},
+        upsert=True
+    )
+
+def get_current_sequence(name):
+    """Read the last value handed out by a sequence (0 if never used)"""
+    db = get_db()
+    counter = db.counters.find_one({'_id': name})
+    return counter['seq'] if counter else 0
+
+def begin_users_version():
+    """
+    Allocate a users version and record it as in flight, in one update, until
+    end_users_version is called once the users are stamped with it
+    """
+    db = get_db()
+    counter = db.counters.find_one_and_update(
+        {'_id': USERS_VERSION_SEQUENCE},
+        [
+            {'$set': {'seq': {'$add': [{'$ifNull': ['$seq', 0]}, 1]}}},
+            {'$set': {'pending': {'$concatArrays': [
+                {'$ifNull': ['$pending', []]},
+                [{'version': '$seq', 'at': '$$NOW'}]
+            ]}}}
+        ],
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return counter['seq']
+
+def end_users_version(version):
+    """Mark a users version as stamped (also drops in-flight versions of dead writers)"""
+    db = get_db()
+    db.counters.update_one(
+        {'_id': USERS_VERSION_SEQUENCE},
+        {'$pull': {'pending': {'$or': [
+            {'version': version},
+            {'at': {'$lt': datetime.utcnow() - USERS_VERSION_STAMP_TIMEOUT}}
+        ]}}}
+    )
+
+def get_stamped_users_version():
+    """
+    Highest users version below every in-flight one: every user changed up
+    to it already carries its sync_version, so a delta read after this call
+    is complete up to it
+    """
+    db = get_db()
+    counter = db.counters.find_one({'_id': USERS_VERSION_SEQUENCE})
+    if not counter:
+        return 0
+    cutoff = datetime.utcnow() - USERS_VERSION_STAMP_TIMEOUT
+    in_flight = [pending['version'] for pending in counter.get('pending', []) if pending['at'] >= cutoff]
+    return min([counter['seq']] + [version - 1 for version in in_flight])
+
+def seed_employee_sequence():
+    """
+    Align the employee sequence with existing users so allocation never
+    collides with IDs created before the counter existed
+    """
+    try:
+        db = get_db()
+        highest = MIN_EMPLOYEE_NUMBER - 1
+
+        last_user = db.users.find_one(
+            {'biometric_id': {'$exists': True, '$gte': MIN_EMPLOYEE_NUMBER}},
+            {'biometric_id': 1},
+            sort=[('biometric_id', -1)]
+        )
+        if last_user:
+            try:
+                highest = max(highest, int(last_user['biometric_id']))
+            except (TypeError, ValueError):
+                pass
+
+        bump_sequence(EMPLOYEE_SEQUENCE, highest)
+        logger.info(f"Employee sequence seeded at {highest}")
+    except Exception as e:
+        logger.error(f"Error seeding employee sequence: {e}")
+
+def allocate_employee_number():
+    """
+    Allocate the next free employee number (>= 22).
+    Skips numbers whose EMP#### id was already taken manually.
+    """
+    db = get_db()
+    while True:
+        number = get_next_sequence(EMPLOYEE_SEQUENCE)
+        if number < MIN_EMPLOYEE_NUMBER:
+            bump_sequence(EMPLOYEE_SEQUENCE, MIN_EMPLOYEE_NUMBER - 1)
+            continue
+        if not db.users.find_one({'employee_id': format_employee_id(number)}, {'_id': 1}):
+            return number
+
+def peek_employee_number():
+    """
+    The number allocate_employee_number would hand out next, without
+    consuming it (a later allocation may still take it first)
+    """
+    db = get_db()
+    number = max(get_current_sequence(EMPLOYEE_SEQUENCE) + 1, MIN_EMPLOYEE_NUMBER)
+    while db.users.find_one({'employee_id': format_employee_id(number)}, {'_id': 1}):
+        number += 1
+    return number
+
+def format_employee_id(number):
+    """Format an employee number as EMP####"""
+    return f"EMP{number:04d}"
+
+def lease_employee_block(device_id, size):
+    """
+    Reserve a contiguous block of employee numbers for a terminal so it can
+    enroll users offline. The lease is recorded in the id_blocks collection
+    and reconciled later through the batch user-create endpoint.
+    """
+    db = get_db()
+
+    start = get_next_sequence(EMPLOYEE_SEQUENCE, size)
+    if start < MIN_EMPLOYEE_NUMBER:
+        bump_sequence(EMPLOYEE_SEQUENCE, MIN_EMPLOYEE_NUMBER - 1)
+        start = get_next_sequence(EMPLOYEE_SEQUENCE, size)
+    end = start + size - 1
+
+    # Legacy EMP#### ids created outside the allocator must not be reused
+    taken = db.users.find(
+        {'employee_id': {'$in': [format_employee_id(n) for n in range(start, end + 1)]}},
+        {'employee_id': 1, '_id': 0}
+    )
+    excluded = sorted(int(doc['employee_id'][3:]) for doc in taken)
+
+    block = {
+        'device_id': device_id,
+        'start': start,
+        'end': end,
+        'size': size,
+        'excluded': excluded,
+        'leased_at': datetime.utcnow()
+    }
+    result = db.id_blocks.insert_one(block)
+    block['_id'] = str(result.inserted_id)
+
+    logger.info(f"Leased employee numbers {start}-{end} to device {device_id}")
+    return block
+
+def get_device_blocks(device_id):
+    """Get all ID blocks leased to a device"""
+    db = get_db()
+    return list(db.id_blocks.find(
+        {'device_id': device_id},
+        {'start': 1, 'end': 1, 'excluded': 1, '_id': 0}
+    ))
+
+def reserve_employee_numbers(count):
+    """
+    Reserve `count` free employee numbers (>= 22) with one allocator call
+    per block; numbers whose EMP#### id is already taken are skipped and
+    topped up from a further block
+    """
+    db = get_db()
+    numbers = []
+
+    while len(numbers) < count:
+        needed = count - len(numbers)
+        start = get_next_sequence(EMPLOYEE_SEQUENCE, needed)
+        if start < MIN_EMPLOYEE_NUMBER:
+            bump_sequence(EMPLOYEE_SEQUENCE, MIN_EMPLOYEE_NUMBER - 1)
+            continue
+
+        candidates = list(range(start, start + needed))
+        taken = {
+            doc['employee_id'] for doc in db.users.find(
+                {'employee_id': {'$in': [format_employee_id(n) for n in candidates]}},
+                {'employee_id': 1, '_id': 0}
+            )
+        }
+        numbers.extend(n for n in candidates if format_employee_id(n) not in taken)
+
+    return numbers
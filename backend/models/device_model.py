@@ -0,0 +1,105 @@
+"""
+Device Model - Registry of biometric terminals and the site they serve
+"""
+from database import get_db
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEVICE_FIELDS = ['name', 'site_id', 'company_id', 'location', 'is_active']
+
+def register_device(device_id, device_data):
+    """
+    Create or update a device registration
+    """
+    try:
+        db = get_db()
+        update_data = {field: device_data[field] for field in DEVICE_FIELDS if field in device_data}
+        update_data['updated_at'] = datetime.utcnow()
+
+        db.devices.update_one(
+            {'device_id': device_id},
+            {
+                '$set': update_data,
+                '$setOnInsert': {'device_id': device_id, 'created_at': datetime.utcnow()}
+            },
+            upsert=True
+        )
+
+        return get_device(device_id)
+    except Exception as e:
+        logger.error(f"Error registering device: {e}")
+        return None
+
+def get_device(device_id):
+    """
+    Get a device registration by device ID
+    """
+    try:
+        db = get_db()
+        device = db.devices.find_one({'device_id': device_id})
+        if device:
+            device['_id'] = str(device['_id'])
+        return device
+    except Exception as e:
+        logger.error(f"Error getting device: {e}")
+        return None
+
+def get_all_devices(filters=None):
+    """
+    Get all registered devices with optional filters
+    """
+    try:
+        db = get_db()
+        query = {}
+
+        if filters:
+            if 'company_id' in filters:
+                query['company_id'] = filters['company_id']
+            if 'site_id' in filters:
+                query['site_id'] = filters['site_id']
+
+        devices = list(db.devices.find(query).sort('device_id', 1))
+        for device in devices:
+            device['_id'] = str(device['_id'])
+        return devices
+    except Exception as e:
+        logger.error(f"Error getting devices: {e}")
+        return []
+
+def delete_device(device_id):
+    """
+    Remove a device registration
+    """
+    try:
+        db = get_db()
+        result = db.devices.delete_one({'device_id': device_id})
+        return result.deleted_count > 0
+    except Exception as e:
+        logger.error(f"Error deleting device: {e}")
+        return False
+
+def get_device_scope(device_id):
+    """
+    Users query restricting sync payloads to the device's site.
+    Users without a site_id belong to every site of their company, so a
+    terminal with a site still syncs them; users assigned to another site
+    are left out.
+    Returns None for unknown devices (they keep receiving everything).
+    """
+    if not device_id:
+        return None
+
+    device = get_device(device_id)
+    if not device:
+        return None
+
+    scope = {}
+    if device.get('company_id'):
+        scope['company_id'] = device['company_id']
+    if device.get('site_id'):
+        # $in with None also matches users that have no site_id field
+        scope['site_id'] = {'$in': [device['site_id'], None]}
+
+    return scope or None
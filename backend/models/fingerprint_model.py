@@ -1,10 +1,37 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from database import get_db
+from models.user_model import user_changed
+from models.counter_model import allocate_employee_number
+from pymongo import ReturnDocument, ASCENDING
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Active users still waiting for a fingerprint
+PENDING_ENROLLMENT_QUERY = {
+    '$or': [
+        {'has_fingerprint': False},
+        {'has_fingerprint': {'$exists': False}},
+        {'fingerprint_status': 'PENDING'}
+    ],
+    'is_active': True
+}
+
+PENDING_ENROLLMENT_PROJECTION = {
+    'employee_id': 1,
+    'biometric_id': 1,
+    'first_name': 1,
+    'last_name': 1,
+    'full_name': 1,
+    'department': 1,
+    'position': 1,
+    'fingerprint_status': 1,
+    'created_at': 1,
+    'enrollment_lease': 1,
+    '_id': 0
+}
+
 class FingerprintModel:
     """
     Fingerprint metadata model (NOT storing raw biometric data)
@@ -78,6 +105,7 @@ class FingerprintModel:
             {'employee_id': employee_id},
             {'$set': user_update}
         )
+        user_changed({'employee_id': employee_id})
         
         logger.info(f"Fingerprint enrolled for user {employee_id}" + 
                    (" with template backup" if template_data else ""))
@@ -124,6 +152,7 @@ class FingerprintModel:
                 {'employee_id': employee_id},
                 {'$set': user_update}
             )
+            user_changed({'employee_id': employee_id})
             
             logger.info(f"Fingerprint template updated for user {employee_id}")
             
@@ -163,19 +192,27 @@ class FingerprintModel:
         )
         
         if result.modified_count > 0:
+            user_changed({'employee_id': employee_id})
             logger.info(f"Fingerprint removed for user {employee_id}")
             return {'success': True, 'message': 'Fingerprint removed successfully'}
         else:
             return {'success': False, 'error': 'User not found'}
     
     @staticmethod
-    def get_enrolled_templates() -> Dict[str, str]:
-        """Get all enrolled fingerprint templates"""
+    def get_enrolled_templates(scope: Optional[Dict[str, Any]] = None) -> Dict[str, str]:
+        """
+        Get enrolled fingerprint templates
+        scope: optional users query (e.g. a device's company/site) limiting the result
+        """
         db = get_db()
         
+        query = {'is_active': True}
+        if scope:
+            query['employee_id'] = {'$in': db.users.distinct('employee_id', scope)}
+        
         templates = {}
-        for template in db.fingerprints.find({'is_active': True}):
-            templates[template['employee_id']] = template['template_id']
+        for template in db.fingerprints.find(query, {'employee_id': 1, 'template_id': 1, '_id': 0}):
+            templates[template['employee_id']] = template.get('template_id')
         
         return templates
     
@@ -195,11 +232,76 @@ class FingerprintModel:
             }
         return None
 
+    @staticmethod
+    def claim_pending_enrollment(device_id: str, lease_seconds: int) -> Optional[Dict[str, Any]]:
+        """
+        Atomically lease the oldest pending enrollment to a terminal.
+        Leases that were not confirmed before expiring go back to the queue.
+        """
+        db = get_db()
+        now = datetime.utcnow()
+        
+        user = db.users.find_one_and_update(
+            {
+                '$and': [
+                    PENDING_ENROLLMENT_QUERY,
+                    {'$or': [
+                        {'enrollment_lease': None},
+                        {'enrollment_lease.expires_at': {'$lte': now}}
+                    ]}
+                ]
+            },
+            {
+                '$set': {
+                    'enrollment_lease': {
+                        'device_id': device_id,
+                        'claimed_at': now,
+                        'expires_at': now + timedelta(seconds=lease_seconds)
+                    }
+                },
+                '$inc': {'enrollment_attempts': 1}
+            },
+            projection=PENDING_ENROLLMENT_PROJECTION,
+            sort=[('created_at', ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+        
+        if not user:
+            return None
+        
+        if 'full_name' not in user or not user['full_name']:
+            user['full_name'] = f"{user.get('first_name', '')} {user.get('last_name', '')}".strip()
+        user.setdefault('fingerprint_status', 'PENDING')
+        
+        # Terminals enroll by biometric_id, make sure the work item has one
+        if not user.get('biometric_id'):
+            user['biometric_id'] = allocate_employee_number()
+            db.users.update_one(
+                {'employee_id': user['employee_id']},
+                {'$set': {'biometric_id': user['biometric_id']}}
+            )
+            user_changed({'employee_id': user['employee_id']})
+        
+        logger.info(f"Enrollment for {user['employee_id']} leased to {device_id} for {lease_seconds}s")
+        return user
+    
+    @staticmethod
+    def release_pending_enrollment(device_id: str, employee_id: str) -> bool:
+        """Give a leased enrollment back to the queue before its lease expires"""
+        db = get_db()
+        
+        result = db.users.update_one(
+            {'employee_id': employee_id, 'enrollment_lease.device_id': device_id},
+            {'$unset': {'enrollment_lease': ''}}
+        )
+        
+        return result.modified_count > 0
+
 # Module-level functions for backward compatibility
 def update_fingerprint_template(employee_id: str, template_id: str, device_id: str) -> Dict[str, Any]:
     """Wrapper function for backward compatibility"""
     return FingerprintModel.update_fingerprint_template(employee_id, template_id, device_id)
 
-def get_enrolled_templates() -> Dict[str, str]:
+def get_enrolled_templates(scope: Optional[Dict[str, Any]] = None) -> Dict[str, str]:
     """Wrapper function for backward compatibility"""
-    return FingerprintModel.get_enrolled_templates()
\ No newline at end of file
+    return FingerprintModel.get_enrolled_templates(scope)
\ No newline at end of file
@@ -0,0 +1,80 @@
+"""
+Holiday Model - Public holidays per company (company_id None = every company)
+"""
+from database import get_db
+from bson.objectid import ObjectId
+from pymongo.errors import DuplicateKeyError
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _serialize(holiday):
+    holiday['_id'] = str(holiday['_id'])
+    holiday['date'] = holiday['date'].strftime('%Y-%m-%d')
+    return holiday
+
+def create_holiday(holiday_data):
+    """
+    Create a holiday; holiday_data['date'] must be a midnight datetime
+    """
+    try:
+        db = get_db()
+        holiday_data['year'] = holiday_data['date'].year
+        holiday_data['created_at'] = datetime.utcnow()
+
+        result = db.holidays.insert_one(holiday_data)
+
+        return {'success': True, 'holiday_id': str(result.inserted_id)}
+    except DuplicateKeyError:
+        return {'success': False, 'error': 'A holiday already exists on this date'}
+    except Exception as e:
+        logger.error(f"Error creating holiday: {e}")
+        return {'success': False, 'error': str(e)}
+
+def get_holiday_by_id(holiday_id):
+    """Get holiday by ID"""
+    try:
+        db = get_db()
+        holiday = db.holidays.find_one({'_id': ObjectId(holiday_id)})
+        return _serialize(holiday) if holiday else None
+    except Exception as e:
+        logger.error(f"Error getting holiday: {e}")
+        return None
+
+def get_holidays(company_id=None, year=None, include_global=True):
+    """
+    Holidays of a company (plus the global ones), optionally for one year
+    """
+    try:
+        db = get_db()
+        companies = [company_id]
+        if include_global and company_id is not None:
+            companies.append(None)
+        query = {'company_id': {'$in': companies}}
+        if year:
+            query['year'] = int(year)
+
+        return [_serialize(holiday) for holiday in db.holidays.find(query).sort('date', 1)]
+    except Exception as e:
+        logger.error(f"Error getting holidays: {e}")
+        return []
+
+def get_holiday_dates(company_id=None):
+    """All holiday dates (datetimes) applying to a company"""
+    db = get_db()
+    companies = [None] if company_id is None else [company_id, None]
+    return [
+        holiday['date'] for holiday in
+        db.holidays.find({'company_id': {'$in': companies}}, {'date': 1, '_id': 0})
+    ]
+
+def delete_holiday(holiday_id):
+    """Delete a holiday"""
+    try:
+        db = get_db()
+        result = db.holidays.delete_one({'_id': ObjectId(holiday_id)})
+        return result.deleted_count > 0
+    except Exception as e:
+        logger.error(f"Error deleting holiday: {e}")
+        return False
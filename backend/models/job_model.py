@@ -0,0 +1,117 @@
+"""
+Job Model - Status and progress of background jobs (jobs collection)
+"""
+from database import get_db
+from bson.objectid import ObjectId
+from datetime import datetime, timedelta
+import logging
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+
+ACTIVE_JOB_STATUSES = (JOB_QUEUED, JOB_RUNNING)
+
+# A running job that hasn't reported progress for this long died with its process
+JOB_STALE_AFTER = timedelta(minutes=10)
+
+def create_job(job_type, created_by=None, params=None):
+    """Record a queued job, returns its id"""
+    db = get_db()
+    now = datetime.utcnow()
+    result = db.jobs.insert_one({
+        'type': job_type,
+        'status': JOB_QUEUED,
+        'params': params or {},
+        'created_by': created_by,
+        'processed': 0,
+        'total': None,
+        'result': None,
+        'error': None,
+        'rerun': False,
+        'created_at': now,
+        'updated_at': now,
+        'started_at': None,
+        'finished_at': None
+    })
+    return str(result.inserted_id)
+
+def start_job(job_id):
+    db = get_db()
+    now = datetime.utcnow()
+    db.jobs.update_one(
+        {'_id': ObjectId(job_id)},
+        {'$set': {'status': JOB_RUNNING, 'started_at': now, 'updated_at': now}}
+    )
+
+def update_job_progress(job_id, processed, total=None):
+    """Report progress (also serves as the job's heartbeat)"""
+    db = get_db()
+    fields = {'processed': processed, 'updated_at': datetime.utcnow()}
+    if total is not None:
+        fields['total'] = total
+    db.jobs.update_one({'_id': ObjectId(job_id)}, {'$set': fields})
+
+def complete_job(job_id, result=None):
+    db = get_db()
+    now = datetime.utcnow()
+    db.jobs.update_one(
+        {'_id': ObjectId(job_id)},
+        {'$set': {'status': JOB_COMPLETED, 'result': result, 'finished_at': now, 'updated_at': now}}
+    )
+
+def fail_job(job_id, error):
+    db = get_db()
+    now = datetime.utcnow()
+    db.jobs.update_one(
+        {'_id': ObjectId(job_id)},
+        {'$set': {'status': JOB_FAILED, 'error': str(error), 'finished_at': now, 'updated_at': now}}
+    )
+
+def request_job_rerun(job_id):
+    """
+    Ask an active job to run again once it finishes
+    False if it already finished (the caller should submit a new one)
+    """
+    db = get_db()
+    result = db.jobs.update_one(
+        {'_id': ObjectId(job_id), 'status': {'$in': list(ACTIVE_JOB_STATUSES)}},
+        {'$set': {'rerun': True}}
+    )
+    return result.matched_count > 0
+
+def take_job_rerun(job_id):
+    """Clear a finished job's rerun request, True if there was one"""
+    db = get_db()
+    result = db.jobs.update_one({'_id': ObjectId(job_id), 'rerun': True}, {'$set': {'rerun': False}})
+    return result.modified_count > 0
+
+def get_job(job_id):
+    """Get a job by id, None if missing or the id is invalid"""
+    try:
+        db = get_db()
+        job = db.jobs.find_one({'_id': ObjectId(job_id)})
+        if job:
+            job['_id'] = str(job['_id'])
+        return job
+    except Exception as e:
+        logger.error(f"Error getting job: {e}")
+        return None
+
+def find_active_job(job_type):
+    """A queued/running job of this type that is still alive, if any"""
+    db = get_db()
+    job = db.jobs.find_one(
+        {
+            'type': job_type,
+            'status': {'$in': list(ACTIVE_JOB_STATUSES)},
+            'updated_at': {'$gte': datetime.utcnow() - JOB_STALE_AFTER}
+        },
+        sort=[('created_at', -1)]
+    )
+    if job:
+        job['_id'] = str(job['_id'])
+    return job
@@ -3,11 +3,85 @@ Leave Model - Database operations for leave management
 """
 from database import get_db
 from bson.objectid import ObjectId
-from datetime import datetime
+from pymongo import UpdateOne, ReturnDocument
+from datetime import datetime, date
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Callables notified with the company_id after every leave write
+# (the team calendar's per-company interval trees subscribe here)
+_leave_change_listeners = []
+
+MIGRATION_BATCH_SIZE = 1000
+
+def on_leave_changed(listener):
+    """
+    Register a listener for leave writes
+    """
+    _leave_change_listeners.append(listener)
+    return listener
+
+def leave_changed(company_id):
+    """Notify listeners that a company's leaves changed"""
+    for listener in _leave_change_listeners:
+        try:
+            listener(company_id)
+        except Exception as e:
+            logger.error(f"Error notifying leave change listeners: {e}")
+
+def parse_leave_date(value):
+    """
+    Leave start/end date (stored as 'YYYY-MM-DD' or ISO strings) as a
+    midnight datetime, None if unusable
+    """
+    if isinstance(value, datetime):
+        return datetime(value.year, value.month, value.day)
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    if isinstance(value, str) and value:
+        try:
+            parsed = datetime.fromisoformat(value[:10])
+        except ValueError:
+            return None
+        return datetime(parsed.year, parsed.month, parsed.day)
+    return None
+
+def _leave_dates(leave):
+    """start_at/end_at fields for a leave's string dates"""
+    return {
+        'start_at': parse_leave_date(leave.get('start_date')),
+        'end_at': parse_leave_date(leave.get('end_date'))
+    }
+
+def migrate_leave_dates():
+    """
+    Backfill start_at/end_at on leaves that predate them (idempotent)
+    """
+    try:
+        db = get_db()
+        updated = 0
+        operations = []
+        cursor = db.leaves.find(
+            {'start_at': {'$exists': False}},
+            {'start_date': 1, 'end_date': 1},
+            batch_size=MIGRATION_BATCH_SIZE
+        )
+        for leave in cursor:
+            operations.append(UpdateOne({'_id': leave['_id']}, {'$set': _leave_dates(leave)}))
+            if len(operations) >= MIGRATION_BATCH_SIZE:
+                updated += db.leaves.bulk_write(operations, ordered=False).modified_count
+                operations = []
+        if operations:
+            updated += db.leaves.bulk_write(operations, ordered=False).modified_count
+        
+        if updated:
+            logger.info(f"Backfilled start_at/end_at on {updated} leaves")
+        return updated
+    except Exception as e:
+        logger.error(f"Error migrating leave dates: {e}")
+        return 0
+
 def create_leave_request(leave_data):
     """
     Create a new leave request
@@ -16,9 +90,11 @@ def create_leave_request(leave_data):
         db = get_db()
         leave_data['created_at'] = datetime.utcnow()
         leave_data.setdefault('status', 'pending')
+        leave_data.update(_leave_dates(leave_data))
         
         result = db.leaves.insert_one(leave_data)
         
+        leave_changed(leave_data.get('company_id'))
         return str(result.inserted_id)
     except Exception as e:
         logger.error(f"Error creating leave request: {e}")
@@ -38,13 +114,13 @@ def get_leave_by_id(leave_id):
         logger.error(f"Error getting leave by ID: {e}")
         return None
 
-def get_leaves_by_user(user_id):
+def get_leaves_by_user(user_id, projection=None):
     """
     Get all leave requests for a specific user
     """
     try:
         db = get_db()
-        leaves = list(db.leaves.find({'user_id': user_id}).sort('created_at', -1))
+        leaves = list(db.leaves.find({'user_id': user_id}, projection).sort('created_at', -1))
         for leave in leaves:
             leave['_id'] = str(leave['_id'])
         return leaves
@@ -52,7 +128,7 @@ def get_leaves_by_user(user_id):
         logger.error(f"Error getting leaves by user: {e}")
         return []
 
-def get_all_leaves(filters=None):
+def get_all_leaves(filters=None, projection=None):
     """
     Get all leave requests with optional filters
     """
@@ -68,7 +144,7 @@ def get_all_leaves(filters=None):
             if 'user_id' in filters:
                 query['user_id'] = filters['user_id']
         
-        leaves = list(db.leaves.find(query).sort('created_at', -1))
+        leaves = list(db.leaves.find(query, projection).sort('created_at', -1))
         for leave in leaves:
             leave['_id'] = str(leave['_id'])
         return leaves
@@ -76,15 +152,19 @@ def get_all_leaves(filters=None):
         logger.error(f"Error getting all leaves: {e}")
         return []
 
-def update_leave_status(leave_id, status, reviewed_by=None, review_notes=None):
+def update_leave_status(leave_id, status, reviewed_by=None, review_notes=None, from_statuses=None):
     """
     Update leave request status
+    With from_statuses the change only applies if the leave is still in one
+    of them, so concurrent reviews can't both apply their balance change
     """
     try:
         db = get_db()
+        now = datetime.utcnow()
         update_data = {
             'status': status,
-            'reviewed_at': datetime.utcnow()
+            'reviewed_at': now,
+            'updated_at': now
         }
         
         if reviewed_by:
@@ -92,25 +172,38 @@ def update_leave_status(leave_id, status, reviewed_by=None, review_notes=None):
         if review_notes:
             update_data['review_notes'] = review_notes
         
-        result = db.leaves.update_one(
-            {'_id': ObjectId(leave_id)},
-            {'$set': update_data}
+        query = {'_id': ObjectId(leave_id)}
+        if from_statuses:
+            query['status'] = {'$in': list(from_statuses)}
+        
+        leave = db.leaves.find_one_and_update(
+            query,
+            {'$set': update_data},
+            projection={'company_id': 1},
+            return_document=ReturnDocument.AFTER
         )
         
-        return result.modified_count > 0 or result.matched_count > 0
+        if leave:
+            leave_changed(leave.get('company_id'))
+        return leave is not None
     except Exception as e:
         logger.error(f"Error updating leave status: {e}")
         return False
 
-def delete_leave(leave_id):
+def delete_leave(leave_id, status=None):
     """
-    Delete a leave request
+    Delete a leave request (only if still in status, when given)
     """
     try:
         db = get_db()
-        result = db.leaves.delete_one({'_id': ObjectId(leave_id)})
+        query = {'_id': ObjectId(leave_id)}
+        if status:
+            query['status'] = status
+        leave = db.leaves.find_one_and_delete(query, projection={'company_id': 1})
         
-        return result.deleted_count > 0
+        if leave:
+            leave_changed(leave.get('company_id'))
+        return leave is not None
     except Exception as e:
         logger.error(f"Error deleting leave: {e}")
         return False
@@ -128,14 +221,25 @@ def get_leave_statistics(user_id=None, company_id=None):
         if company_id:
             query['company_id'] = company_id
         
-        leaves = list(db.leaves.find(query))
+        # One document back whatever the history size
+        totals = next(db.leaves.aggregate([
+            {'$match': query},
+            {'$group': {
+                '_id': None,
+                'total': {'$sum': 1},
+                'pending': {'$sum': {'$cond': [{'$eq': ['$status', 'pending']}, 1, 0]}},
+                'approved': {'$sum': {'$cond': [{'$eq': ['$status', 'approved']}, 1, 0]}},
+                'rejected': {'$sum': {'$cond': [{'$eq': ['$status', 'rejected']}, 1, 0]}},
+                'total_days': {'$sum': {'$cond': [{'$eq': ['$status', 'approved']}, '$days', 0]}}
+            }}
+        ]), {})
         
         stats = {
-            'total': len(leaves),
-            'pending': len([l for l in leaves if l.get('status') == 'pending']),
-            'approved': len([l for l in leaves if l.get('status') == 'approved']),
-            'rejected': len([l for l in leaves if l.get('status') == 'rejected']),
-            'total_days': sum(l.get('days', 0) for l in leaves if l.get('status') == 'approved')
+            'total': totals.get('total', 0),
+            'pending': totals.get('pending', 0),
+            'approved': totals.get('approved', 0),
+            'rejected': totals.get('rejected', 0),
+            'total_days': totals.get('total_days', 0)
         }
         
         return stats
@@ -3,11 +3,64 @@ Project Model - Database operations for project management
 """
 from database import get_db
 from bson.objectid import ObjectId
+from pymongo import UpdateOne
 from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
 
+# assigned_users/assigned_employees hold a mix of ObjectIds and strings;
+# member_ids is their canonical union as string ids (multikey indexed)
+MEMBERSHIP_FIELDS = ('assigned_users', 'assigned_employees')
+
+def _member_ids(*id_lists):
+    """Union of user id lists as unique strings, in first-seen order"""
+    members = []
+    for ids in id_lists:
+        for uid in ids or []:
+            uid = str(uid)
+            if uid not in members:
+                members.append(uid)
+    return members
+
+def _id_forms(user_id):
+    """Both stored forms of a user id (string and ObjectId when valid)"""
+    forms = [str(user_id)]
+    if ObjectId.is_valid(str(user_id)):
+        forms.append(ObjectId(str(user_id)))
+    return forms
+
+def sync_project_members(query=None):
+    """
+    Rebuild member_ids from the legacy assignment arrays for matching projects
+    """
+    db = get_db()
+    projection = {field: 1 for field in MEMBERSHIP_FIELDS}
+    projection['member_ids'] = 1
+    
+    operations = []
+    for project in db.projects.find(query or {}, projection):
+        members = _member_ids(*(project.get(field) for field in MEMBERSHIP_FIELDS))
+        if project.get('member_ids') != members:
+            operations.append(UpdateOne({'_id': project['_id']}, {'$set': {'member_ids': members}}))
+    
+    if operations:
+        db.projects.bulk_write(operations, ordered=False)
+    return len(operations)
+
+def migrate_project_members():
+    """
+    Backfill member_ids on projects that predate it (idempotent)
+    """
+    try:
+        updated = sync_project_members({'member_ids': {'$exists': False}})
+        if updated:
+            logger.info(f"Backfilled member_ids on {updated} projects")
+        return updated
+    except Exception as e:
+        logger.error(f"Error migrating project members: {e}")
+        return 0
+
 def create_project(project_data):
     """
     Create a new project
@@ -18,6 +71,9 @@ def create_project(project_data):
         project_data.setdefault('status', 'planning')
         project_data.setdefault('assigned_employees', [])
         project_data.setdefault('assigned_users', [])
+        project_data['member_ids'] = _member_ids(
+            *(project_data.get(field) for field in MEMBERSHIP_FIELDS)
+        )
         
         result = db.projects.insert_one(project_data)
         
@@ -40,7 +96,7 @@ def get_project_by_id(project_id):
         logger.error(f"Error getting project by ID: {e}")
         return None
 
-def get_all_projects(filters=None):
+def get_all_projects(filters=None, projection=None):
     """
     Get all projects with optional filters
     """
@@ -54,7 +110,7 @@ def get_all_projects(filters=None):
             if 'status' in filters:
                 query['status'] = filters['status']
         
-        projects = list(db.projects.find(query).sort('created_at', -1))
+        projects = list(db.projects.find(query, projection).sort('created_at', -1))
         for project in projects:
             project['_id'] = str(project['_id'])
         return projects
@@ -62,22 +118,14 @@ def get_all_projects(filters=None):
         logger.error(f"Error getting all projects: {e}")
         return []
 
-def get_user_projects(user_id):
+def get_user_projects(user_id, projection=None):
     """
     Get projects assigned to a specific user
     """
     try:
         db = get_db()
-        user_object_id = ObjectId(user_id)
         
-        projects = list(db.projects.find({
-            '$or': [
-                {'assigned_users': user_object_id},
-                {'assigned_users': user_id},
-                {'assigned_employees': user_object_id},
-                {'assigned_employees': user_id}
-            ]
-        }).sort('created_at', -1))
+        projects = list(db.projects.find({'member_ids': str(user_id)}, projection).sort('created_at', -1))
         
         for project in projects:
             project['_id'] = str(project['_id'])
@@ -86,6 +134,17 @@ def get_user_projects(user_id):
         logger.error(f"Error getting user projects: {e}")
         return []
 
+def user_has_projects(user_id):
+    """
+    Check whether a user is assigned to at least one project (one indexed lookup)
+    """
+    try:
+        db = get_db()
+        return db.projects.find_one({'member_ids': str(user_id)}, {'_id': 1}) is not None
+    except Exception as e:
+        logger.error(f"Error checking user projects: {e}")
+        return False
+
 def update_project(project_id, update_data):
     """
     Update project information
@@ -99,6 +158,9 @@ def update_project(project_id, update_data):
             {'$set': update_data}
         )
         
+        if any(field in update_data for field in MEMBERSHIP_FIELDS):
+            sync_project_members({'_id': ObjectId(project_id)})
+        
         return result.modified_count > 0 or result.matched_count > 0
     except Exception as e:
         logger.error(f"Error updating project: {e}")
@@ -129,7 +191,13 @@ def assign_users_to_project(project_id, user_ids):
         
         result = db.projects.update_one(
             {'_id': ObjectId(project_id)},
-            {'$addToSet': {'assigned_users': {'$each': object_ids}}}
+            {
+                '$addToSet': {
+                    'assigned_users': {'$each': object_ids},
+                    'member_ids': {'$each': _member_ids(object_ids)}
+                },
+                '$set': {'updated_at': datetime.utcnow()}
+            }
         )
         
         return result.modified_count > 0 or result.matched_count > 0
@@ -147,7 +215,14 @@ def assign_employee_to_project(project_id, user_id):
         
         result = db.projects.update_one(
             {'_id': ObjectId(project_id)},
-            {'$addToSet': {'assigned_users': user_object_id, 'assigned_employees': user_object_id}}
+            {
+                '$addToSet': {
+                    'assigned_users': user_object_id,
+                    'assigned_employees': user_object_id,
+                    'member_ids': str(user_object_id)
+                },
+                '$set': {'updated_at': datetime.utcnow()}
+            }
         )
         
         return result.modified_count > 0 or result.matched_count > 0
@@ -161,11 +236,24 @@ def remove_user_from_project(project_id, user_id):
     """
     try:
         db = get_db()
-        user_object_id = ObjectId(user_id)
+        id_forms = _id_forms(user_id)
         
+        # Pull both stored forms so legacy string entries are removed too
+        # (only from projects holding one, so updated_at moves on real removals)
         result = db.projects.update_one(
-            {'_id': ObjectId(project_id)},
-            {'$pull': {'assigned_users': user_object_id, 'assigned_employees': user_object_id}}
+            {'_id': ObjectId(project_id), '$or': [
+                {'assigned_users': {'$in': id_forms}},
+                {'assigned_employees': {'$in': id_forms}},
+                {'member_ids': str(user_id)}
+            ]},
+            {
+                '$pull': {
+                    'assigned_users': {'$in': id_forms},
+                    'assigned_employees': {'$in': id_forms},
+                    'member_ids': str(user_id)
+                },
+                '$set': {'updated_at': datetime.utcnow()}
+            }
         )
         
         return result.modified_count > 0
@@ -190,14 +278,20 @@ def get_project_statistics(company_id=None):
         if company_id:
             query['company_id'] = company_id
         
-        projects = list(db.projects.find(query))
+        # Count per status in the database, only a few rows come back
+        counts = {
+            row['_id']: row['count'] for row in db.projects.aggregate([
+                {'$match': query},
+                {'$group': {'_id': '$status', 'count': {'$sum': 1}}}
+            ])
+        }
         
         stats = {
-            'total': len(projects),
-            'planning': len([p for p in projects if p.get('status') == 'planning']),
-            'in_progress': len([p for p in projects if p.get('status') == 'in_progress']),
-            'completed': len([p for p in projects if p.get('status') == 'completed']),
-            'on_hold': len([p for p in projects if p.get('status') == 'on_hold'])
+            'total': sum(counts.values()),
+            'planning': counts.get('planning', 0),
+            'in_progress': counts.get('in_progress', 0),
+            'completed': counts.get('completed', 0),
+            'on_hold': counts.get('on_hold', 0)
         }
         
         return stats
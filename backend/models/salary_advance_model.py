@@ -38,13 +38,13 @@ def get_salary_advance_by_id(advance_id):
         logger.error(f"Error getting salary advance by ID: {e}")
         return None
 
-def get_salary_advances_by_user(user_id):
+def get_salary_advances_by_user(user_id, projection=None):
     """
     Get all salary advance requests for a specific user
     """
     try:
         db = get_db()
-        advances = list(db.salary_advances.find({'user_id': user_id}).sort('created_at', -1))
+        advances = list(db.salary_advances.find({'user_id': user_id}, projection).sort('created_at', -1))
         for advance in advances:
             advance['_id'] = str(advance['_id'])
         return advances
@@ -52,7 +52,7 @@ def get_salary_advances_by_user(user_id):
         logger.error(f"Error getting salary advances by user: {e}")
         return []
 
-def get_all_salary_advances(filters=None):
+def get_all_salary_advances(filters=None, projection=None):
     """
     Get all salary advance requests with optional filters
     """
@@ -68,7 +68,7 @@ def get_all_salary_advances(filters=None):
             if 'user_id' in filters:
                 query['user_id'] = filters['user_id']
         
-        advances = list(db.salary_advances.find(query).sort('created_at', -1))
+        advances = list(db.salary_advances.find(query, projection).sort('created_at', -1))
         for advance in advances:
             advance['_id'] = str(advance['_id'])
         return advances
@@ -82,9 +82,11 @@ def update_salary_advance_status(advance_id, status, reviewed_by=None, review_no
     """
     try:
         db = get_db()
+        now = datetime.utcnow()
         update_data = {
             'status': status,
-            'reviewed_at': datetime.utcnow()
+            'reviewed_at': now,
+            'updated_at': now
         }
         
         if reviewed_by:
@@ -128,28 +130,30 @@ def get_salary_advance_statistics(user_id=None, company_id=None):
         if company_id:
             query['company_id'] = company_id
         
-        advances = list(db.salary_advances.find(query))
-        
-        # Calculate total amount, ensuring all amounts are numbers
-        total_amount = 0
-        for a in advances:
-            if a.get('status') == 'approved':
-                amount = a.get('amount', 0)
-                # Convert to float if it's a string
-                if isinstance(amount, str):
-                    try:
-                        total_amount += float(amount)
-                    except (ValueError, TypeError):
-                        pass
-                else:
-                    total_amount += float(amount) if amount else 0
+        # One document back whatever the history size; amounts stored as
+        # strings are converted, unparseable ones count as 0
+        totals = next(db.salary_advances.aggregate([
+            {'$match': query},
+            {'$group': {
+                '_id': None,
+                'total': {'$sum': 1},
+                'pending': {'$sum': {'$cond': [{'$eq': ['$status', 'pending']}, 1, 0]}},
+                'approved': {'$sum': {'$cond': [{'$eq': ['$status', 'approved']}, 1, 0]}},
+                'rejected': {'$sum': {'$cond': [{'$eq': ['$status', 'rejected']}, 1, 0]}},
+                'total_amount': {'$sum': {'$cond': [
+                    {'$eq': ['$status', 'approved']},
+                    {'$convert': {'input': '$amount', 'to': 'double', 'onError': 0, 'onNull': 0}},
+                    0
+                ]}}
+            }}
+        ]), {})
         
         stats = {
-            'total': len(advances),
-            'pending': len([a for a in advances if a.get('status') == 'pending']),
-            'approved': len([a for a in advances if a.get('status') == 'approved']),
-            'rejected': len([a for a in advances if a.get('status') == 'rejected']),
-            'total_amount': total_amount
+            'total': totals.get('total', 0),
+            'pending': totals.get('pending', 0),
+            'approved': totals.get('approved', 0),
+            'rejected': totals.get('rejected', 0),
+            'total_amount': totals.get('total_amount', 0)
         }
         
         return stats
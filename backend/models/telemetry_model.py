@@ -0,0 +1,197 @@
+"""
+Telemetry Model - Terminal heartbeats aggregated into hourly buckets
+One document per device per hour, updated in place with $inc/$max so the
+collection grows with fleet size x retention, not with heartbeat volume.
+"""
+from database import get_db
+from datetime import datetime, timedelta
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the scan-to-ack latency histogram buckets; the last
+# bucket catches everything slower
+LATENCY_BUCKETS_MS = [25, 50, 100, 200, 400, 800, 1600, 3200, 6400]
+
+def _bucket_index(latency_ms):
+    for index, bound in enumerate(LATENCY_BUCKETS_MS):
+        if latency_ms <= bound:
+            return index
+    return len(LATENCY_BUCKETS_MS)
+
+def _bucket_field(index):
+    return f'latency_hist.b{index}'
+
+def record_heartbeat(device_id, data, site_id=None, company_id=None):
+    """
+    Fold one heartbeat into the device's bucket for the current hour
+    data: queue_depth, sync_version, latencies_ms (list) or latency_ms, errors (int or {type: count})
+    """
+    db = get_db()
+    now = datetime.utcnow()
+    hour = now.replace(minute=0, second=0, microsecond=0)
+
+    inc = {'heartbeats': 1}
+    set_fields = {'last_seen': now}
+    max_fields = {}
+
+    if site_id:
+        set_fields['site_id'] = site_id
+    if company_id:
+        set_fields['company_id'] = company_id
+
+    latencies = data.get('latencies_ms')
+    if latencies is None and data.get('latency_ms') is not None:
+        latencies = [data['latency_ms']]
+    latencies = [float(l) for l in (latencies or []) if l is not None and float(l) >= 0]
+    if latencies:
+        inc['latency_count'] = len(latencies)
+        inc['latency_sum_ms'] = sum(latencies)
+        max_fields['latency_max_ms'] = max(latencies)
+        for latency in latencies:
+            field = _bucket_field(_bucket_index(latency))
+            inc[field] = inc.get(field, 0) + 1
+
+    errors = data.get('errors')
+    if isinstance(errors, dict):
+        for error_type, count in errors.items():
+            key = str(error_type).replace('.', '_').replace('$', '_')
+            inc[f'errors.{key}'] = inc.get(f'errors.{key}', 0) + int(count)
+        inc['errors_total'] = sum(int(count) for count in errors.values())
+    elif errors:
+        inc['errors_total'] = int(errors)
+
+    if data.get('queue_depth') is not None:
+        set_fields['queue_depth'] = int(data['queue_depth'])
+        max_fields['queue_depth_max'] = int(data['queue_depth'])
+
+    if data.get('sync_version') is not None:
+        set_fields['last_sync_version'] = data['sync_version']
+
+    update = {'$inc': inc, '$set': set_fields}
+    if max_fields:
+        update['$max'] = max_fields
+
+    db.terminal_telemetry.update_one(
+        {'device_id': device_id, 'hour': hour},
+        update,
+        upsert=True
+    )
+
+    return {'device_id': device_id, 'hour': hour.isoformat(), 'latency_samples': len(latencies)}
+
+def _percentile(histogram, total, fraction):
+    """Upper bound of the bucket holding the given fraction of samples"""
+    if not total:
+        return None
+    threshold = total * fraction
+    running = 0
+    for index in range(len(LATENCY_BUCKETS_MS) + 1):
+        running += histogram[index]
+        if running >= threshold:
+            return LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else None
+    return None
+
+def _summarize(group):
+    histogram = [group.get(f'b{index}', 0) for index in range(len(LATENCY_BUCKETS_MS) + 1)]
+    samples = group.get('latency_count', 0)
+    summary = {
+        'heartbeats': group.get('heartbeats', 0),
+        'errors': group.get('errors_total', 0),
+        'queue_depth_max': group.get('queue_depth_max'),
+        'latency_samples': samples,
+        'latency_avg_ms': round(group['latency_sum_ms'] / samples, 1) if samples else None,
+        'latency_max_ms': group.get('latency_max_ms'),
+        # Percentiles are bucket upper bounds; None above the last bucket
+        'latency_p50_ms': _percentile(histogram, samples, 0.50),
+        'latency_p95_ms': _percentile(histogram, samples, 0.95),
+        'latency_p99_ms': _percentile(histogram, samples, 0.99),
+        'latency_histogram': dict(zip(
+            [f'<={bound}' for bound in LATENCY_BUCKETS_MS] + [f'>{LATENCY_BUCKETS_MS[-1]}'],
+            histogram
+        ))
+    }
+    return summary
+
+def get_fleet_telemetry(hours=24, company_id=None):
+    """
+    Fleet-wide and per-site/per-device latency percentiles over the last `hours`
+    """
+    db = get_db()
+    since = datetime.utcnow().replace(minute=0, second=0, microsecond=0) - timedelta(hours=hours - 1)
+
+    match = {'hour': {'$gte': since}}
+    if company_id:
+        match['company_id'] = company_id
+
+    sums = {
+        'heartbeats': {'$sum': '$heartbeats'},
+        'errors_total': {'$sum': '$errors_total'},
+        'latency_count': {'$sum': '$latency_count'},
+        'latency_sum_ms': {'$sum': '$latency_sum_ms'},
+        'latency_max_ms': {'$max': '$latency_max_ms'},
+        'queue_depth_max': {'$max': '$queue_depth_max'}
+    }
+    for index in range(len(LATENCY_BUCKETS_MS) + 1):
+        sums[f'b{index}'] = {'$sum': f'$latency_hist.b{index}'}
+
+    per_device = list(db.terminal_telemetry.aggregate([
+        {'$match': match},
+        {'$sort': {'hour': 1}},
+        {'$group': {
+            '_id': '$device_id',
+            'site_id': {'$last': '$site_id'},
+            'queue_depth': {'$last': '$queue_depth'},
+            'last_sync_version': {'$last': '$last_sync_version'},
+            'last_seen': {'$last': '$last_seen'},
+            **sums
+        }}
+    ]))
+
+    max_keys = ('latency_max_ms', 'queue_depth_max')
+
+    def empty_totals():
+        return {key: None if key in max_keys else 0 for key in sums}
+
+    fleet = empty_totals()
+    sites = {}
+    devices = []
+
+    for group in per_device:
+        summary = _summarize(group)
+        summary.update({
+            'device_id': group['_id'],
+            'site_id': group.get('site_id'),
+            'queue_depth': group.get('queue_depth'),
+            'last_sync_version': group.get('last_sync_version'),
+            'last_seen': group.get('last_seen')
+        })
+        devices.append(summary)
+
+        site = sites.setdefault(group.get('site_id'), empty_totals())
+        for target in (fleet, site):
+            for key in sums:
+                value = group.get(key)
+                if value is None:
+                    continue
+                if key in max_keys:
+                    target[key] = value if target[key] is None else max(target[key], value)
+                else:
+                    target[key] += value
+
+    # Slowest devices first (p95 above the last bucket counts as slowest)
+    def p95_rank(device):
+        if device['latency_p95_ms'] is not None:
+            return device['latency_p95_ms']
+        return float('inf') if device['latency_samples'] else -1
+
+    devices.sort(key=p95_rank, reverse=True)
+
+    return {
+        'hours': hours,
+        'since': since.isoformat(),
+        'fleet': _summarize(fleet),
+        'sites': [dict(site_id=site_id, devices=sum(1 for d in devices if d['site_id'] == site_id), **_summarize(site))
+                  for site_id, site in sites.items()],
+        'devices': devices
+    }
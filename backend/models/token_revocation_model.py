@@ -0,0 +1,96 @@
+"""
+Token Revocation Model - Invalidates access tokens whose embedded claims went stale
+Access tokens carry role/company_id claims, so demoting, moving or
+deactivating a user records a revocation version; tokens carrying an older
+token_version claim are rejected. The (small) revocation list is cached in
+memory and refreshed periodically.
+"""
+from database import get_db
+from models.counter_model import get_current_sequence, get_next_sequence
+from datetime import datetime, timedelta
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# User fields embedded as access token claims
+TOKEN_CLAIM_FIELDS = ('role', 'company_id')
+
+# Claim holding the revocation version a token was issued at; the sequence
+# is global and never goes back, so revocations that expired from the
+# list can't make an old version valid again
+TOKEN_VERSION_CLAIM = 'token_version'
+TOKEN_VERSION_SEQUENCE = 'token_version'
+
+# How often each process re-reads the revocation list
+REVOCATION_REFRESH_SECONDS = 30
+
+# Only revocations younger than the longest access token lifetime matter
+REVOCATION_WINDOW = timedelta(hours=24)
+
+_revocations = {}
+_loaded_at = 0.0
+_lock = threading.Lock()
+
+def get_token_version():
+    """
+    Version to embed in a new access token
+    Read it before the user document the claims come from: a revocation
+    landing in between then leaves the token below the new version.
+    """
+    return get_current_sequence(TOKEN_VERSION_SEQUENCE)
+
+def revoke_user_tokens(user_id):
+    """
+    Reject every access token issued to user_id until now
+    """
+    try:
+        db = get_db()
+        version = get_next_sequence(TOKEN_VERSION_SEQUENCE)
+        db.token_revocations.update_one(
+            {'user_id': str(user_id)},
+            {'$set': {'revoked_at': datetime.utcnow()}, '$max': {'token_version': version}},
+            upsert=True
+        )
+        with _lock:
+            _revocations[str(user_id)] = max(version, _revocations.get(str(user_id), 0))
+        logger.info(f"Access tokens revoked for user {user_id}")
+    except Exception as e:
+        logger.error(f"Error revoking tokens: {e}")
+
+def refresh_revocations(force=False):
+    """
+    Reload the revocation list if it is older than the refresh interval
+    """
+    global _revocations, _loaded_at
+
+    if not force and time.monotonic() - _loaded_at < REVOCATION_REFRESH_SECONDS:
+        return
+
+    try:
+        db = get_db()
+        since = datetime.utcnow() - REVOCATION_WINDOW
+        revocations = {
+            doc['user_id']: doc.get('token_version', 0)
+            for doc in db.token_revocations.find(
+                {'revoked_at': {'$gte': since}},
+                {'user_id': 1, 'token_version': 1, '_id': 0}
+            )
+        }
+        with _lock:
+            _revocations = revocations
+            _loaded_at = time.monotonic()
+    except Exception as e:
+        logger.error(f"Error refreshing token revocations: {e}")
+
+def is_token_revoked(user_id, token_version=None):
+    """
+    True if the token was issued at a version below the user's last revocation
+    Tokens without a version claim predate it and are rejected once revoked.
+    """
+    refresh_revocations()
+    revoked_version = _revocations.get(str(user_id))
+    if revoked_version is None:
+        return False
+    return token_version is None or token_version < revoked_version
@@ -3,13 +3,90 @@
 Data Model - Consolidated database operations
 """
 from database import get_db
+from utils.projection_utils import exclude_forbidden, includes
+from utils.password_utils import (
+    PasswordHashingBusy, check_password, hash_password, hash_passwords, is_password_hash, needs_rehash
+)
+from models.token_revocation_model import TOKEN_CLAIM_FIELDS, revoke_user_tokens
+from models.counter_model import (
+    EMPLOYEE_SEQUENCE, MIN_EMPLOYEE_NUMBER,
+    allocate_employee_number, begin_users_version, bump_sequence, end_users_version, format_employee_id
+)
 from bson.objectid import ObjectId
-from datetime import datetime
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 import logging
-import bcrypt
+import re
 
 logger = logging.getLogger(__name__)
 
+# Fields deciding which terminals sync a user (see device_model.get_device_scope)
+SYNC_SCOPE_FIELDS = ('company_id', 'site_id')
+
+# Earlier company/site pairs kept per user, so terminals of those scopes
+# are told to drop the user in delta syncs
+PREVIOUS_SCOPES_KEPT = 5
+
+# Callables notified with the fresh user documents after every user write
+# (in-process caches such as the employee directory subscribe here)
+_user_change_listeners = []
+
+def on_user_changed(listener):
+    """
+    Register a listener for user writes
+    """
+    _user_change_listeners.append(listener)
+    return listener
+
+# Callables notified with user ids (strings) after writes to fields terminals
+# never sync, e.g. the vacation ledger (per-process user caches subscribe here)
+_user_invalidation_listeners = []
+
+def on_user_invalidated(listener):
+    """
+    Register a listener for writes that don't go through user_changed
+    """
+    _user_invalidation_listeners.append(listener)
+    return listener
+
+def user_invalidated(user_ids):
+    """
+    Drop cached copies of users after a write terminals never see: no
+    sync_version stamp and no re-read, so bulk ledger jobs stay cheap
+    """
+    user_ids = [str(user_id) for user_id in user_ids]
+    for listener in _user_invalidation_listeners:
+        try:
+            listener(user_ids)
+        except Exception as e:
+            logger.error(f"Error notifying user invalidation listeners: {e}")
+
+def user_changed(query):
+    """
+    Stamp the users matching query with a new users-collection version
+    (used by terminal delta syncs) and updated_at (used by incremental
+    backups), and notify listeners of the write
+    """
+    try:
+        db = get_db()
+        # In flight until stamped: deltas don't report this version before
+        # the users carry it, or terminals would skip past them
+        version = begin_users_version()
+        try:
+            db.users.update_many(query, {'$set': {'sync_version': version, 'updated_at': datetime.utcnow()}})
+        finally:
+            end_users_version(version)
+        
+        if not _user_change_listeners:
+            return
+        users = list(db.users.find(query, {'password': 0}))
+        for listener in _user_change_listeners:
+            listener(users)
+    except Exception as e:
+        logger.error(f"Error notifying user change listeners: {e}")
+
 # Authentication helper functions
 def find_user_by_email(email):
     """
@@ -41,7 +118,8 @@ def find_user_by_id(user_id):
 
 def verify_password(user, password):
     """
-    Verify user password using bcrypt or Werkzeug scrypt
+    Verify user password on the hashing pool, upgrading legacy or
+    outdated hashes to the configured bcrypt cost on success
     """
     try:
         if not user or 'password' not in user:
@@ -49,23 +127,24 @@ def verify_password(user, password):
         
         stored_password = user['password']
         
-        # Handle different password hash formats
-        if isinstance(stored_password, str):
-            # Check if it's a bcrypt hash
-            if stored_password.startswith('$2b$') or stored_password.startswith('$2a$'):
-                return bcrypt.checkpw(password.encode('utf-8'), stored_password.encode('utf-8'))
-            # Check if it's a Werkzeug scrypt hash
-            elif stored_password.startswith('scrypt:'):
-                from werkzeug.security import check_password_hash
-                return check_password_hash(stored_password, password)
-            else:
-                # Plain text comparison (not recommended for production)
-                logger.warning("Using plain text password comparison - please hash passwords!")
-                return stored_password == password
-        elif isinstance(stored_password, bytes):
-            return bcrypt.checkpw(password.encode('utf-8'), stored_password)
+        if not check_password(password, stored_password):
+            return False
         
-        return False
+        if needs_rehash(stored_password) and user.get('_id'):
+            try:
+                db = get_db()
+                db.users.update_one(
+                    {'_id': ObjectId(user['_id']), 'password': stored_password},
+                    {'$set': {'password': hash_password(password), 'updated_at': datetime.utcnow()}}
+                )
+                logger.info(f"Password hash upgraded for user {user['_id']}")
+            except PasswordHashingBusy:
+                # The upgrade is retried on a later login
+                pass
+        
+        return True
+    except PasswordHashingBusy:
+        raise
     except Exception as e:
         logger.error(f"Error verifying password: {e}")
         return False
@@ -98,32 +177,12 @@ def create_user(user_data):
         
         # Auto-generate employee_id if not provided
         if not user_data.get('employee_id'):
-            # Find the highest biometric_id to avoid duplicates
-            # IMPORTANT: Always start from 22 to protect device IDs 1-21
-            last_user = db.users.find_one(
-                {'biometric_id': {'$exists': True, '$gte': 22}},
-                sort=[('biometric_id', -1)]
-            )
-            
-            if last_user and last_user.get('biometric_id'):
-                try:
-                    next_num = int(last_user['biometric_id']) + 1
-                except:
-                    next_num = 22
-            else:
-                # No users with biometric_id >= 22, start from 22
-                next_num = 22
-            
-            # FORCE minimum of 22 - absolutely no IDs below 22
-            if next_num < 22:
-                next_num = 22
-            
-            # Ensure the employee_id doesn't already exist (double check)
-            while db.users.find_one({'employee_id': f"EMP{next_num:04d}"}):
-                next_num += 1
+            # Atomic allocation from the counters collection (always >= 22
+            # to protect device IDs 1-21)
+            next_num = allocate_employee_number()
             
             # Generate employee_id in format EMP0022, EMP0023, etc.
-            user_data['employee_id'] = f"EMP{next_num:04d}"
+            user_data['employee_id'] = format_employee_id(next_num)
             
             # Generate biometric_id as just the number (always >= 22)
             user_data['biometric_id'] = next_num
@@ -131,48 +190,26 @@ def create_user(user_data):
             logger.info(f"Auto-generated employee_id: {user_data['employee_id']}, biometric_id: {user_data['biometric_id']}")
         else:
             # If employee_id is provided, check if it already exists
-            if db.users.find_one({'employee_id': user_data.get('employee_id')}):
+            if db.users.find_one({'employee_id': user_data.get('employee_id')}, {'_id': 1}):
                 return {'success': False, 'error': 'Employee ID already exists'}
             
             # Generate biometric_id from employee_id if it follows EMP#### format
             # IMPORTANT: Enforce minimum biometric_id of 22
+            extracted_id = None
             if user_data['employee_id'].startswith('EMP'):
                 try:
                     extracted_id = int(user_data['employee_id'].replace('EMP', ''))
-                    # FORCE minimum of 22
-                    if extracted_id < 22:
-                        # Find next available ID starting from 22
-                        last_user = db.users.find_one(
-                            {'biometric_id': {'$exists': True, '$gte': 22}},
-                            sort=[('biometric_id', -1)]
-                        )
-                        if last_user and last_user.get('biometric_id'):
-                            user_data['biometric_id'] = int(last_user['biometric_id']) + 1
-                        else:
-                            user_data['biometric_id'] = 22
-                        logger.warning(f"Employee ID {user_data['employee_id']} would use biometric ID {extracted_id}, forcing to {user_data['biometric_id']} (min: 22)")
-                    else:
-                        user_data['biometric_id'] = extracted_id
-                except:
-                    # Fallback: find next available ID starting from 22
-                    last_user = db.users.find_one(
-                        {'biometric_id': {'$exists': True, '$gte': 22}},
-                        sort=[('biometric_id', -1)]
-                    )
-                    if last_user and last_user.get('biometric_id'):
-                        user_data['biometric_id'] = int(last_user['biometric_id']) + 1
-                    else:
-                        user_data['biometric_id'] = 22
+                except ValueError:
+                    extracted_id = None
+            
+            if extracted_id is not None and extracted_id >= MIN_EMPLOYEE_NUMBER:
+                user_data['biometric_id'] = extracted_id
+                # Keep the allocator ahead of explicitly assigned IDs
+                bump_sequence(EMPLOYEE_SEQUENCE, extracted_id)
             else:
-                # Non-EMP format: find next available ID starting from 22
-                last_user = db.users.find_one(
-                    {'biometric_id': {'$exists': True, '$gte': 22}},
-                    sort=[('biometric_id', -1)]
-                )
-                if last_user and last_user.get('biometric_id'):
-                    user_data['biometric_id'] = int(last_user['biometric_id']) + 1
-                else:
-                    user_data['biometric_id'] = 22
+                user_data['biometric_id'] = allocate_employee_number()
+                if extracted_id is not None:
+                    logger.warning(f"Employee ID {user_data['employee_id']} would use biometric ID {extracted_id}, forcing to {user_data['biometric_id']} (min: {MIN_EMPLOYEE_NUMBER})")
         
         # Set fingerprint status to PENDING for new users
         user_data.setdefault('has_fingerprint', False)
@@ -180,9 +217,8 @@ def create_user(user_data):
         
         # Hash password if provided
         if 'password' in user_data:
-            if not user_data['password'].startswith('$2b$') and not user_data['password'].startswith('$2a$'):
-                hashed = bcrypt.hashpw(user_data['password'].encode('utf-8'), bcrypt.gensalt())
-                user_data['password'] = hashed.decode('utf-8')
+            if not is_password_hash(user_data['password']):
+                user_data['password'] = hash_password(user_data['password'])
         
         # Set defaults
         user_data.setdefault('is_active', True)
@@ -191,6 +227,7 @@ def create_user(user_data):
         
         result = db.users.insert_one(user_data)
         user_data['_id'] = str(result.inserted_id)
+        user_changed({'_id': result.inserted_id})
         
         logger.info(f"User created successfully: {user_data['employee_id']} with biometric_id: {user_data['biometric_id']}")
         
@@ -199,6 +236,98 @@ def create_user(user_data):
         logger.error(f"Error creating user: {e}")
         return {'success': False, 'error': str(e)}
 
+def create_users_bulk(users_data):
+    """
+    Create many users with a single unordered insert_many.
+    Every user must already carry employee_id and biometric_id (e.g. from a
+    leased ID block). Returns one result dict per input item, in order.
+    """
+    db = get_db()
+    results = [None] * len(users_data)
+    
+    # Duplicates inside the batch itself
+    seen_emails = set()
+    seen_employee_ids = set()
+    for index, user_data in enumerate(users_data):
+        email = user_data.get('email')
+        employee_id = user_data.get('employee_id')
+        if email in seen_emails:
+            results[index] = {'success': False, 'error': 'Duplicate email in batch'}
+        elif employee_id in seen_employee_ids:
+            results[index] = {'success': False, 'error': 'Duplicate employee ID in batch'}
+        seen_emails.add(email)
+        seen_employee_ids.add(employee_id)
+    
+    # Duplicates against existing users (two indexed $in queries)
+    existing_emails = {
+        doc['email'] for doc in db.users.find(
+            {'email': {'$in': list(seen_emails)}}, {'email': 1, '_id': 0}
+        )
+    }
+    existing_employee_ids = {
+        doc['employee_id'] for doc in db.users.find(
+            {'employee_id': {'$in': list(seen_employee_ids)}}, {'employee_id': 1, '_id': 0}
+        )
+    }
+    
+    to_insert = []
+    positions = []
+    for index, user_data in enumerate(users_data):
+        if results[index]:
+            continue
+        if user_data.get('email') in existing_emails:
+            results[index] = {'success': False, 'error': 'Email already exists'}
+            continue
+        if user_data.get('employee_id') in existing_employee_ids:
+            results[index] = {'success': False, 'error': 'Employee ID already exists'}
+            continue
+        
+        user_data.setdefault('has_fingerprint', False)
+        user_data.setdefault('fingerprint_status', 'PENDING')
+        user_data.setdefault('is_active', True)
+        user_data.setdefault('role', 'employee')
+        user_data.setdefault('created_at', datetime.utcnow())
+        
+        to_insert.append(user_data)
+        positions.append(index)
+    
+    # Identical plaintext passwords (e.g. the terminal default) are hashed
+    # once, in parallel on the hashing pool
+    plaintext = [u['password'] for u in to_insert if u.get('password') and not is_password_hash(u['password'])]
+    if plaintext:
+        hashed_passwords = hash_passwords(plaintext)
+        for user_data in to_insert:
+            if user_data.get('password') in hashed_passwords:
+                user_data['password'] = hashed_passwords[user_data['password']]
+    
+    failed = {}
+    if to_insert:
+        try:
+            db.users.insert_many(to_insert, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get('writeErrors', []):
+                failed[error['index']] = error.get('errmsg', 'Insert failed')
+    
+    inserted_ids = [doc['_id'] for offset, doc in enumerate(to_insert) if offset not in failed]
+    if inserted_ids:
+        user_changed({'_id': {'$in': inserted_ids}})
+    
+    for offset, index in enumerate(positions):
+        user_data = to_insert[offset]
+        if offset in failed:
+            results[index] = {'success': False, 'error': failed[offset]}
+        else:
+            user_data['_id'] = str(user_data['_id'])
+            results[index] = {
+                'success': True,
+                'user_id': user_data['_id'],
+                'employee_id': user_data['employee_id'],
+                'biometric_id': user_data.get('biometric_id')
+            }
+    
+    logger.info(f"Bulk created {len(positions) - len(failed)} of {len(users_data)} users")
+    return results
+
 def update_user(user_id, update_data):
     """
     Update user information
@@ -208,18 +337,36 @@ def update_user(user_id, update_data):
         
         # Hash password if being updated
         if 'password' in update_data:
-            if not update_data['password'].startswith('$2b$') and not update_data['password'].startswith('$2a$'):
-                hashed = bcrypt.hashpw(update_data['password'].encode('utf-8'), bcrypt.gensalt())
-                update_data['password'] = hashed.decode('utf-8')
+            if not is_password_hash(update_data['password']):
+                update_data['password'] = hash_password(update_data['password'])
         
         update_data['updated_at'] = datetime.utcnow()
         
-        result = db.users.update_one(
+        previous = db.users.find_one_and_update(
             {'_id': ObjectId(user_id)},
-            {'$set': update_data}
+            {'$set': update_data},
+            projection={field: 1 for field in TOKEN_CLAIM_FIELDS + SYNC_SCOPE_FIELDS + ('is_active',)},
+            return_document=ReturnDocument.BEFORE
         )
         
-        if result.modified_count > 0 or result.matched_count > 0:
+        if previous:
+            # Remember the scope the user leaves, so its terminals drop them
+            if any(field in update_data and (update_data[field] or None) != (previous.get(field) or None)
+                   for field in SYNC_SCOPE_FIELDS):
+                db.users.update_one(
+                    {'_id': ObjectId(user_id)},
+                    {'$push': {'previous_scopes': {
+                        '$each': [{field: previous.get(field) or None for field in SYNC_SCOPE_FIELDS}],
+                        '$slice': -PREVIOUS_SCOPES_KEPT
+                    }}}
+                )
+            
+            # Tokens embedding the old role/company must not outlive the change
+            previous.setdefault('is_active', True)
+            if any(field in update_data and update_data[field] != previous.get(field)
+                   for field in TOKEN_CLAIM_FIELDS + ('is_active',)):
+                revoke_user_tokens(user_id)
+            user_changed({'_id': ObjectId(user_id)})
             return {'success': True, 'message': 'User updated successfully'}
         else:
             return {'success': False, 'error': 'User not found'}
@@ -235,10 +382,12 @@ def delete_user(user_id):
         db = get_db()
         result = db.users.update_one(
             {'_id': ObjectId(user_id)},
-            {'$set': {'is_active': False, 'deleted_at': datetime.utcnow()}}
+            {'$set': {'is_active': False, 'deleted_at': datetime.utcnow(), 'updated_at': datetime.utcnow()}}
         )
         
         if result.modified_count > 0:
+            revoke_user_tokens(user_id)
+            user_changed({'_id': ObjectId(user_id)})
             return {'success': True, 'message': 'User deleted successfully'}
         else:
             return {'success': False, 'error': 'User not found'}
@@ -254,9 +403,11 @@ def activate_user(user_id):
         db = get_db()
         result = db.users.update_one(
             {'_id': ObjectId(user_id)},
-            {'$set': {'is_active': True, 'activated_at': datetime.utcnow()}}
+            {'$set': {'is_active': True, 'activated_at': datetime.utcnow(), 'updated_at': datetime.utcnow()}}
         )
         
+        if result.modified_count > 0:
+            user_changed({'_id': ObjectId(user_id)})
         return result.modified_count > 0
     except Exception as e:
         logger.error(f"Error activating user: {e}")
@@ -272,9 +423,11 @@ def update_leave_balance(user_id, leave_type, days):
         
         result = db.users.update_one(
             {'_id': ObjectId(user_id)},
-            {'$inc': {field_name: days}}
+            {'$inc': {field_name: days}, '$set': {'updated_at': datetime.utcnow()}}
         )
         
+        if result.modified_count > 0:
+            user_invalidated([user_id])
         return result.modified_count > 0
     except Exception as e:
         logger.error(f"Error updating leave balance: {e}")
@@ -282,14 +435,14 @@ def update_leave_balance(user_id, leave_type, days):
 
 def get_vacation_balance(user_id):
     """
-    Get user's vacation balance
+    Get user's vacation balance (ledger field maintained on approval/cancellation)
     """
     try:
         db = get_db()
-        user = db.users.find_one({'_id': ObjectId(user_id)})
+        user = db.users.find_one({'_id': ObjectId(user_id)}, {'vacation_balance': 1})
         
         if user:
-            return user.get('leave_balances', {}).get('vacation', 0)
+            return user.get('vacation_balance', 0)
         return 0
     except Exception as e:
         logger.error(f"Error getting vacation balance: {e}")
@@ -297,146 +450,130 @@ def get_vacation_balance(user_id):
 
 def update_vacation_usage(user_id, days):
     """
-    Update vacation usage (deduct from balance)
+    Charge approved annual leave days to the vacation ledger
+    (negative days credit them back on cancellation/deletion)
     """
     try:
-        return update_leave_balance(user_id, 'vacation', -days)
+        db = get_db()
+        result = db.users.update_one(
+            {'_id': ObjectId(user_id)},
+            {
+                '$inc': {'vacation_used': days, 'vacation_balance': -days},
+                '$set': {'updated_at': datetime.utcnow()}
+            }
+        )
+        
+        # The principal cache holds whole user documents (dashboards read the ledger from it)
+        if result.modified_count > 0:
+            user_invalidated([user_id])
+        return result.modified_count > 0
     except Exception as e:
         logger.error(f"Error updating vacation usage: {e}")
         return False
 
-def get_all_database_data():
-    """
-    Get all data from all collections in a structured format
-    This is for debugging/admin purposes
-    """
-    db = get_db()
-    
-    try:
-        # Get all collection names
-        collections = db.list_collection_names()
-        
-        data = {}
-        for collection in collections:
-            try:
-                # Get all documents from collection
-                cursor = db[collection].find()
-                docs = list(cursor)
-                
-                # Convert ObjectId to string for JSON serialization
-                for doc in docs:
-                    if '_id' in doc and isinstance(doc['_id'], ObjectId):
-                        doc['_id'] = str(doc['_id'])
-                    
-                    # Convert any nested ObjectId fields
-                    convert_objectids_to_strings(doc)
-                
-                data[collection] = {
-                    'count': len(docs),
-                    'documents': docs
-                }
-                
-            except Exception as e:
-                logger.error(f"Error reading collection {collection}: {e}")
-                data[collection] = {
-                    'count': 0,
-                    'documents': [],
-                    'error': str(e)
-                }
-        
-        return {
-            'success': True,
-            'timestamp': datetime.utcnow().isoformat(),
-            'data': data
-        }
-        
-    except Exception as e:
-        logger.error(f"Get all database data error: {e}")
-        return {
-            'success': False,
-            'error': str(e),
-            'timestamp': datetime.utcnow().isoformat()
-        }
+# Sortable columns of the employees dashboard (anything else falls back to last_name)
+DASHBOARD_SORT_FIELDS = {
+    'employee_id', 'first_name', 'last_name', 'email', 'department',
+    'position', 'hire_date', 'created_at', 'is_active', 'role'
+}
+
+DASHBOARD_SEARCH_FIELDS = ['first_name', 'last_name', 'email', 'employee_id', 'position']
 
-def convert_objectids_to_strings(obj):
-    """Recursively convert ObjectId fields to strings"""
-    if isinstance(obj, dict):
-        for key, value in obj.items():
-            if isinstance(value, ObjectId):
-                obj[key] = str(value)
-            elif isinstance(value, dict):
-                convert_objectids_to_strings(value)
-            elif isinstance(value, list):
-                for item in value:
-                    convert_objectids_to_strings(item)
-    elif isinstance(obj, list):
-        for item in obj:
-            convert_objectids_to_strings(item)
+DASHBOARD_MAX_LIMIT = 200
 
 def get_employees_dashboard_data(filters=None):
     """
     Get structured data for employees dashboard
-    Matches what the frontend needs
+    Matches what the frontend needs; the page (filter, search, sort, skip)
+    and the stats/departments each run in one aggregation
     """
     db = get_db()
+    filters = filters or {}
     
     try:
         # Parse filters
         query = {}
-        if filters:
-            # Apply status filter
-            if filters.get('status') and filters['status'] != 'all':
-                query['is_active'] = filters['status'] == 'active'
-            
-            # Apply department filter
-            if filters.get('department') and filters['department'] != 'all':
-                query['department'] = filters['department']
-            
-            # Apply company filter
-            if filters.get('company_id') and filters['company_id'] != 'all':
-                query['company_id'] = filters['company_id']
+        # Apply status filter
+        if filters.get('status') and filters['status'] != 'all':
+            query['is_active'] = filters['status'] == 'active'
+        
+        # Apply department filter
+        if filters.get('department') and filters['department'] != 'all':
+            query['department'] = filters['department']
+        
+        # Apply company filter
+        if filters.get('company_id') and filters['company_id'] != 'all':
+            query['company_id'] = filters['company_id']
         
         # Default: only get employees (not admins)
         if 'role' not in query:
             query['role'] = {'$in': ['employee', 'supervisor']}
         
-        # Get employees
-        employees_cursor = db.users.find(query)
-        employees = list(employees_cursor)
-        
-        # Apply search filter if provided
-        if filters and filters.get('search'):
-            search_term = filters['search'].lower()
-            employees = [
-                emp for emp in employees
-                if (search_term in emp.get('first_name', '').lower() or
-                    search_term in emp.get('last_name', '').lower() or
-                    search_term in emp.get('email', '').lower() or
-                    search_term in emp.get('employee_id', '').lower() or
-                    search_term in emp.get('position', '').lower())
-            ]
-        
-        # Apply sorting
+        # Search: case-insensitive substring on the visible columns
+        search_match = {}
+        if filters.get('search'):
+            pattern = re.escape(str(filters['search']).strip())
+            search_match = {'$or': [
+                {field: {'$regex': pattern, '$options': 'i'}} for field in DASHBOARD_SEARCH_FIELDS
+            ]}
+        
+        # Sorting (whitelisted; _id keeps page boundaries stable)
         sort_field = 'last_name'
         sort_direction = 1  # Ascending
-        
-        if filters and filters.get('sort'):
-            sort_config = filters['sort']
-            if sort_config.get('key'):
-                sort_field = sort_config['key']
-                sort_direction = -1 if sort_config.get('direction') == 'desc' else 1
-        
-        employees.sort(key=lambda x: x.get(sort_field, ''), reverse=(sort_direction == -1))
-        
-        # Convert ObjectId to string and remove sensitive data
+        sort_config = filters.get('sort') or {}
+        if sort_config.get('key') in DASHBOARD_SORT_FIELDS:
+            sort_field = sort_config['key']
+            sort_direction = -1 if sort_config.get('direction') == 'desc' else 1
+        
+        # Pagination
+        try:
+            page = max(1, int(filters.get('page', 1)))
+            limit = max(1, min(int(filters.get('limit', 50)), DASHBOARD_MAX_LIMIT))
+        except (TypeError, ValueError):
+            page, limit = 1, 50
+        skip = (page - 1) * limit
+        
+        hire_date = {'$convert': {'input': '$hire_date', 'to': 'date', 'onError': None, 'onNull': None}}
+        
+        # The page is its own pipeline so the sort can walk the
+        # (role, last_name, _id) indexes; a $sort inside $facet never uses one
+        employees = list(db.users.aggregate([
+            {'$match': dict(query, **search_match)},
+            {'$sort': {sort_field: sort_direction, '_id': 1}},
+            {'$skip': skip},
+            {'$limit': limit},
+            {'$project': {'password': 0}}
+        ], allowDiskUse=True))
+        
+        facet = list(db.users.aggregate([
+            {'$match': query},
+            {'$facet': {
+                'stats': [
+                    {'$match': search_match},
+                    {'$group': {
+                        '_id': None,
+                        'total': {'$sum': 1},
+                        'active': {'$sum': {'$cond': [{'$eq': ['$is_active', False]}, 0, 1]}},
+                        'avg_experience_ms': {'$avg': {'$cond': [
+                            {'$eq': [hire_date, None]},
+                            None,
+                            {'$subtract': ['$$NOW', hire_date]}
+                        ]}}
+                    }}
+                ],
+                'departments': [
+                    {'$match': {'department': {'$nin': [None, '']}}},
+                    {'$group': {'_id': '$department'}},
+                    {'$sort': {'_id': 1}}
+                ]
+            }}
+        ]))[0]
+        
+        # Convert ObjectId to string and fill fields the frontend expects
         processed_employees = []
         for emp in employees:
             emp['_id'] = str(emp['_id'])
             
-            # Remove password for security
-            if 'password' in emp:
-                del emp['password']
-            
             # Ensure all required fields exist
             emp.setdefault('employee_id', '')
             emp.setdefault('first_name', '')
@@ -453,35 +590,17 @@ def get_employees_dashboard_data(filters=None):
             processed_employees.append(emp)
         
         # Get companies
-        companies_cursor = db.companies.find()
-        companies = list(companies_cursor)
+        companies = list(db.companies.find())
         for company in companies:
             company['_id'] = str(company['_id'])
         
-        # Get unique departments
-        departments = db.users.distinct('department', query)
-        departments = [dept for dept in departments if dept]  # Remove empty strings
+        departments = [dept['_id'] for dept in facet['departments']]
         
         # Calculate statistics
-        total_employees = len(processed_employees)
-        active_employees = len([emp for emp in processed_employees if emp.get('is_active', True)])
-        unique_departments = len(departments)
-        
-        # Calculate average experience (if hire_date exists)
-        experience_days = []
-        for emp in processed_employees:
-            if emp.get('hire_date'):
-                try:
-                    if isinstance(emp['hire_date'], str):
-                        hire_date = datetime.fromisoformat(emp['hire_date'].replace('Z', '+00:00'))
-                    else:
-                        hire_date = emp['hire_date']
-                    
-                    experience_days.append((datetime.utcnow() - hire_date).days)
-                except:
-                    continue
-        
-        avg_experience = round(sum(experience_days) / len(experience_days) / 365, 1) if experience_days else 0
+        stats = facet['stats'][0] if facet['stats'] else {}
+        total_employees = stats.get('total', 0)
+        avg_experience_ms = stats.get('avg_experience_ms')
+        avg_experience = round(avg_experience_ms / (86400000 * 365), 1) if avg_experience_ms else 0
         
         # Prepare response
         response = {
@@ -491,14 +610,16 @@ def get_employees_dashboard_data(filters=None):
             'departments': departments,
             'stats': {
                 'total': total_employees,
-                'active': active_employees,
-                'departments': unique_departments,
+                'active': stats.get('active', 0),
+                'departments': len(departments),
                 'avgExperience': avg_experience
             },
             'pagination': {
                 'total': total_employees,
-                'page': filters.get('page', 1) if filters else 1,
-                'limit': filters.get('limit', 50) if filters else 50
+                'page': page,
+                'limit': limit,
+                'pages': (total_employees + limit - 1) // limit,
+                'has_next': skip + len(processed_employees) < total_employees
             }
         }
         
@@ -517,72 +638,122 @@ def get_employees_dashboard_data(filters=None):
                 'active': 0,
                 'departments': 0,
                 'avgExperience': 0
+            },
+            'pagination': {
+                'total': 0,
+                'page': 1,
+                'limit': 50,
+                'pages': 0,
+                'has_next': False
             }
         }
 
-def get_user_complete_profile(user_id):
+# Independent profile queries run concurrently on a small shared pool
+PROFILE_FANOUT_WORKERS = 8
+PROFILE_PAGE_SIZE = 20
+PROFILE_MAX_PAGE_SIZE = 100
+PROFILE_ATTENDANCE_LIMIT = 100
+
+_profile_executor = ThreadPoolExecutor(max_workers=PROFILE_FANOUT_WORKERS, thread_name_prefix='profile')
+
+def _stringify_ids(docs):
+    for doc in docs:
+        doc['_id'] = str(doc['_id'])
+    return docs
+
+def get_user_complete_profile(user_id, leaves_page=1, documents_page=1, page_size=PROFILE_PAGE_SIZE):
     """
     Get complete user profile with all related data
+    Leaves, documents, company and attendance are fetched in parallel;
+    leaves and documents are paginated
     """
     db = get_db()
     
     try:
-        # Get user
-        user = db.users.find_one({'_id': ObjectId(user_id)})
+        page_size = max(1, min(int(page_size), PROFILE_MAX_PAGE_SIZE))
+        leaves_page = max(1, int(leaves_page))
+        documents_page = max(1, int(documents_page))
+        user_object_id = ObjectId(user_id)
+        
+        def load_company(company_id):
+            if not company_id or not ObjectId.is_valid(str(company_id)):
+                return None
+            return db.companies.find_one({'_id': ObjectId(str(company_id))})
+        
+        def load_attendance(employee_id):
+            # Punch logs from the last 30 days, newest first
+            if not employee_id:
+                return []
+            return _stringify_ids(list(
+                db.attendance.find({'employee_id': employee_id, 'timestamp': {'$gte': thirty_days_ago}})
+                .sort('timestamp', -1)
+                .limit(PROFILE_ATTENDANCE_LIMIT)
+            ))
+        
+        def load_page(collection, sort_field, page):
+            return _stringify_ids(list(
+                collection.find({'user_id': user_id})
+                .sort(sort_field, -1)
+                .skip((page - 1) * page_size)
+                .limit(page_size)
+            ))
+        
+        thirty_days_ago = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=30)
+        
+        # Queries keyed by user_id start immediately; company and attendance
+        # start as soon as the user document is back
+        futures = {
+            'leaves': _profile_executor.submit(load_page, db.leaves, 'start_date', leaves_page),
+            'leaves_total': _profile_executor.submit(db.leaves.count_documents, {'user_id': user_id}),
+            'documents': _profile_executor.submit(load_page, db.documents, '_id', documents_page),
+            'documents_total': _profile_executor.submit(db.documents.count_documents, {'user_id': user_id})
+        }
+        
+        user = db.users.find_one({'_id': user_object_id}, {'password': 0})
         if not user:
+            for future in futures.values():
+                future.cancel()
             return {'success': False, 'error': 'User not found'}
         
-        user['_id'] = str(user['_id'])
-        
-        # Remove password
-        if 'password' in user:
-            del user['password']
-        
-        # Get company info
-        company = None
-        if 'company_id' in user:
-            company = db.companies.find_one({'_id': ObjectId(user['company_id'])})
-            if company:
-                company['_id'] = str(company['_id'])
-        
-        # Get leave history
-        leaves = list(db.leaves.find({'user_id': user_id}))
-        for leave in leaves:
-            leave['_id'] = str(leave['_id'])
+        futures['company'] = _profile_executor.submit(load_company, user.get('company_id'))
+        futures['attendance'] = _profile_executor.submit(load_attendance, user.get('employee_id'))
         
-        # Get attendance records (last 30 days)
-        thirty_days_ago = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        thirty_days_ago = thirty_days_ago.replace(day=thirty_days_ago.day - 30)
-        
-        attendance = list(db.attendance.find({
-            'user_id': user_id,
-            'date': {'$gte': thirty_days_ago}
-        }).sort('date', -1).limit(30))
-        
-        for record in attendance:
-            record['_id'] = str(record['_id'])
-        
-        # Get documents
-        documents = list(db.documents.find({'user_id': user_id}))
-        for doc in documents:
-            doc['_id'] = str(doc['_id'])
+        user['_id'] = str(user['_id'])
+        company = futures['company'].result()
+        if company:
+            company['_id'] = str(company['_id'])
         
         return {
             'success': True,
             'user': user,
             'company': company,
-            'leaves': leaves,
-            'attendance': attendance,
-            'documents': documents
+            'leaves': futures['leaves'].result(),
+            'attendance': futures['attendance'].result(),
+            'documents': futures['documents'].result(),
+            'pagination': {
+                'page_size': page_size,
+                'leaves': {'page': leaves_page, 'total': futures['leaves_total'].result()},
+                'documents': {'page': documents_page, 'total': futures['documents_total'].result()}
+            }
         }
         
     except Exception as e:
         logger.error(f"Get user complete profile error: {e}")
         return {'success': False, 'error': str(e)}
 
-def get_all_users(filters=None):
+USER_LIST_DEFAULTS = {
+    'is_active': True,
+    'first_name': '',
+    'last_name': '',
+    'email': '',
+    'department': '',
+    'position': ''
+}
+
+def get_all_users(filters=None, projection=None):
     """
     Retrieve all users from the database with optional filtering.
+    projection limits the returned fields (password is never returned).
     """
     db = get_db()
     query = {}
@@ -593,76 +764,47 @@ def get_all_users(filters=None):
             query['company_id'] = filters['company_id']
         if 'role' in filters:
             query['role'] = filters['role']
+        if 'site_id' in filters:
+            query['site_id'] = filters['site_id']
 
     try:
         # Find all users matching the query
-        users_cursor = db.users.find(query)
+        users_cursor = db.users.find(query, exclude_forbidden(projection))
         users = list(users_cursor)
 
+        # Ensure essential fields exist for the frontend table
+        defaults = {
+            field: value for field, value in USER_LIST_DEFAULTS.items()
+            if includes(projection, field)
+        }
+
         # Process users for JSON serialization
         for user in users:
             user['_id'] = str(user['_id'])
-            # Remove sensitive information
-            user.pop('password', None)
-            
-            # Ensure essential fields exist for the frontend table
-            user.setdefault('is_active', True)
-            user.setdefault('first_name', '')
-            user.setdefault('last_name', '')
-            user.setdefault('email', '')
-            user.setdefault('department', '')
-            user.setdefault('position', '')
+            for field, value in defaults.items():
+                user.setdefault(field, value)
 
         return users
     except Exception as e:
         print(f"Error fetching users: {e}")
         return []
 
-def export_all_data(format='json'):
+def get_users_by_ids(user_ids, projection=None):
     """
-    Export all data from database
+    Get several users in one query (password never included), in the order of user_ids
     """
     try:
-        data = get_all_database_data()
-        
-        if format == 'csv':
-            # Convert to CSV (simplified version)
-            csv_data = {}
-            for collection_name, collection_data in data['data'].items():
-                if collection_data['documents']:
-                    # Get headers
-                    headers = set()
-                    for doc in collection_data['documents']:
-                        headers.update(doc.keys())
-                    
-                    # Create CSV rows
-                    rows = [','.join(headers)]
-                    for doc in collection_data['documents']:
-                        row = []
-                        for header in headers:
-                            value = doc.get(header, '')
-                            # Convert to string and escape commas
-                            if isinstance(value, (list, dict)):
-                                value = str(value).replace(',', ';')
-                            row.append(str(value).replace(',', ';'))
-                        rows.append(','.join(row))
-                    
-                    csv_data[collection_name] = '\n'.join(rows)
-            
-            return {
-                'success': True,
-                'format': 'csv',
-                'data': csv_data,
-                'timestamp': datetime.utcnow().isoformat()
-            }
+        db = get_db()
+        object_ids = [ObjectId(str(uid)) for uid in user_ids if ObjectId.is_valid(str(uid))]
+        if not object_ids:
+            return []
         
-        else:  # JSON
-            return data
+        users = {}
+        for user in db.users.find({'_id': {'$in': object_ids}}, exclude_forbidden(projection)):
+            user['_id'] = str(user['_id'])
+            users[user['_id']] = user
         
+        return [users[str(uid)] for uid in object_ids if str(uid) in users]
     except Exception as e:
-        logger.error(f"Export all data error: {e}")
-        return {
-            'success': False,
-            'error': str(e),
-            'timestamp': datetime.utcnow().isoformat()
-        }
\ No newline at end of file
+        logger.error(f"Error getting users by IDs: {e}")
+        return []
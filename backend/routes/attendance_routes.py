@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify, Response
 from database import get_db
 from models.attendance_model import AttendanceModel
+from services.employee_directory import find_by_employee_id
+from services.business_days import working_day_flags
 from datetime import datetime, timedelta
 from bson import ObjectId
 from services.attendance_service import (
@@ -30,8 +32,8 @@ def create_manual_attendance():
         if not is_valid:
             return jsonify({'success': False, 'error': error}), 400
         
-        # Verify user exists
-        user = db.users.find_one({'employee_id': data['employee_id']})
+        # Verify user exists (in-memory directory, no Mongo round trip)
+        user = find_by_employee_id(data['employee_id'])
         if not user:
             return jsonify({
                 'success': False,
@@ -93,8 +95,8 @@ def create_attendance():
         if not is_valid:
             return jsonify({'success': False, 'error': error}), 400
         
-        # Verify user exists
-        user = db.users.find_one({'employee_id': data['employee_id']})
+        # Verify user exists (in-memory directory, no Mongo round trip)
+        user = find_by_employee_id(data['employee_id'])
         if not user:
             return jsonify({
                 'success': False,
@@ -402,6 +404,10 @@ def get_attendance_summary():
         # Get attendance settings
         attendance_settings = get_attendance_settings()
         
+        # Working days (weekmask + the company's holidays) for the whole range at once
+        employee = find_by_employee_id(employee_id)
+        working_days = working_day_flags(employee.company_id if employee else None, start_date, end_date)
+        
         # Collect daily summaries for ALL days in range
         daily_summaries = []
         current_date = start_date
@@ -450,6 +456,7 @@ def get_attendance_summary():
             daily_summaries.append({
                 'date': current_date.strftime('%Y-%m-%d'),
                 'day_of_week': current_date.strftime('%a'),
+                'is_working_day': working_days[(current_date - start_date).days],
                 'has_records': len(records) > 0,
                 'check_in': check_in['timestamp'].isoformat() if check_in else None,
                 'check_out': check_out['timestamp'].isoformat() if check_out else None,
@@ -473,6 +480,8 @@ def get_attendance_summary():
         days_with_records = sum(1 for d in daily_summaries if d['has_records'])
         complete_days = sum(1 for d in daily_summaries if d['is_complete'])
         total_worked_hours = sum(d['worked_hours'] for d in daily_summaries)
+        expected_days = sum(1 for d in daily_summaries if d['is_working_day'])
+        missed_days = sum(1 for d in daily_summaries if d['is_working_day'] and not d['has_records'])
         
         return jsonify({
             'success': True,
@@ -487,6 +496,8 @@ def get_attendance_summary():
                     'days_with_records': days_with_records,
                     'total_days': total_days,
                     'absent_days': total_days - days_with_records,
+                    'expected_days': expected_days,
+                    'missed_working_days': missed_days,
                     'total_records': sum(d['total_records'] for d in daily_summaries)
                 }
             }
@@ -3,7 +3,11 @@ Authentication Routes
 """
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity
-from models.user_model import find_user_by_email, verify_password, find_user_by_id
+from models.user_model import find_user_by_email, find_user_by_id, verify_password
+from models.token_revocation_model import get_token_version
+from models.project_model import user_has_projects
+from utils.auth_utils import get_current_user as load_current_user, build_token_claims, admin_required
+from utils.password_utils import PasswordHashingBusy, get_hashing_metrics
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,9 +18,6 @@ auth_bp = Blueprint('auth', __name__)
 def login():
     """User login endpoint"""
     try:
-        from database import get_db
-        from bson.objectid import ObjectId
-        
         data = request.get_json()
         
         if not data or not data.get('email') or not data.get('password'):
@@ -25,6 +26,9 @@ def login():
         email = data['email']
         password = data['password']
         
+        # Read before the user, so a revocation in between outdates the token
+        token_version = get_token_version()
+        
         # Find user
         user = find_user_by_email(email)
         
@@ -39,7 +43,7 @@ def login():
             return jsonify({'error': 'Invalid credentials'}), 401
         
         # Create tokens
-        access_token = create_access_token(identity=user['_id'])
+        access_token = create_access_token(identity=user['_id'], additional_claims=build_token_claims(user, token_version))
         refresh_token = create_refresh_token(identity=user['_id'])
         
         # Remove password from response
@@ -47,20 +51,8 @@ def login():
         
         # If employee, check if assigned to any projects
         if user.get('role') == 'employee':
-            db = get_db()
-            user_object_id = ObjectId(user['_id'])
-            user_id_str = str(user['_id'])
-            # Check both field names and both ObjectId and string formats for compatibility
-            assigned_projects_count = db.projects.count_documents({
-                '$or': [
-                    {'assigned_users': user_object_id},
-                    {'assigned_users': user_id_str},
-                    {'assigned_employees': user_object_id},
-                    {'assigned_employees': user_id_str}
-                ]
-            })
-            user['has_projects'] = assigned_projects_count > 0
-            logger.info(f"Employee {user['email']} login - has {assigned_projects_count} projects assigned (checked ObjectId: {user_object_id}, String: {user_id_str})")
+            user['has_projects'] = user_has_projects(user['_id'])
+            logger.info(f"Employee {user['email']} login - has_projects={user['has_projects']}")
         
         return jsonify({
             'message': 'Login successful',
@@ -69,6 +61,11 @@ def login():
             'user': user
         }), 200
         
+    except PasswordHashingBusy:
+        logger.warning("Login rejected: password hashing queue is full")
+        response = jsonify({'error': 'Server is busy, please retry shortly'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
     except Exception as e:
         logger.error(f"Login error: {e}")
         return jsonify({'error': 'An error occurred during login'}), 500
@@ -79,7 +76,15 @@ def refresh():
     """Refresh access token"""
     try:
         current_user_id = get_jwt_identity()
-        access_token = create_access_token(identity=current_user_id)
+        
+        # Claims are re-read here so demotions/deactivations take effect on refresh
+        token_version = get_token_version()
+        user = find_user_by_id(current_user_id)
+        
+        if not user or not user.get('is_active', True):
+            return jsonify({'error': 'Account is deactivated'}), 401
+        
+        access_token = create_access_token(identity=current_user_id, additional_claims=build_token_claims(user, token_version))
         
         return jsonify({
             'access_token': access_token
@@ -94,11 +99,7 @@ def refresh():
 def get_current_user():
     """Get current user profile"""
     try:
-        from database import get_db
-        from bson.objectid import ObjectId
-        
-        current_user_id = get_jwt_identity()
-        user = find_user_by_id(current_user_id)
+        user = load_current_user()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -107,20 +108,8 @@ def get_current_user():
         
         # If employee, check if assigned to any projects
         if user.get('role') == 'employee':
-            db = get_db()
-            user_object_id = ObjectId(user['_id'])
-            user_id_str = str(user['_id'])
-            # Check both field names and both ObjectId and string formats for compatibility
-            assigned_projects_count = db.projects.count_documents({
-                '$or': [
-                    {'assigned_users': user_object_id},
-                    {'assigned_users': user_id_str},
-                    {'assigned_employees': user_object_id},
-                    {'assigned_employees': user_id_str}
-                ]
-            })
-            user['has_projects'] = assigned_projects_count > 0
-            logger.info(f"Employee {user['email']} has {assigned_projects_count} projects assigned, has_projects={user['has_projects']}")
+            user['has_projects'] = user_has_projects(user['_id'])
+            logger.info(f"Employee {user['email']} has_projects={user['has_projects']}")
         
         return jsonify({'user': user}), 200
         
@@ -133,3 +122,15 @@ def get_current_user():
 def logout():
     """User logout endpoint (client-side token removal)"""
     return jsonify({'message': 'Logout successful'}), 200
+
+@auth_bp.route('/metrics', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_auth_metrics():
+    """Password hashing pool load (Admin only)"""
+    try:
+        return jsonify({'password_hashing': get_hashing_metrics()}), 200
+        
+    except Exception as e:
+        logger.error(f"Get auth metrics error: {e}")
+        return jsonify({'error': 'An error occurred'}), 500
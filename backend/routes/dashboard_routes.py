@@ -1,13 +1,15 @@
 """
 Dashboard Routes
 """
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models.user_model import find_user_by_id, get_all_users
+from models.user_model import get_all_users
 from models.leave_model import get_leave_statistics, get_all_leaves
 from models.salary_advance_model import get_salary_advance_statistics, get_all_salary_advances
 from models.project_model import get_all_projects
-from utils.auth_utils import admin_or_supervisor_required
+from utils.auth_utils import admin_required, admin_or_supervisor_required, get_current_user, get_current_principal
+from services.data_export import EXPORT_FORMATS, stream_export
+from datetime import datetime
 from bson import ObjectId
 import logging
 
@@ -33,7 +35,7 @@ def get_dashboard_statistics():
     """Get dashboard statistics based on user role"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = find_user_by_id(current_user_id)
+        current_user = get_current_user()
         
         if not current_user:
             logger.error(f"User not found: {current_user_id}")
@@ -166,8 +168,7 @@ def get_dashboard_statistics():
 def get_pending_approvals():
     """Get pending approvals for supervisor/admin"""
     try:
-        current_user_id = get_jwt_identity()
-        current_user = find_user_by_id(current_user_id)
+        current_user = get_current_principal()
         
         if current_user['role'] == 'supervisor':
             company_id = current_user['company_id']
@@ -186,5 +187,28 @@ def get_pending_approvals():
         logger.error(f"Pending approvals error: {e}")
         return jsonify({'error': 'An error occurred'}), 500
 
+@dashboard_bp.route('/export', methods=['GET'])
+@jwt_required()
+@admin_required
+def export_data():
+    """Stream every collection as NDJSON or CSV files inside a ZIP archive"""
+    try:
+        export_format = request.args.get('format', 'ndjson').lower()
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({'error': f"Format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+        
+        collections = [name.strip() for name in request.args.get('collections', '').split(',') if name.strip()]
+        filename = f"export_{export_format}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.zip"
+        
+        return Response(
+            stream_with_context(stream_export(export_format, collections or None)),
+            mimetype='application/zip',
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
+        )
+        
+    except Exception as e:
+        logger.error(f"Data export error: {e}")
+        return jsonify({'error': 'An error occurred during export'}), 500
+
 # Import decorator
 from utils.auth_utils import admin_or_supervisor_required
@@ -0,0 +1,131 @@
+"""
+Device Routes - Terminal registry administration
+"""
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required
+from models.device_model import register_device, get_device, get_all_devices, delete_device
+from models.telemetry_model import get_fleet_telemetry
+from utils.auth_utils import admin_required
+import logging
+
+logger = logging.getLogger(__name__)
+
+device_bp = Blueprint('devices', __name__)
+
+@device_bp.route('', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_devices():
+    """Get registered terminals (Admin only)"""
+    try:
+        filters = {}
+        if request.args.get('company_id'):
+            filters['company_id'] = request.args['company_id']
+        if request.args.get('site_id'):
+            filters['site_id'] = request.args['site_id']
+
+        devices = get_all_devices(filters)
+
+        return jsonify({'devices': devices, 'count': len(devices)}), 200
+
+    except Exception as e:
+        logger.error(f"Get devices error: {e}")
+        return jsonify({'error': 'An error occurred'}), 500
+
+@device_bp.route('/telemetry', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_telemetry():
+    """
+    Fleet latency/queue-depth report (Admin only)
+    Query params: hours (default 24, max 720), company_id (optional)
+    """
+    try:
+        hours = max(1, min(request.args.get('hours', 24, type=int), 720))
+
+        report = get_fleet_telemetry(hours, request.args.get('company_id'))
+
+        return jsonify({'telemetry': report}), 200
+
+    except Exception as e:
+        logger.error(f"Get telemetry error: {e}")
+        return jsonify({'error': 'An error occurred'}), 500
+
+@device_bp.route('/rate-limits', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_rate_limits():
+    """Terminal API rate limiter counters (Admin only)"""
+    try:
+        from routes.terminal_routes import get_terminal_rate_limiter, get_terminal_ip_rate_limiter
+
+        return jsonify({
+            'rate_limits': get_terminal_rate_limiter().stats(),
+            'ip_rate_limits': get_terminal_ip_rate_limiter().stats()
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Get rate limits error: {e}")
+        return jsonify({'error': 'An error occurred'}), 500
+
+@device_bp.route('/<device_id>', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_device_details(device_id):
+    """Get a registered terminal (Admin only)"""
+    try:
+        device = get_device(device_id)
+
+        if not device:
+            return jsonify({'error': 'Device not found'}), 404
+
+        return jsonify({'device': device}), 200
+
+    except Exception as e:
+        logger.error(f"Get device error: {e}")
+        return jsonify({'error': 'An error occurred'}), 500
+
+@device_bp.route('/<device_id>', methods=['PUT'])
+@jwt_required()
+@admin_required
+def save_device(device_id):
+    """Register or update a terminal and its site (Admin only)"""
+    try:
+        data = request.get_json() or {}
+
+        if not data.get('company_id'):
+            return jsonify({'error': 'company_id is required'}), 400
+
+        # site_id scopes the users the terminal syncs; null/empty serves the whole company
+        if data.get('site_id') is not None and not isinstance(data['site_id'], str):
+            return jsonify({'error': 'site_id must be a string'}), 400
+        if 'site_id' in data and not data['site_id']:
+            data['site_id'] = None
+
+        device = register_device(device_id, data)
+
+        if not device:
+            return jsonify({'error': 'Failed to register device'}), 500
+
+        return jsonify({'message': 'Device saved successfully', 'device': device}), 200
+
+    except Exception as e:
+        logger.error(f"Save device error: {e}")
+        return jsonify({'error': 'An error occurred'}), 500
+
+@device_bp.route('/<device_id>', methods=['DELETE'])
+@jwt_required()
+@admin_required
+def remove_device(device_id):
+    """Remove a terminal from the registry (Admin only)"""
+    try:
+        success = delete_device(device_id)
+
+        if success:
+            return jsonify({'message': 'Device removed successfully'}), 200
+        else:
+            return jsonify({'error': 'Device not found'}), 404
+
+    except Exception as e:
+        logger.error(f"Delete device error: {e}")
+        return jsonify({'error': 'An error occurred'}), 500
@@ -1,13 +1,40 @@
 from flask import Blueprint, request, jsonify
 from database import get_db
-from models.fingerprint_model import FingerprintModel
+from models.fingerprint_model import (
+    FingerprintModel, PENDING_ENROLLMENT_QUERY, PENDING_ENROLLMENT_PROJECTION
+)
 from datetime import datetime
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 from models.fingerprint_model import update_fingerprint_template, get_enrolled_templates
+from models.user_model import user_changed
+from models.device_model import get_device_scope
 import logging
 
 fingerprint_bp = Blueprint('fingerprint', __name__)
 logger = logging.getLogger(__name__)
 
+# Batch enrollment confirmation
+MAX_CONFIRM_BATCH_SIZE = 1000
+
+# Enrollment work queue leases
+DEFAULT_ENROLLMENT_LEASE_SECONDS = 300
+MAX_ENROLLMENT_LEASE_SECONDS = 3600
+
+def _is_biometric_id(value):
+    return isinstance(value, (int, str)) and not isinstance(value, bool)
+
+def _failed_writes(collection, operations):
+    """Run operations unordered; {operation index: error} of the ones that failed"""
+    try:
+        collection.bulk_write(operations, ordered=False)
+        return {}
+    except BulkWriteError as e:
+        return {
+            error['index']: error.get('errmsg', 'Write failed')
+            for error in e.details.get('writeErrors', [])
+        }
+
 @fingerprint_bp.route('/enroll', methods=['POST'])
 def enroll_fingerprint():
     """
@@ -117,6 +144,7 @@ def update_fingerprint_status(employee_id):
         )
         
         if result.modified_count > 0:
+            user_changed({'employee_id': employee_id})
             logger.info(f"Fingerprint status updated for user {employee_id}")
             return jsonify({
                 'success': True,
@@ -175,9 +203,11 @@ def get_enrolled_templates():
     """
     Get all enrolled template IDs for verification caching
     Returns only metadata, not biometric data
+    Query params: device_id (optional, limits templates to the device's site)
     """
     try:
-        templates = FingerprintModel.get_enrolled_templates()
+        scope = get_device_scope(request.args.get('device_id'))
+        templates = FingerprintModel.get_enrolled_templates(scope)
         
         return jsonify({
             'success': True,
@@ -261,26 +291,8 @@ def get_pending_enrollments():
         
         # Find users without fingerprints or with pending status
         pending_users = list(db.users.find(
-            {
-                '$or': [
-                    {'has_fingerprint': False},
-                    {'has_fingerprint': {'$exists': False}},
-                    {'fingerprint_status': 'PENDING'}
-                ],
-                'is_active': True
-            },
-            {
-                'employee_id': 1,
-                'biometric_id': 1,
-                'first_name': 1,
-                'last_name': 1,
-                'full_name': 1,
-                'department': 1,
-                'position': 1,
-                'fingerprint_status': 1,
-                'created_at': 1,
-                '_id': 0
-            }
+            PENDING_ENROLLMENT_QUERY,
+            PENDING_ENROLLMENT_PROJECTION
         ).sort('created_at', -1))
         
         # Add full_name if not present and ensure biometric_id exists
@@ -309,6 +321,7 @@ def get_pending_enrollments():
                     {'employee_id': user['employee_id']},
                     {'$set': {'biometric_id': biometric_id}}
                 )
+                user_changed({'employee_id': user['employee_id']})
                 user['biometric_id'] = biometric_id
         
         return jsonify({
@@ -321,6 +334,63 @@ def get_pending_enrollments():
         logger.error(f"Error fetching pending enrollments: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@fingerprint_bp.route('/pending/claim', methods=['POST'])
+def claim_pending_enrollment():
+    """
+    Lease the next pending enrollment to a terminal
+    Payload: { "device_id": "...", "lease_seconds": 300 (optional) }
+    Returns data: null when the queue is empty
+    """
+    try:
+        data = request.get_json() or {}
+        
+        device_id = data.get('device_id')
+        if not device_id:
+            return jsonify({'success': False, 'error': 'device_id is required'}), 400
+        
+        try:
+            lease_seconds = int(data.get('lease_seconds', DEFAULT_ENROLLMENT_LEASE_SECONDS))
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'lease_seconds must be an integer'}), 400
+        lease_seconds = max(30, min(lease_seconds, MAX_ENROLLMENT_LEASE_SECONDS))
+        
+        user = FingerprintModel.claim_pending_enrollment(device_id, lease_seconds)
+        
+        return jsonify({
+            'success': True,
+            'data': user
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Error claiming pending enrollment: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@fingerprint_bp.route('/pending/release', methods=['POST'])
+def release_pending_enrollment():
+    """
+    Return a leased enrollment to the queue (e.g. the employee walked away)
+    Payload: { "device_id": "...", "employee_id": "..." }
+    """
+    try:
+        data = request.get_json() or {}
+        
+        if not data.get('device_id') or not data.get('employee_id'):
+            return jsonify({'success': False, 'error': 'device_id and employee_id are required'}), 400
+        
+        released = FingerprintModel.release_pending_enrollment(data['device_id'], data['employee_id'])
+        
+        if not released:
+            return jsonify({
+                'success': False,
+                'error': f"No lease held by {data['device_id']} for {data['employee_id']}"
+            }), 404
+        
+        return jsonify({'success': True, 'message': 'Enrollment returned to the queue'}), 200
+        
+    except Exception as e:
+        logger.error(f"Error releasing pending enrollment: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @fingerprint_bp.route('/confirm', methods=['POST'])
 def confirm_enrollment():
     """
@@ -392,10 +462,11 @@ def confirm_enrollment():
         # Update user record
         result = db.users.update_one(
             {'biometric_id': biometric_id},
-            {'$set': update_data}
+            {'$set': update_data, '$unset': {'enrollment_lease': ''}}
         )
         
         if result.modified_count > 0 or result.matched_count > 0:
+            user_changed({'biometric_id': biometric_id})
             logger.info(f"Fingerprint enrollment confirmed for biometric_id {biometric_id} (employee: {employee_id})")
             return jsonify({
                 'success': True,
@@ -415,4 +486,142 @@ def confirm_enrollment():
             
     except Exception as e:
         logger.error(f"Error confirming enrollment: {str(e)}")
-        return jsonify({'success': False, 'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@fingerprint_bp.route('/confirm/batch', methods=['POST'])
+def confirm_enrollment_batch():
+    """
+    Confirm many fingerprint enrollments at once (onboarding days)
+    Payload: { "items": [ { "biometric_id": number, "template_data": "base64_string" (optional) }, ... ] }
+    Users are resolved with one $in query and all writes go out in two bulk_write calls
+    """
+    try:
+        data = request.get_json() or {}
+        items = data.get('items')
+        
+        if not isinstance(items, list) or not items:
+            return jsonify({'success': False, 'error': 'items must be a non-empty list'}), 400
+        
+        if len(items) > MAX_CONFIRM_BATCH_SIZE:
+            return jsonify({
+                'success': False,
+                'error': f'At most {MAX_CONFIRM_BATCH_SIZE} items per batch'
+            }), 400
+        
+        db = get_db()
+        now = datetime.utcnow()
+        
+        biometric_ids = [item.get('biometric_id') for item in items if isinstance(item, dict)]
+        users_by_biometric_id = {
+            user['biometric_id']: user
+            for user in db.users.find(
+                {'biometric_id': {'$in': [b for b in biometric_ids if _is_biometric_id(b)]}},
+                {'employee_id': 1, 'biometric_id': 1, 'first_name': 1, 'last_name': 1, 'full_name': 1}
+            )
+        }
+        
+        results = []
+        fingerprint_ops = []
+        user_ops = []
+        confirmed_ids = []
+        # Index into results of each queued write
+        pending = []
+        seen = set()
+        
+        for item in items:
+            biometric_id = item.get('biometric_id') if isinstance(item, dict) else None
+            if biometric_id is None:
+                results.append({'success': False, 'error': 'biometric_id is required'})
+                continue
+            if not _is_biometric_id(biometric_id):
+                results.append({'success': False, 'error': 'biometric_id must be a number or a string'})
+                continue
+            if biometric_id in seen:
+                results.append({'success': False, 'biometric_id': biometric_id, 'error': 'Duplicate biometric_id in batch'})
+                continue
+            seen.add(biometric_id)
+            
+            user = users_by_biometric_id.get(biometric_id)
+            if not user:
+                results.append({
+                    'success': False,
+                    'biometric_id': biometric_id,
+                    'error': f'User with biometric_id {biometric_id} not found'
+                })
+                continue
+            
+            employee_id = user.get('employee_id')
+            template_data = item.get('template_data')
+            
+            fingerprint_data = {
+                'employee_id': employee_id,
+                'biometric_id': biometric_id,
+                'device_id': str(biometric_id),
+                'enrolled_at': now,
+                'updated_at': now,
+                'is_active': True,
+                'has_backup': bool(template_data)
+            }
+            if template_data:
+                fingerprint_data['template_data'] = template_data
+                fingerprint_data['template_format'] = 'ZKTeco_Base64'
+            
+            fingerprint_ops.append(UpdateOne(
+                {'employee_id': employee_id},
+                {'$set': fingerprint_data},
+                upsert=True
+            ))
+            user_ops.append(UpdateOne(
+                {'_id': user['_id']},
+                {
+                    '$set': {
+                        'has_fingerprint': True,
+                        'fingerprint_status': 'ENROLLED',
+                        'fingerprint_device_id': str(biometric_id),
+                        'fingerprint_enrolled_at': now,
+                        'updated_at': now
+                    },
+                    '$unset': {'enrollment_lease': ''}
+                }
+            ))
+            confirmed_ids.append(biometric_id)
+            pending.append(len(results))
+            results.append({
+                'success': True,
+                'employee_id': employee_id,
+                'biometric_id': biometric_id,
+                'full_name': user.get('full_name') or f"{user.get('first_name', '')} {user.get('last_name', '')}".strip(),
+                'has_template_backup': bool(template_data)
+            })
+        
+        if fingerprint_ops:
+            failed = _failed_writes(db.fingerprints, fingerprint_ops)
+            # Users are only marked enrolled once their fingerprint record is written
+            written = [index for index in range(len(user_ops)) if index not in failed]
+            if written:
+                user_failed = _failed_writes(db.users, [user_ops[index] for index in written])
+                for position, error in user_failed.items():
+                    failed[written[position]] = error
+            
+            for index, error in failed.items():
+                results[pending[index]] = {
+                    'success': False,
+                    'biometric_id': confirmed_ids[index],
+                    'error': error
+                }
+            confirmed_ids = [b for index, b in enumerate(confirmed_ids) if index not in failed]
+            if confirmed_ids:
+                user_changed({'biometric_id': {'$in': confirmed_ids}})
+        
+        logger.info(f"Batch enrollment confirmed {len(confirmed_ids)} of {len(items)} items")
+        
+        return jsonify({
+            'success': True,
+            'data': results,
+            'confirmed': len(confirmed_ids),
+            'failed': len(items) - len(confirmed_ids)
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Error confirming enrollment batch: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
@@ -0,0 +1,127 @@
+"""
+Holiday Calendar Routes
+"""
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from models.holiday_model import create_holiday, get_holidays, get_holiday_by_id, delete_holiday
+from models.leave_model import parse_leave_date
+from utils.auth_utils import admin_or_supervisor_required, get_current_principal
+from services.business_days import (
+    RECOUNT_LEAVE_DAYS_JOB, count_leave_days, count_working_days,
+    invalidate_business_calendars, recount_pending_leave_days
+)
+from services.job_runner import submit_job
+import logging
+
+logger = logging.getLogger(__name__)
+
+holiday_bp = Blueprint('holidays', __name__)
+
+def _holidays_changed(company_id, user_id):
+    """Rebuild business calendars and recount pending leaves in the background"""
+    invalidate_business_calendars(company_id)
+    submit_job(RECOUNT_LEAVE_DAYS_JOB, recount_pending_leave_days, created_by=user_id, requeue=True)
+
+@holiday_bp.route('', methods=['GET'])
+@jwt_required()
+def list_holidays():
+    """Holidays of the user's company (plus global ones), optionally ?year="""
+    try:
+        current_user = get_current_principal()
+        
+        company_id = current_user['company_id']
+        if current_user['role'] == 'admin' and 'company_id' in request.args:
+            company_id = request.args.get('company_id') or None
+        
+        holidays = get_holidays(company_id, request.args.get('year'))
+        
+        return jsonify({'holidays': holidays}), 200
+        
+    except Exception as e:
+        logger.error(f"Get holidays error: {e}")
+        return jsonify({'error': 'An error occurred'}), 500
+
+@holiday_bp.route('', methods=['POST'])
+@jwt_required()
+@admin_or_supervisor_required
+def add_holiday():
+    """Add a holiday (admins may add global ones with company_id null)"""
+    try:
+        current_user_id = get_jwt_identity()
+        current_user = get_current_principal()
+        data = request.get_json() or {}
+        
+        holiday_date = parse_leave_date(data.get('date'))
+        if not holiday_date or not data.get('name'):
+            return jsonify({'error': 'name and date (YYYY-MM-DD) are required'}), 400
+        
+        company_id = current_user['company_id']
+        if current_user['role'] == 'admin' and 'company_id' in data:
+            company_id = data['company_id'] or None
+        
+        result = create_holiday({
+            'name': data['name'],
+            'date': holiday_date,
+            'company_id': company_id,
+            'created_by': current_user_id
+        })
+        
+        if not result['success']:
+            return jsonify({'error': result['error']}), 400
+        
+        _holidays_changed(company_id, current_user_id)
+        
+        return jsonify({'message': 'Holiday added', 'holiday_id': result['holiday_id']}), 201
+        
+    except Exception as e:
+        logger.error(f"Add holiday error: {e}")
+        return jsonify({'error': 'An error occurred'}), 500
+
+@holiday_bp.route('/<holiday_id>', methods=['DELETE'])
+@jwt_required()
+@admin_or_supervisor_required
+def remove_holiday(holiday_id):
+    """Delete a holiday"""
+    try:
+        current_user_id = get_jwt_identity()
+        current_user = get_current_principal()
+        
+        holiday = get_holiday_by_id(holiday_id)
+        if not holiday:
+            return jsonify({'error': 'Holiday not found'}), 404
+        
+        # Supervisors manage their own company's holidays only
+        if current_user['role'] == 'supervisor' and holiday.get('company_id') != current_user['company_id']:
+            return jsonify({'error': 'Unauthorized'}), 403
+        
+        if not delete_holiday(holiday_id):
+            return jsonify({'error': 'Failed to delete holiday'}), 500
+        
+        _holidays_changed(holiday.get('company_id'), current_user_id)
+        
+        return jsonify({'message': 'Holiday deleted'}), 200
+        
+    except Exception as e:
+        logger.error(f"Delete holiday error: {e}")
+        return jsonify({'error': 'An error occurred'}), 500
+
+@holiday_bp.route('/business-days', methods=['GET'])
+@jwt_required()
+def business_days():
+    """Leave days and working days between ?start= and ?end= (inclusive)"""
+    try:
+        current_user = get_current_principal()
+        
+        start = parse_leave_date(request.args.get('start'))
+        end = parse_leave_date(request.args.get('end'))
+        if not start or not end:
+            return jsonify({'error': 'Valid start and end dates (YYYY-MM-DD) are required'}), 400
+        
+        return jsonify({
+            'leave_days': count_leave_days(current_user['company_id'], start, end),
+            'working_days': count_working_days(current_user['company_id'], start, end)
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Business days error: {e}")
+        return jsonify({'error': 'An error occurred'}), 500
@@ -0,0 +1,45 @@
+"""
+Background Job Routes
+"""
+from flask import Blueprint, jsonify
+from flask_jwt_extended import jwt_required
+from models.job_model import get_job
+from utils.auth_utils import admin_or_supervisor_required
+import logging
+
+logger = logging.getLogger(__name__)
+
+job_bp = Blueprint('jobs', __name__)
+
+@job_bp.route('/<job_id>', methods=['GET'])
+@jwt_required()
+@admin_or_supervisor_required
+def get_job_status(job_id):
+    """Status and progress of a background job"""
+    try:
+        job = get_job(job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        total = job.get('total')
+        percent = round(job['processed'] * 100 / total, 1) if total else (100.0 if job['status'] == 'completed' else 0.0)
+        
+        return jsonify({
+            'job': {
+                'id': job['_id'],
+                'type': job['type'],
+                'status': job['status'],
+                'processed': job['processed'],
+                'total': total,
+                'percent': percent,
+                'result': job.get('result'),
+                'error': job.get('error'),
+                'created_at': job['created_at'].isoformat() if job.get('created_at') else None,
+                'started_at': job['started_at'].isoformat() if job.get('started_at') else None,
+                'finished_at': job['finished_at'].isoformat() if job.get('finished_at') else None
+            }
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Get job status error: {e}")
+        return jsonify({'error': 'An error occurred'}), 500
@@ -5,11 +5,14 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models.leave_model import (
     create_leave_request, get_leave_by_id, get_leaves_by_user,
-    get_all_leaves, update_leave_status, delete_leave, get_leave_statistics
+    get_all_leaves, update_leave_status, delete_leave, get_leave_statistics, parse_leave_date
 )
-from models.user_model import find_user_by_id, update_leave_balance, get_vacation_balance, update_vacation_usage
-from utils.auth_utils import admin_or_supervisor_required
+from models.user_model import update_leave_balance, get_vacation_balance, update_vacation_usage
+from utils.auth_utils import admin_or_supervisor_required, get_current_user, get_current_principal
+from utils.projection_utils import parse_fields
 from services.email_service import send_leave_notification
+from services.business_days import count_leave_days
+from services.leave_calendar import MAX_CALENDAR_RANGE_DAYS, get_team_calendar, check_leave_overlap
 from datetime import datetime
 from models.notif_model import create_notification
 from database import get_db
@@ -19,23 +22,37 @@ logger = logging.getLogger(__name__)
 
 leave_bp = Blueprint('leaves', __name__)
 
+def apply_leave_balance(leave, sign=1):
+    """
+    Charge (sign=1) or credit back (sign=-1) an approved leave's days
+    Annual leave goes to the vacation ledger, other types to leave_balances
+    """
+    days = float(leave.get('days') or 0)
+    leave_type_normalized = leave['leave_type'].lower()
+    
+    if leave_type_normalized == 'annual':
+        update_vacation_usage(leave['user_id'], sign * days)
+    else:
+        update_leave_balance(leave['user_id'], leave_type_normalized, -sign * days)
+
 @leave_bp.route('', methods=['GET'])
 @jwt_required()
 def get_leaves():
     """Get leave requests"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = find_user_by_id(current_user_id)
+        current_user = get_current_principal()
+        projection = parse_fields(request.args.get('fields'))
         
         # Employees see only their leaves
         if current_user['role'] == 'employee':
-            leaves = get_leaves_by_user(current_user_id)
+            leaves = get_leaves_by_user(current_user_id, projection)
         # Supervisors see leaves from their company
         elif current_user['role'] == 'supervisor':
-            leaves = get_all_leaves({'company_id': current_user['company_id']})
+            leaves = get_all_leaves({'company_id': current_user['company_id']}, projection)
         # Admins see all leaves
         else:
-            leaves = get_all_leaves()
+            leaves = get_all_leaves(projection=projection)
         
         return jsonify({'leaves': leaves}), 200
         
@@ -54,7 +71,7 @@ def get_leave(leave_id):
             return jsonify({'error': 'Leave request not found'}), 404
         
         current_user_id = get_jwt_identity()
-        current_user = find_user_by_id(current_user_id)
+        current_user = get_current_principal()
         
         # Check authorization
         if leave['user_id'] != current_user_id and current_user['role'] not in ['admin', 'supervisor']:
@@ -72,19 +89,28 @@ def create_leave():
     """Create leave request"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = find_user_by_id(current_user_id)
+        current_user = get_current_user()
         
         data = request.get_json()
         
         # Validate required fields
-        required_fields = ['leave_type', 'start_date', 'end_date', 'days', 'reason']
+        required_fields = ['leave_type', 'start_date', 'end_date', 'reason']
         for field in required_fields:
             if field not in data:
                 return jsonify({'error': f'{field} is required'}), 400
         
-        # Check leave balance
+        start_at = parse_leave_date(data['start_date'])
+        end_at = parse_leave_date(data['end_date'])
+        if not start_at or not end_at:
+            return jsonify({'error': 'Invalid start or end date'}), 400
+        if end_at < start_at:
+            return jsonify({'error': 'End date must not be before start date'}), 400
+        
+        # Days are counted server-side from the company's working days and holidays
         leave_type = data['leave_type']
-        days = data['days']
+        days = count_leave_days(current_user['company_id'], start_at, end_at)
+        if days == 0:
+            return jsonify({'error': 'The selected dates contain no working days'}), 400
         
         # Normalize leave type to lowercase for consistency
         leave_type_normalized = leave_type.lower()
@@ -170,7 +196,7 @@ def approve_leave(leave_id):
     """Approve leave request"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = find_user_by_id(current_user_id)
+        current_user = get_current_principal()
         
         leave = get_leave_by_id(leave_id)
         
@@ -183,15 +209,19 @@ def approve_leave(leave_id):
         data = request.get_json() or {}
         review_comment = data.get('comment', '')
         
-        # Update leave status
+        # Update leave status (only one reviewer can move it out of pending)
         success = update_leave_status(
             leave_id, 
             'approved', 
             current_user_id,
-            review_comment
+            review_comment,
+            from_statuses=['pending']
         )
         
         if success:
+            # Deduct from the appropriate balance based on leave type
+            apply_leave_balance(leave)
+            
             # Create notification for the employee
             notification_data = {
                 'user_id': leave['user_id'],
@@ -203,16 +233,6 @@ def approve_leave(leave_id):
             }
             create_notification(notification_data)
             
-            # Deduct from appropriate balance based on leave type
-            leave_type_normalized = leave['leave_type'].lower()
-            
-            if leave_type_normalized == 'annual':
-                # For annual leaves, update vacation_used and recalculate balance
-                update_vacation_usage(leave['user_id'], leave['days'])
-            else:
-                # For sick/unpaid leaves, update legacy leave_balance
-                update_leave_balance(leave['user_id'], leave_type_normalized, -leave['days'])
-            
             # Send email notification
             try:
                 send_leave_notification(
@@ -240,7 +260,7 @@ def reject_leave(leave_id):
     """Reject leave request"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = find_user_by_id(current_user_id)
+        current_user = get_current_principal()
         
         leave = get_leave_by_id(leave_id)
         
@@ -258,7 +278,8 @@ def reject_leave(leave_id):
             leave_id, 
             'rejected', 
             current_user_id,
-            review_comment
+            review_comment,
+            from_statuses=['pending']
         )
         
         if success:
@@ -293,27 +314,89 @@ def reject_leave(leave_id):
         logger.error(f"Reject leave error: {e}")
         return jsonify({'error': 'An error occurred'}), 500
 
-@leave_bp.route('/<leave_id>', methods=['DELETE'])
+@leave_bp.route('/<leave_id>/cancel', methods=['POST'])
 @jwt_required()
-def delete_leave_request(leave_id):
-    """Delete leave request (only if pending)"""
+def cancel_leave(leave_id):
+    """
+    Cancel a pending or approved leave request (approved days are credited back)
+    Employees cancel their own approved leave only before it starts
+    """
     try:
         current_user_id = get_jwt_identity()
+        current_user = get_current_principal()
         
         leave = get_leave_by_id(leave_id)
         
         if not leave:
             return jsonify({'error': 'Leave request not found'}), 404
         
+        # Employees cancel their own leaves; supervisors within their company
         if leave['user_id'] != current_user_id:
-            return jsonify({'error': 'Unauthorized'}), 403
+            if current_user['role'] not in ['admin', 'supervisor']:
+                return jsonify({'error': 'Unauthorized'}), 403
+            if current_user['role'] == 'supervisor' and leave.get('company_id') != current_user['company_id']:
+                return jsonify({'error': 'Unauthorized'}), 403
         
-        if leave['status'] != 'pending':
-            return jsonify({'error': 'Cannot delete processed leave request'}), 400
+        if leave['status'] not in ['pending', 'approved']:
+            return jsonify({'error': 'Only pending or approved leave requests can be cancelled'}), 400
+        
+        # Approved leave that has started (or been taken) can only be credited back by a reviewer
+        reviewer = current_user['role'] == 'admin' or (
+            current_user['role'] == 'supervisor' and leave['user_id'] != current_user_id
+        )
+        if leave['status'] == 'approved' and not reviewer:
+            start_at = leave.get('start_at') or parse_leave_date(leave.get('start_date'))
+            if not start_at or start_at <= datetime.utcnow():
+                return jsonify({'error': 'Approved leave can only be cancelled before it starts'}), 400
+        
+        data = request.get_json(silent=True) or {}
+        
+        # Conditional on the status we read, so the credit is applied exactly once
+        success = update_leave_status(
+            leave_id,
+            'cancelled',
+            current_user_id,
+            data.get('comment', ''),
+            from_statuses=[leave['status']]
+        )
+        
+        if not success:
+            return jsonify({'error': 'Leave request was modified, please retry'}), 409
+        
+        if leave['status'] == 'approved':
+            apply_leave_balance(leave, sign=-1)
+        
+        return jsonify({'message': 'Leave request cancelled'}), 200
+        
+    except Exception as e:
+        logger.error(f"Cancel leave error: {e}")
+        return jsonify({'error': 'An error occurred'}), 500
+
+@leave_bp.route('/<leave_id>', methods=['DELETE'])
+@jwt_required()
+def delete_leave_request(leave_id):
+    """Delete leave request (employees: only if pending; admins: any, approved days are credited back)"""
+    try:
+        current_user_id = get_jwt_identity()
+        current_user = get_current_principal()
+        
+        leave = get_leave_by_id(leave_id)
         
-        success = delete_leave(leave_id)
+        if not leave:
+            return jsonify({'error': 'Leave request not found'}), 404
+        
+        if current_user['role'] != 'admin':
+            if leave['user_id'] != current_user_id:
+                return jsonify({'error': 'Unauthorized'}), 403
+            
+            if leave['status'] != 'pending':
+                return jsonify({'error': 'Cannot delete processed leave request'}), 400
+        
+        success = delete_leave(leave_id, status=leave['status'])
         
         if success:
+            if leave['status'] == 'approved':
+                apply_leave_balance(leave, sign=-1)
             return jsonify({'message': 'Leave request deleted'}), 200
         else:
             return jsonify({'error': 'Failed to delete leave request'}), 500
@@ -322,13 +405,105 @@ def delete_leave_request(leave_id):
         logger.error(f"Delete leave error: {e}")
         return jsonify({'error': 'An error occurred'}), 500
 
+def _calendar_range(start_value, end_value):
+    """Parse a date range, returns (start, end, error)"""
+    start = parse_leave_date(start_value)
+    end = parse_leave_date(end_value)
+    if not start or not end:
+        return None, None, 'Valid start and end dates (YYYY-MM-DD) are required'
+    if end < start:
+        return None, None, 'End date must not be before start date'
+    if (end - start).days >= MAX_CALENDAR_RANGE_DAYS:
+        return None, None, f'Date range is limited to {MAX_CALENDAR_RANGE_DAYS} days'
+    return start, end, None
+
+@leave_bp.route('/calendar', methods=['GET'])
+@jwt_required()
+@admin_or_supervisor_required
+def team_calendar():
+    """Who is off between ?start= and ?end= (optionally ?department=, ?include_pending=false)"""
+    try:
+        current_user = get_current_principal()
+        
+        start, end, error = _calendar_range(request.args.get('start'), request.args.get('end'))
+        if error:
+            return jsonify({'error': error}), 400
+        
+        # Supervisors see their own company; admins may pick one
+        company_id = current_user['company_id']
+        if current_user['role'] == 'admin':
+            company_id = request.args.get('company_id') or company_id
+        
+        calendar = get_team_calendar(
+            company_id,
+            start,
+            end,
+            include_pending=request.args.get('include_pending', 'true').lower() != 'false',
+            department=request.args.get('department')
+        )
+        
+        return jsonify({'calendar': calendar}), 200
+        
+    except Exception as e:
+        logger.error(f"Team calendar error: {e}")
+        return jsonify({'error': 'An error occurred'}), 500
+
+@leave_bp.route('/overlap', methods=['POST'])
+@jwt_required()
+def leave_overlap():
+    """
+    Check a proposed leave against teammates' leaves
+    Body: start_date, end_date, optional department, include_pending and
+    max_concurrent (people allowed off at once, including the requester)
+    """
+    try:
+        current_user_id = get_jwt_identity()
+        current_user = get_current_principal()
+        data = request.get_json() or {}
+        
+        start, end, error = _calendar_range(data.get('start_date'), data.get('end_date'))
+        if error:
+            return jsonify({'error': error}), 400
+        
+        # Reviewers can check on behalf of an employee
+        user_id = current_user_id
+        if current_user['role'] in ['admin', 'supervisor'] and data.get('user_id'):
+            user_id = str(data['user_id'])
+        
+        max_concurrent = data.get('max_concurrent')
+        if max_concurrent is not None:
+            try:
+                max_concurrent = int(max_concurrent)
+            except (TypeError, ValueError):
+                return jsonify({'error': 'max_concurrent must be a number'}), 400
+        
+        result = check_leave_overlap(
+            current_user['company_id'],
+            start,
+            end,
+            user_id=user_id,
+            include_pending=bool(data.get('include_pending', False)),
+            department=data.get('department'),
+            max_concurrent=max_concurrent
+        )
+        
+        # Employees only get the numbers, not who is away
+        if current_user['role'] == 'employee':
+            result.pop('overlapping')
+        
+        return jsonify({'overlap': result}), 200
+        
+    except Exception as e:
+        logger.error(f"Leave overlap error: {e}")
+        return jsonify({'error': 'An error occurred'}), 500
+
 @leave_bp.route('/statistics', methods=['GET'])
 @jwt_required()
 def leave_statistics():
     """Get leave statistics"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = find_user_by_id(current_user_id)
+        current_user = get_current_principal()
         
         if current_user['role'] == 'employee':
             stats = get_leave_statistics(user_id=current_user_id)
@@ -10,7 +10,7 @@ from models.notif_model import (
     mark_all_as_read,
     delete_notification
 )
-from models.user_model import find_user_by_id
+from utils.auth_utils import get_current_principal
 from database import get_db
 from bson.objectid import ObjectId
 from datetime import datetime
@@ -124,7 +124,7 @@ def get_user_notifications():
     """Get notifications for current user based on their role"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = find_user_by_id(current_user_id)
+        current_user = get_current_principal()
         
         if not current_user:
             logger.error(f"[NOTIF_ROUTE] User not found: {current_user_id}")
@@ -161,7 +161,7 @@ def get_user_unread_count():
     """Get unread notification count for current user based on role"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = find_user_by_id(current_user_id)
+        current_user = get_current_principal()
         
         if not current_user:
             logger.error(f"[NOTIF_ROUTE] User not found for unread count: {current_user_id}")
@@ -193,7 +193,7 @@ def mark_notification_read(notification_id):
     """Mark a notification as read"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = find_user_by_id(current_user_id)
+        current_user = get_current_principal()
         
         if not current_user:
             return jsonify({'success': False, 'error': 'User not found'}), 404
@@ -250,7 +250,7 @@ def mark_all_notifications_read():
     """Mark all notifications as read for current user based on role"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = find_user_by_id(current_user_id)
+        current_user = get_current_principal()
         
         if not current_user:
             return jsonify({'success': False, 'error': 'User not found'}), 404
@@ -311,7 +311,7 @@ def delete_user_notification(notification_id):
     """Delete a notification"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = find_user_by_id(current_user_id)
+        current_user = get_current_principal()
         
         if not current_user:
             return jsonify({'success': False, 'error': 'User not found'}), 404
@@ -8,8 +8,9 @@ from models.project_model import (
     update_project, delete_project, assign_employee_to_project,
     remove_employee_from_project
 )
-from models.user_model import find_user_by_id
-from utils.auth_utils import admin_or_supervisor_required
+from models.user_model import find_user_by_id, get_users_by_ids
+from utils.projection_utils import parse_fields, includes
+from utils.auth_utils import admin_or_supervisor_required, get_current_user, get_current_principal
 from models.notif_model import create_notification
 from bson.objectid import ObjectId
 import logging
@@ -24,44 +25,45 @@ def get_projects():
     """Get projects based on user role - employees only see their assigned projects"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = find_user_by_id(current_user_id)
+        current_user = get_current_principal()
+        projection = parse_fields(request.args.get('fields'))
 
         # For employees, only return projects they're assigned to
         if current_user['role'] == 'employee':
             from models.project_model import get_user_projects
-            projects = get_user_projects(current_user_id)
+            projects = get_user_projects(current_user_id, projection)
         else:
             # For supervisor/admin, filter by company or show all
             filters = {}
             if current_user['role'] == 'supervisor':
                 filters['company_id'] = current_user['company_id']
             
-            projects = get_all_projects(filters)
-
-        # 🔥 FIX: always return FULL USER OBJECTS
-        # Support both 'assigned_employees' and 'assigned_users' for backward compatibility
-        for project in projects:
-            # Get the assigned user IDs (check both field names)
-            user_ids = project.get('assigned_users', []) or project.get('assigned_employees', [])
-            
-            # Convert all user IDs to strings for consistency
-            user_ids_str = []
-            for uid in user_ids:
-                if isinstance(uid, ObjectId):
-                    user_ids_str.append(str(uid))
-                else:
-                    user_ids_str.append(uid)
-            
-            # Convert user IDs to full user objects
-            project['assigned_users'] = list(
-                filter(None, [
-                    find_user_by_id(uid)
-                    for uid in user_ids_str
-                ])
-            )
-            
-            # Ensure we also keep the IDs in string format
-            project['assigned_employees'] = user_ids_str
+            projects = get_all_projects(filters, projection)
+
+        # Assigned users are only populated when the fieldset includes them
+        populate_users = includes(projection, 'assigned_users', 'assigned_employees')
+        user_fields = parse_fields(request.args.get('user_fields'))
+
+        if populate_users:
+            # 🔥 FIX: always return FULL USER OBJECTS
+            # Support both 'assigned_employees' and 'assigned_users' for backward compatibility
+            for project in projects:
+                # Get the assigned user IDs (check both field names)
+                user_ids = project.get('assigned_users', []) or project.get('assigned_employees', [])
+                
+                # Convert all user IDs to strings for consistency
+                user_ids_str = []
+                for uid in user_ids:
+                    if isinstance(uid, ObjectId):
+                        user_ids_str.append(str(uid))
+                    else:
+                        user_ids_str.append(uid)
+                
+                # Convert user IDs to full user objects (one query per project)
+                project['assigned_users'] = get_users_by_ids(user_ids_str, user_fields)
+                
+                # Ensure we also keep the IDs in string format
+                project['assigned_employees'] = user_ids_str
 
         return jsonify({
             'success': True,
@@ -143,8 +145,7 @@ def assign_user_to_project(project_id, user_id):
     try:
         from services.email_service import send_project_assignment_notification
         
-        current_user_id = get_jwt_identity()
-        current_user = find_user_by_id(current_user_id)
+        current_user = get_current_user()
         
         # Verify user exists and is active
         user = find_user_by_id(user_id)
@@ -229,7 +230,7 @@ def remove_employee(project_id, user_id):
             return jsonify({'success': False, 'error': 'Project not found'}), 404
         
         # Check if user is assigned
-        if user_id not in project.get('assigned_users', []) and user_id not in project.get('assigned_employees', []):
+        if user_id not in project.get('member_ids', []):
             return jsonify({'success': False, 'error': 'User not assigned to this project'}), 400
         
         success = remove_employee_from_project(project_id, user_id)
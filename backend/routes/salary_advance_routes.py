@@ -8,8 +8,8 @@ from models.salary_advance_model import (
     get_salary_advances_by_user, get_all_salary_advances,
     update_salary_advance_status, delete_salary_advance, get_salary_advance_statistics
 )
-from models.user_model import find_user_by_id
-from utils.auth_utils import admin_or_supervisor_required
+from utils.auth_utils import admin_or_supervisor_required, get_current_user, get_current_principal
+from utils.projection_utils import parse_fields
 from services.email_service import send_salary_advance_notification
 from models.notif_model import create_notification
 from database import get_db
@@ -25,17 +25,18 @@ def get_salary_advances():
     """Get salary advance requests"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = find_user_by_id(current_user_id)
+        current_user = get_current_principal()
+        projection = parse_fields(request.args.get('fields'))
         
         # Employees see only their requests
         if current_user['role'] == 'employee':
-            advances = get_salary_advances_by_user(current_user_id)
+            advances = get_salary_advances_by_user(current_user_id, projection)
         # Supervisors see requests from their company
         elif current_user['role'] == 'supervisor':
-            advances = get_all_salary_advances({'company_id': current_user['company_id']})
+            advances = get_all_salary_advances({'company_id': current_user['company_id']}, projection)
         # Admins see all requests
         else:
-            advances = get_all_salary_advances()
+            advances = get_all_salary_advances(projection=projection)
         
         return jsonify({'salary_advances': advances}), 200
         
@@ -54,7 +55,7 @@ def get_salary_advance(advance_id):
             return jsonify({'error': 'Salary advance request not found'}), 404
         
         current_user_id = get_jwt_identity()
-        current_user = find_user_by_id(current_user_id)
+        current_user = get_current_principal()
         
         # Check authorization
         if advance['user_id'] != current_user_id and current_user['role'] not in ['admin', 'supervisor']:
@@ -72,7 +73,7 @@ def create_salary_advance():
     """Create salary advance request"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = find_user_by_id(current_user_id)
+        current_user = get_current_user()
         
         data = request.get_json()
         
@@ -141,7 +142,7 @@ def approve_salary_advance(advance_id):
     """Approve salary advance request"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = find_user_by_id(current_user_id)
+        current_user = get_current_principal()
         
         advance = get_salary_advance_by_id(advance_id)
         
@@ -201,7 +202,7 @@ def reject_salary_advance(advance_id):
     """Reject salary advance request"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = find_user_by_id(current_user_id)
+        current_user = get_current_principal()
         
         advance = get_salary_advance_by_id(advance_id)
         
@@ -289,7 +290,7 @@ def salary_advance_statistics():
     """Get salary advance statistics"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = find_user_by_id(current_user_id)
+        current_user = get_current_principal()
         
         if current_user['role'] == 'employee':
             stats = get_salary_advance_statistics(user_id=current_user_id)
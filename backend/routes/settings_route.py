@@ -2,10 +2,17 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models.settings_model import get_settings, update_settings_data, create_default_settings
-from models.user_model import find_user_by_id, get_all_users
+from models.user_model import get_all_users
 from database import db
 from datetime import datetime
-from utils.auth_utils import admin_required
+from utils.auth_utils import admin_required, get_current_principal
+from services.job_runner import submit_job
+from services.business_days import RECOUNT_LEAVE_DAYS_JOB, invalidate_business_calendars, recount_pending_leave_days
+from services.vacation_balance import (
+    RECALCULATE_BALANCES_JOB, ACCRUE_BALANCES_JOB, RECONCILE_BALANCES_JOB,
+    recalculate_vacation_balances, accrue_vacation_days, reconcile_vacation_ledger,
+    calculate_earned_days, parse_hire_date, get_used_vacation_days
+)
 from services.attendance_service import (
     get_attendance_settings,
     update_attendance_settings,
@@ -46,7 +53,7 @@ def update_app_settings():
     try:
         # Check if user is admin or supervisor
         current_user_id = get_jwt_identity()
-        current_user = find_user_by_id(current_user_id)
+        current_user = get_current_principal()
         
         if current_user['role'] not in ['admin', 'supervisor']:
             return jsonify({'error': 'Unauthorized. Only admins and supervisors can update settings.'}), 403
@@ -68,6 +75,11 @@ def update_app_settings():
         
         updated_settings = update_settings_data(settings_data)
         
+        # Leave day counts depend on include_weekends
+        if 'include_weekends' in settings_data:
+            invalidate_business_calendars()
+            submit_job(RECOUNT_LEAVE_DAYS_JOB, recount_pending_leave_days, created_by=current_user_id, requeue=True)
+        
         return jsonify({'message': 'Settings updated successfully'}), 200
     except Exception as e:
         logger.error(f"Update settings error: {e}")
@@ -80,7 +92,7 @@ def recalculate_all_balances():
     try:
         # Check if user is admin or supervisor
         current_user_id = get_jwt_identity()
-        current_user = find_user_by_id(current_user_id)
+        current_user = get_current_principal()
         
         if current_user['role'] not in ['admin', 'supervisor']:
             return jsonify({'error': 'Unauthorized. Only admins and supervisors can recalculate balances.'}), 403
@@ -88,65 +100,76 @@ def recalculate_all_balances():
         if not settings:
             return jsonify({'error': 'Settings not found'}), 404
         
-        employees = list(db.users.find({'role': 'employee'}))
-        today = datetime.utcnow()
+        job_id, created = submit_job(
+            RECALCULATE_BALANCES_JOB,
+            recalculate_vacation_balances,
+            created_by=current_user_id
+        )
         
-        for employee in employees:
-            if employee.get('hire_date'):
-                hire_date = employee['hire_date']
-                if isinstance(hire_date, str):
-                    hire_date = datetime.fromisoformat(hire_date.replace('Z', '+00:00'))
-                
-                # Calculate months of service
-                months_diff = (today.year - hire_date.year) * 12 + (today.month - hire_date.month)
-                
-                # Exclude probation period
-                months_after_probation = max(0, months_diff - settings.get('probation_period_months', 3))
-                
-                # Calculate earned days
-                earned_days = months_after_probation * settings.get('monthly_vacation_days', 2.5)
-                
-                # Get used vacation days from approved leaves
-                used_vacation = list(db.leaves.find({
-                    'user_id': str(employee['_id']),
-                    'status': 'approved',
-                    'leave_type': 'annual'  # Use normalized type
-                }))
-                
-                used_days = sum([leave.get('days', 0) for leave in used_vacation])
-                
-                # Calculate balance
-                balance = earned_days - used_days
-                
-                # Update employee's vacation balance
-                db.users.update_one(
-                    {'_id': employee['_id']},
-                    {'$set': {
-                        'vacation_balance': balance,
-                        'vacation_earned': earned_days,
-                        'vacation_used': used_days,
-                        'updated_at': datetime.utcnow()
-                    }}
-                )
-        
-        return jsonify({'message': 'All balances recalculated successfully'}), 200
+        return jsonify({
+            'message': 'Balance recalculation started' if created else 'Balance recalculation already in progress',
+            'job_id': job_id,
+            'status_url': f'/api/jobs/{job_id}'
+        }), 202
     except Exception as e:
         logger.error(f"Recalculate balances error: {e}")
         return jsonify({'error': 'An error occurred'}), 500
 
+@settings_bp.route('/accrue-balances', methods=['POST'])
+@jwt_required()
+@admin_required
+def accrue_balances():
+    """Run the monthly vacation accrual now (employees already accrued this month are skipped)"""
+    try:
+        job_id, created = submit_job(ACCRUE_BALANCES_JOB, accrue_vacation_days, created_by=get_jwt_identity())
+        
+        return jsonify({
+            'message': 'Vacation accrual started' if created else 'Vacation accrual already in progress',
+            'job_id': job_id,
+            'status_url': f'/api/jobs/{job_id}'
+        }), 202
+    except Exception as e:
+        logger.error(f"Accrue balances error: {e}")
+        return jsonify({'error': 'An error occurred'}), 500
+
+@settings_bp.route('/reconcile-balances', methods=['POST'])
+@jwt_required()
+@admin_required
+def reconcile_balances():
+    """Check the vacation ledger against approved leaves (?fix=false only reports drift)"""
+    try:
+        fix = request.args.get('fix', 'true').lower() != 'false'
+        job_id, created = submit_job(
+            RECONCILE_BALANCES_JOB,
+            reconcile_vacation_ledger,
+            created_by=get_jwt_identity(),
+            fix=fix
+        )
+        
+        return jsonify({
+            'message': 'Ledger reconciliation started' if created else 'Ledger reconciliation already in progress',
+            'job_id': job_id,
+            'status_url': f'/api/jobs/{job_id}'
+        }), 202
+    except Exception as e:
+        logger.error(f"Reconcile balances error: {e}")
+        return jsonify({'error': 'An error occurred'}), 500
+
 @settings_bp.route('/employee-vacations', methods=['GET'])
 @jwt_required()
 def get_employee_vacations():
     """Get employee vacation data for display"""
     try:
-        current_user_id = get_jwt_identity()
-        current_user = find_user_by_id(current_user_id)
+        current_user = get_current_principal()
         
         # Check if user is admin or supervisor
         if current_user['role'] not in ['admin', 'supervisor']:
             return jsonify({'error': 'Unauthorized'}), 403
         
-        employees = list(db.users.find({'role': 'employee'}))
+        employees = db.users.find({'role': 'employee'}, {
+            'first_name': 1, 'last_name': 1, 'email': 1, 'position': 1, 'hire_date': 1,
+            'vacation_balance': 1, 'vacation_earned': 1, 'vacation_used': 1
+        })
         
         vacations_data = []
         for employee in employees:
@@ -174,7 +197,7 @@ def calculate_employee_balance(employee_id):
     """Calculate vacation balance for specific employee"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = find_user_by_id(current_user_id)
+        current_user = get_current_principal()
         
         # Check permissions
         if current_user['role'] not in ['admin', 'supervisor'] and str(current_user_id) != str(employee_id):
@@ -202,27 +225,15 @@ def calculate_employee_balance(employee_id):
                 'message': 'Hire date not set'
             }), 200
         
-        hire_date = employee['hire_date']
-        if isinstance(hire_date, str):
-            hire_date = datetime.fromisoformat(hire_date.replace('Z', '+00:00'))
-        
-        # Calculate months of service
-        months_diff = (today.year - hire_date.year) * 12 + (today.month - hire_date.month)
+        hire_date = parse_hire_date(employee['hire_date'])
+        if not hire_date:
+            return jsonify({'error': 'Invalid hire date'}), 400
         
-        # Exclude probation period
-        months_after_probation = max(0, months_diff - settings.get('probation_period_months', 3))
-        
-        # Calculate earned days
-        earned_days = months_after_probation * settings.get('monthly_vacation_days', 2.5)
+        # Months of service, excluding the probation period
+        earned_days, months_diff, months_after_probation = calculate_earned_days(hire_date, settings, today)
         
         # Get used vacation days
-        used_vacation = list(db.leaves.find({
-            'user_id': str(employee['_id']),
-            'status': 'approved',
-            'leave_type': 'annual'
-        }))
-        
-        used_days = sum([leave.get('days', 0) for leave in used_vacation])
+        used_days = get_used_vacation_days([employee['_id']]).get(str(employee['_id']), 0)
         
         # Calculate balance
         balance = earned_days - used_days
@@ -283,7 +294,7 @@ def update_attendance_settings_endpoint():
     try:
         # Check if user is admin or supervisor
         current_user_id = get_jwt_identity()
-        current_user = find_user_by_id(current_user_id)
+        current_user = get_current_principal()
         
         if current_user['role'] not in ['admin', 'supervisor']:
             return jsonify({
@@ -306,6 +317,10 @@ def update_attendance_settings_endpoint():
         success = update_attendance_settings(settings_data)
         
         if success:
+            # Working days feed every business-day count
+            invalidate_business_calendars()
+            submit_job(RECOUNT_LEAVE_DAYS_JOB, recount_pending_leave_days, created_by=current_user_id, requeue=True)
+            
             return jsonify({
                 'success': True,
                 'message': 'Attendance settings updated successfully',
@@ -3,46 +3,107 @@ Terminal Routes (Unauthenticated)
 Special routes for biometric desktop terminal - no JWT required
 These are trusted device endpoints for fingerprint enrollment and attendance
 """
-from flask import Blueprint, request, jsonify
-from models.user_model import find_user_by_employee_id, create_user, get_all_users
+from flask import Blueprint, request, jsonify, Response, current_app
+from models.user_model import (
+    find_user_by_employee_id, create_user, create_users_bulk, get_all_users, user_changed
+)
 from models.fingerprint_model import update_fingerprint_template, get_enrolled_templates
 from models.attendance_model import create_attendance_log, get_last_attendance
+from models.device_model import get_device, get_device_scope
+from models.telemetry_model import record_heartbeat
+from models.counter_model import (
+    peek_employee_number, format_employee_id, lease_employee_block, get_device_blocks
+)
+from services.terminal_snapshot import get_full_snapshot, get_delta_snapshot
+from utils.rate_limit_utils import RateLimiter
 import logging
+import math
 
 logger = logging.getLogger(__name__)
 
 terminal_bp = Blueprint('terminal', __name__)
 
+# Offline enrollment ID blocks
+DEFAULT_ID_BLOCK_SIZE = 50
+MAX_ID_BLOCK_SIZE = 500
+
+# Fields of a user in an offline enrollment batch
+BATCH_USER_REQUIRED_FIELDS = ('employee_id', 'email', 'first_name', 'last_name')
+BATCH_USER_OPTIONAL_FIELDS = ('role', 'company_id', 'department', 'position')
+
+# Created on first request from the app config
+_rate_limiter = None
+_ip_rate_limiter = None
+
+def get_terminal_rate_limiter():
+    """Shared token-bucket limiter for all terminal routes"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter(
+            current_app.config.get('TERMINAL_RATE_LIMIT_PER_SECOND', 5),
+            current_app.config.get('TERMINAL_RATE_LIMIT_BURST', 30)
+        )
+    return _rate_limiter
+
+def get_terminal_ip_rate_limiter():
+    """
+    Per-IP limiter checked on every terminal request, so rotating device_ids
+    can't buy fresh bursts (kept apart so they can't evict IP buckets either)
+    """
+    global _ip_rate_limiter
+    if _ip_rate_limiter is None:
+        _ip_rate_limiter = RateLimiter(
+            current_app.config.get('TERMINAL_IP_RATE_LIMIT_PER_SECOND', 50),
+            current_app.config.get('TERMINAL_IP_RATE_LIMIT_BURST', 300)
+        )
+    return _ip_rate_limiter
+
+def _too_many_requests(key, retry_after):
+    logger.warning(f"Terminal rate limit exceeded for {key}")
+    response = jsonify({'error': 'Too many requests, please retry later'})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+@terminal_bp.before_request
+def limit_terminal_requests():
+    """Apply backpressure to a terminal (or IP) stuck in a retry loop"""
+    if request.method == 'OPTIONS' or request.endpoint == 'terminal.terminal_health':
+        return None
+    
+    ip_key = f'ip:{request.remote_addr}'
+    allowed, retry_after = get_terminal_ip_rate_limiter().consume(ip_key)
+    if not allowed:
+        return _too_many_requests(ip_key, retry_after)
+    
+    device_id = request.headers.get('X-Device-ID') or request.args.get('device_id')
+    if not device_id and request.is_json:
+        body = request.get_json(silent=True)
+        if isinstance(body, dict):
+            device_id = body.get('device_id')
+    key = f'device:{device_id}' if device_id else ip_key
+    
+    allowed, retry_after = get_terminal_rate_limiter().consume(key)
+    if allowed:
+        return None
+    
+    return _too_many_requests(key, retry_after)
+
 @terminal_bp.route('/next-employee-id', methods=['GET'])
 def get_next_employee_id():
-    """Get next available employee ID for auto-generation"""
+    """
+    Get next available employee ID for auto-generation
+    Read-only preview: nothing is reserved, so polling it burns no numbers;
+    creation allocates atomically and offline terminals lease ID blocks
+    """
     try:
-        from database import get_db
-        db = get_db()
-        
-        # Find the next available employee ID by checking existing IDs
-        existing_ids = [doc['employee_id'].strip() for doc in db.users.find({}, {'employee_id': 1}) if 'employee_id' in doc]
+        next_number = peek_employee_number()
+        next_employee_id = format_employee_id(next_number)
         
-        # Extract numbers from existing IDs (handle EMP001, EMP0001, etc.)
-        existing_numbers = []
-        for emp_id in existing_ids:
-            emp_id = emp_id.upper().strip()
-            if emp_id.startswith('EMP'):
-                # Extract the numeric part
-                numeric_part = emp_id[3:].strip()
-                if numeric_part.isdigit():
-                    existing_numbers.append(int(numeric_part))
-        
-        # Get next available number (always use 4 digits for consistency)
-        next_number = max(existing_numbers) + 1 if existing_numbers else 1
-        next_employee_id = f"EMP{next_number:04d}"
-        
-        # Double check this ID doesn't exist (in case of formatting differences)
-        while db.users.find_one({'employee_id': next_employee_id}):
-            next_number += 1
-            next_employee_id = f"EMP{next_number:04d}"
-        
-        return jsonify({'employee_id': next_employee_id}), 200
+        return jsonify({
+            'employee_id': next_employee_id,
+            'biometric_id': next_number
+        }), 200
         
     except Exception as e:
         logger.error(f"Next employee ID error: {e}")
@@ -67,9 +128,9 @@ def get_user_by_employee_id(employee_id):
 
 @terminal_bp.route('/users', methods=['GET'])
 def get_all_terminal_users():
-    """Get all users (for biometric terminal user list)"""
+    """Get users for the terminal's site (for biometric terminal user list)"""
     try:
-        users = get_all_users()
+        users = get_all_users(get_device_scope(request.args.get('device_id')))
         
         # Remove passwords from all users
         for user in users:
@@ -81,6 +142,44 @@ def get_all_terminal_users():
         logger.error(f"Terminal get all users error: {e}")
         return jsonify({'error': 'An error occurred'}), 500
 
+@terminal_bp.route('/users/snapshot', methods=['GET'])
+def get_terminal_users_snapshot():
+    """
+    Slim, versioned user list for terminal sync
+    Query params: since (optional users version for a delta),
+                  device_id (optional, limits users to the device's site)
+    """
+    try:
+        since = request.args.get('since', type=int)
+        device_id = request.args.get('device_id')
+        scope = get_device_scope(device_id)
+        
+        if since is None:
+            snapshot = get_full_snapshot(scope)
+        else:
+            snapshot = get_delta_snapshot(since, scope)
+        
+        etag = f'"users-{device_id if scope else "all"}-{"d" + str(since) + "-" if since is not None else ""}{snapshot.version}"'
+        if request.headers.get('If-None-Match') == etag:
+            response = Response(status=304)
+            response.headers['ETag'] = etag
+            return response
+        
+        if 'gzip' in request.headers.get('Accept-Encoding', ''):
+            response = Response(snapshot.gzipped, mimetype='application/json')
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = Response(snapshot.body, mimetype='application/json')
+        
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['ETag'] = etag
+        response.headers['X-Users-Version'] = str(snapshot.version)
+        return response
+        
+    except Exception as e:
+        logger.error(f"Terminal users snapshot error: {e}")
+        return jsonify({'error': 'An error occurred'}), 500
+
 @terminal_bp.route('/users', methods=['POST'])
 def create_terminal_user():
     """Create new user from biometric terminal"""
@@ -137,6 +236,121 @@ def create_terminal_user():
         
         return jsonify({'error': str(e)}), 500
 
+@terminal_bp.route('/id-blocks', methods=['POST'])
+def lease_id_block():
+    """Lease a block of employee IDs so the terminal can enroll offline"""
+    try:
+        data = request.get_json() or {}
+        
+        device_id = data.get('device_id')
+        if not device_id:
+            return jsonify({'error': 'device_id is required'}), 400
+        
+        try:
+            size = int(data.get('size', DEFAULT_ID_BLOCK_SIZE))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'size must be an integer'}), 400
+        
+        if size < 1 or size > MAX_ID_BLOCK_SIZE:
+            return jsonify({'error': f'size must be between 1 and {MAX_ID_BLOCK_SIZE}'}), 400
+        
+        block = lease_employee_block(device_id, size)
+        
+        return jsonify({'data': block}), 201
+        
+    except Exception as e:
+        logger.error(f"Terminal lease ID block error: {e}")
+        return jsonify({'error': 'An error occurred'}), 500
+
+@terminal_bp.route('/users/batch', methods=['POST'])
+def create_terminal_users_batch():
+    """Create users enrolled offline with IDs from leased blocks"""
+    try:
+        data = request.get_json() or {}
+        
+        device_id = data.get('device_id')
+        users = data.get('users')
+        if not device_id:
+            return jsonify({'error': 'device_id is required'}), 400
+        if not isinstance(users, list) or not users:
+            return jsonify({'error': 'users must be a non-empty list'}), 400
+        if len(users) > MAX_ID_BLOCK_SIZE:
+            return jsonify({'error': f'At most {MAX_ID_BLOCK_SIZE} users per batch'}), 400
+        
+        blocks = get_device_blocks(device_id)
+        
+        def leased_to_device(number):
+            return any(
+                block['start'] <= number <= block['end'] and number not in block.get('excluded', [])
+                for block in blocks
+            )
+        
+        results = [None] * len(users)
+        to_create = []
+        positions = []
+        for index, item in enumerate(users):
+            if not isinstance(item, dict):
+                results[index] = {'success': False, 'error': 'Each user must be an object'}
+                continue
+            
+            missing = [f for f in BATCH_USER_REQUIRED_FIELDS if not item.get(f)]
+            if missing:
+                results[index] = {'success': False, 'error': f'{missing[0]} is required'}
+                continue
+            
+            invalid = [
+                f for f in BATCH_USER_REQUIRED_FIELDS + BATCH_USER_OPTIONAL_FIELDS
+                if item.get(f) is not None and not isinstance(item[f], str)
+            ]
+            if invalid:
+                results[index] = {'success': False, 'error': f'{invalid[0]} must be a string'}
+                continue
+            
+            employee_id = item['employee_id'].strip()
+            try:
+                number = int(employee_id[3:]) if employee_id.startswith('EMP') else None
+            except ValueError:
+                number = None
+            
+            if number is None or not leased_to_device(number):
+                results[index] = {
+                    'success': False,
+                    'error': f'Employee ID "{employee_id}" is not in a block leased to {device_id}'
+                }
+                continue
+            
+            to_create.append({
+                'employee_id': employee_id,
+                'biometric_id': number,
+                'email': item['email'],
+                'password': 'ChangeMe123!',  # Default password
+                'first_name': item['first_name'],
+                'last_name': item['last_name'],
+                'role': item.get('role', 'employee'),
+                'company_id': item.get('company_id'),
+                'department': item.get('department', ''),
+                'position': item.get('position', ''),
+                'is_active': True,
+                'enrolled_offline_by': device_id
+            })
+            positions.append(index)
+        
+        if to_create:
+            for index, result in zip(positions, create_users_bulk(to_create)):
+                results[index] = result
+        
+        created = sum(1 for r in results if r['success'])
+        
+        return jsonify({
+            'data': results,
+            'created': created,
+            'failed': len(results) - created
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Terminal batch create users error: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @terminal_bp.route('/fingerprint/update-template/<employee_id>', methods=['POST'])
 def update_template(employee_id):
     """Update fingerprint template (from biometric terminal)"""
@@ -166,6 +380,7 @@ def update_template(employee_id):
                 }
             }
         )
+        user_changed({'employee_id': employee_id})
         
         return jsonify(result), 200
         
@@ -175,9 +390,10 @@ def update_template(employee_id):
 
 @terminal_bp.route('/fingerprint/templates', methods=['GET'])
 def get_templates():
-    """Get all enrolled templates (for biometric terminal)"""
+    """Get enrolled templates for the terminal's site (for biometric terminal)"""
     try:
-        templates = get_enrolled_templates()
+        scope = get_device_scope(request.args.get('device_id'))
+        templates = get_enrolled_templates(scope)
         return jsonify({'data': templates}), 200
         
     except Exception as e:
@@ -225,6 +441,36 @@ def get_last_attendance_record(employee_id):
         logger.error(f"Terminal get last attendance error: {e}")
         return jsonify({'error': str(e)}), 500
 
+@terminal_bp.route('/heartbeat', methods=['POST'])
+def terminal_heartbeat():
+    """
+    Record terminal telemetry
+    Payload: { "device_id": "...", "queue_depth": 0, "sync_version": 0,
+               "latencies_ms": [...], "errors": 0 or {"type": count} }
+    """
+    try:
+        data = request.get_json() or {}
+        
+        device_id = data.get('device_id')
+        if not device_id:
+            return jsonify({'error': 'device_id is required'}), 400
+        
+        device = get_device(device_id)
+        result = record_heartbeat(
+            device_id,
+            data,
+            site_id=device.get('site_id') if device else None,
+            company_id=device.get('company_id') if device else None
+        )
+        
+        return jsonify({'data': result}), 200
+        
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid telemetry payload: {e}'}), 400
+    except Exception as e:
+        logger.error(f"Terminal heartbeat error: {e}")
+        return jsonify({'error': 'An error occurred'}), 500
+
 @terminal_bp.route('/health', methods=['GET'])
 def terminal_health():
     """Health check for biometric terminal"""
@@ -5,9 +5,13 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models.user_model import (
     create_user, find_user_by_id, update_user, 
-    delete_user, get_all_users
+    delete_user, get_all_users, get_employees_dashboard_data,
+    get_user_complete_profile
 )
-from utils.auth_utils import admin_required, admin_or_supervisor_required
+from utils.auth_utils import admin_required, admin_or_supervisor_required, get_current_principal
+from services.employee_search import search_employees
+from services.user_import import IMPORT_FORMATS, IMPORT_ROLES, detect_format, import_users
+from utils.projection_utils import parse_fields
 import logging
 
 logger = logging.getLogger(__name__)
@@ -20,15 +24,14 @@ user_bp = Blueprint('users', __name__)
 def get_users():
     """Get all users (Admin/Supervisor only)"""
     try:
-        current_user_id = get_jwt_identity()
-        current_user = find_user_by_id(current_user_id)
+        current_user = get_current_principal()
         
         # If supervisor, only show users from same company
         filters = {}
         if current_user['role'] == 'supervisor':
             filters['company_id'] = current_user['company_id']
         
-        users = get_all_users(filters)
+        users = get_all_users(filters, parse_fields(request.args.get('fields')))
         
         return jsonify({'users': users}), 200
         
@@ -43,8 +46,7 @@ user_bp.route('', methods=['GET'])
 def get_users():
     """Get all users (Admin/Supervisor only)"""
     try:
-        current_user_id = get_jwt_identity()
-        current_user = find_user_by_id(current_user_id)
+        current_user = get_current_principal()
         
         if not current_user:
             return jsonify({'error': 'Unauthorized'}), 401
@@ -54,7 +56,7 @@ def get_users():
         if current_user.get('role') == 'supervisor':
             filters['company_id'] = current_user.get('company_id')
         
-        users = get_all_users(filters)
+        users = get_all_users(filters, parse_fields(request.args.get('fields')))
         
         return jsonify({
             'success': True,
@@ -66,6 +68,70 @@ def get_users():
         return jsonify({'error': str(e)}), 500
 
 
+@user_bp.route('/dashboard', methods=['GET'])
+@jwt_required()
+@admin_or_supervisor_required
+def get_employees_dashboard():
+    """
+    Employees directory page (Admin/Supervisor only)
+    Query params: search, status, department, company_id, sort, direction, page, limit
+    """
+    try:
+        current_user = get_current_principal()
+        
+        filters = {
+            'search': request.args.get('search'),
+            'status': request.args.get('status'),
+            'department': request.args.get('department'),
+            'company_id': request.args.get('company_id'),
+            'sort': {'key': request.args.get('sort'), 'direction': request.args.get('direction', 'asc')},
+            'page': request.args.get('page', 1),
+            'limit': request.args.get('limit', 50)
+        }
+        
+        # Supervisors only see users from their own company
+        if current_user.get('role') == 'supervisor':
+            filters['company_id'] = current_user.get('company_id')
+        
+        data = get_employees_dashboard_data(filters)
+        
+        if not data.get('success'):
+            return jsonify(data), 500
+        
+        return jsonify(data), 200
+        
+    except Exception as e:
+        logger.error(f"Get employees dashboard error: {e}")
+        return jsonify({'error': 'An error occurred'}), 500
+
+@user_bp.route('/search', methods=['GET'])
+@jwt_required()
+@admin_or_supervisor_required
+def search_users():
+    """
+    Search-as-you-type over names, email, employee ID and position (Admin/Supervisor only)
+    Query params: q, limit (default 10, max 50), include_inactive
+    """
+    try:
+        current_user = get_current_principal()
+        
+        text = request.args.get('q', '').strip()
+        limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+        include_inactive = request.args.get('include_inactive', 'false').lower() == 'true'
+        
+        # Supervisors only see users from their own company
+        company_id = request.args.get('company_id')
+        if current_user.get('role') == 'supervisor':
+            company_id = current_user.get('company_id')
+        
+        results = search_employees(text, limit, company_id, include_inactive) if text else []
+        
+        return jsonify({'users': results, 'count': len(results)}), 200
+        
+    except Exception as e:
+        logger.error(f"Search users error: {e}")
+        return jsonify({'error': 'An error occurred'}), 500
+
 @user_bp.route('/<user_id>/activate', methods=['POST'])
 @jwt_required()
 @admin_or_supervisor_required
@@ -90,7 +156,7 @@ def get_user(user_id):
     """Get user by ID"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = find_user_by_id(current_user_id)
+        current_user = get_current_principal()
         
         # Users can view their own profile, admins and supervisors can view all
         if current_user_id != user_id and current_user['role'] not in ['admin', 'supervisor']:
@@ -109,6 +175,39 @@ def get_user(user_id):
         logger.error(f"Get user error: {e}")
         return jsonify({'error': 'An error occurred'}), 500
 
+@user_bp.route('/<user_id>/profile', methods=['GET'])
+@jwt_required()
+def get_user_profile(user_id):
+    """
+    Get user with company, leaves, attendance and documents
+    Query params: leaves_page, documents_page, page_size (default 20, max 100)
+    """
+    try:
+        current_user_id = get_jwt_identity()
+        current_user = get_current_principal()
+        
+        # Users can view their own profile, admins and supervisors can view all
+        if current_user_id != user_id and current_user['role'] not in ['admin', 'supervisor']:
+            return jsonify({'error': 'Unauthorized'}), 403
+        
+        profile = get_user_complete_profile(
+            user_id,
+            leaves_page=request.args.get('leaves_page', 1, type=int),
+            documents_page=request.args.get('documents_page', 1, type=int),
+            page_size=request.args.get('page_size', 20, type=int)
+        )
+        
+        if not profile.get('success'):
+            if profile.get('error') == 'User not found':
+                return jsonify({'error': 'User not found'}), 404
+            return jsonify({'error': 'An error occurred'}), 500
+        
+        return jsonify(profile), 200
+        
+    except Exception as e:
+        logger.error(f"Get user profile error: {e}")
+        return jsonify({'error': 'An error occurred'}), 500
+
 @user_bp.route('', methods=['POST'])
 @jwt_required()
 @admin_or_supervisor_required
@@ -141,13 +240,70 @@ def create_new_user():
         logger.error(f"Create user error: {e}")
         return jsonify({'error': 'An error occurred'}), 500
 
+@user_bp.route('/import', methods=['POST'])
+@jwt_required()
+@admin_or_supervisor_required
+def import_users_route():
+    """
+    Bulk-create users from a CSV or NDJSON upload (Admin or Supervisor)
+    Body: multipart "file" or the raw file as the request body
+    Params: company_id, format (csv|ndjson), default_password, dry_run
+    """
+    try:
+        current_user = get_current_principal()
+        params = request.form if request.files else request.args
+        
+        upload = request.files.get('file')
+        if upload:
+            text = upload.read().decode('utf-8-sig')
+        else:
+            text = request.get_data(as_text=True)
+        
+        if not text or not text.strip():
+            return jsonify({'error': 'Import file is required'}), 400
+        
+        fmt = detect_format(upload.filename if upload else None, request.content_type, params.get('format'))
+        if fmt not in IMPORT_FORMATS:
+            return jsonify({'error': f"format must be one of: {', '.join(IMPORT_FORMATS)}"}), 400
+        
+        # Supervisors import into their own company and cannot create admins
+        company_id = params.get('company_id')
+        allowed_roles = IMPORT_ROLES
+        if current_user.get('role') == 'supervisor':
+            company_id = current_user.get('company_id')
+            allowed_roles = tuple(role for role in IMPORT_ROLES if role != 'admin')
+        
+        if not company_id:
+            return jsonify({'error': 'company_id is required'}), 400
+        
+        summary = import_users(
+            text,
+            fmt,
+            company_id,
+            default_password=params.get('default_password'),
+            allowed_roles=allowed_roles,
+            dry_run=params.get('dry_run', 'false').lower() == 'true'
+        )
+        
+        status = 201 if summary['created'] else 200
+        if not summary['valid']:
+            status = 400
+        
+        return jsonify(summary), status
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Import users error: {e}")
+        return jsonify({'error': 'An error occurred'}), 500
+
 @user_bp.route('/<user_id>', methods=['PUT'])
 @jwt_required()
 def update_user_profile(user_id):
     """Update user profile"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = find_user_by_id(current_user_id)
+        current_user = get_current_principal()
         
         # Users can update their own profile, admins can update all
         if current_user_id != user_id and current_user['role'] != 'admin':
@@ -236,27 +392,23 @@ def get_user_public(employee_id):
 def get_user_by_biometric_id(biometric_id):
     """Get user by biometric ID - For attendance tracking"""
     try:
-        from database import get_db
-        db = get_db()
-        user = db.users.find_one({'biometric_id': biometric_id})
+        from services.employee_directory import find_by_biometric_id
+        user = find_by_biometric_id(biometric_id)
         
         if not user:
             logger.warning(f"No user found with biometric_id: {biometric_id}")
             return jsonify({'user': None}), 404
         
-        # Convert ObjectId to string
-        user['_id'] = str(user['_id'])
-        
         # Return user data for attendance
         return jsonify({
             'user': {
-                '_id': user['_id'],
-                'employee_id': user.get('employee_id'),
-                'biometric_id': user.get('biometric_id'),
-                'first_name': user.get('first_name'),
-                'last_name': user.get('last_name'),
-                'department': user.get('department'),
-                'position': user.get('position')
+                '_id': user.user_id,
+                'employee_id': user.employee_id,
+                'biometric_id': user.biometric_id,
+                'first_name': user.first_name,
+                'last_name': user.last_name,
+                'department': user.department,
+                'position': user.position
             }
         }), 200
         
@@ -0,0 +1,206 @@
+"""
+Business Days - Working-day arithmetic over per-company holiday calendars
+Each company gets NumPy busdaycalendars (weekmask + sorted holiday array)
+built once; day counts for any number of ranges are then a single
+vectorized busday_count call. Cached calendars are tagged with a version
+counter bumped on every holiday/working-day change, so every process
+rebuilds them on its next use.
+"""
+from database import get_db
+from models.counter_model import get_current_sequence, get_next_sequence
+from models.holiday_model import get_holiday_dates
+from models.leave_model import leave_changed
+from models.settings_model import get_settings
+from pymongo import UpdateOne
+from datetime import datetime
+import numpy as np
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+WEEKDAY_NAMES = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+
+DEFAULT_WORKING_DAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri')
+
+# Bumped by invalidate_business_calendars, checked on every calendar lookup
+CALENDAR_VERSION_SEQUENCE = 'business_calendar_version'
+
+# Backstop for holiday/settings edits made straight in the database
+CALENDAR_TTL_SECONDS = 300
+
+RECOUNT_LEAVE_DAYS_JOB = 'recount_pending_leave_days'
+
+RECOUNT_CHUNK_SIZE = 1000
+
+
+def weekmask_from_days(days):
+    """['Mon', 'Tue', ...] as a 7-item boolean weekmask (Mon-Fri if empty/invalid)"""
+    mask = [name in (days or ()) for name in WEEKDAY_NAMES]
+    if not any(mask):
+        mask = [name in DEFAULT_WORKING_DAYS for name in WEEKDAY_NAMES]
+    return mask
+
+
+def _as_days(values):
+    """Datetimes/dates (or datetime64) as a datetime64[D] array"""
+    if isinstance(values, np.ndarray):
+        return values.astype('datetime64[D]')
+    return np.array(list(values), dtype='datetime64[D]')
+
+
+class BusinessCalendar:
+    """
+    Weekmasks and holidays of one company
+    leave: days a leave consumes (every day but holidays when the
+    include_weekends setting is on); work: days attendance is expected
+    """
+    __slots__ = ('leave', 'work', 'holidays')
+
+    def __init__(self, working_days, include_weekends, holidays):
+        self.holidays = np.unique(_as_days(holidays)) if holidays else np.array([], dtype='datetime64[D]')
+        work_mask = weekmask_from_days(working_days)
+        leave_mask = [True] * 7 if include_weekends else work_mask
+        self.work = np.busdaycalendar(weekmask=work_mask, holidays=self.holidays)
+        self.leave = np.busdaycalendar(weekmask=leave_mask, holidays=self.holidays)
+
+    def count(self, starts, ends, kind='leave'):
+        """Inclusive business-day counts for arrays of start/end dates"""
+        starts = _as_days(starts)
+        ends = _as_days(ends) + np.timedelta64(1, 'D')
+        counts = np.busday_count(starts, ends, busdaycal=getattr(self, kind))
+        # Reversed ranges count negative; they consume nothing
+        return np.maximum(counts, 0)
+
+    def flags(self, start, end, kind='work'):
+        """Boolean array, one entry per day of [start, end]"""
+        days = np.arange(_as_days([start])[0], _as_days([end])[0] + np.timedelta64(1, 'D'), dtype='datetime64[D]')
+        return np.is_busday(days, busdaycal=getattr(self, kind))
+
+
+class BusinessCalendarCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calendars = {}
+
+    def invalidate(self, company_id=None):
+        """Drop one company's calendar, or all of them (company_id None)"""
+        with self._lock:
+            if company_id is None:
+                self._calendars.clear()
+            else:
+                self._calendars.pop(company_id, None)
+
+    def get(self, company_id):
+        version = get_current_sequence(CALENDAR_VERSION_SEQUENCE)
+        with self._lock:
+            cached = self._calendars.get(company_id)
+        if cached and cached[2] == version and time.monotonic() - cached[1] < CALENDAR_TTL_SECONDS:
+            return cached[0]
+
+        settings = get_settings() or {}
+        attendance = settings.get('attendance') or {}
+        calendar = BusinessCalendar(
+            attendance.get('working_days', DEFAULT_WORKING_DAYS),
+            settings.get('include_weekends', False),
+            get_holiday_dates(company_id)
+        )
+        with self._lock:
+            self._calendars[company_id] = (calendar, time.monotonic(), version)
+        return calendar
+
+
+calendars = BusinessCalendarCache()
+
+
+def invalidate_business_calendars(company_id=None):
+    """
+    Call after holiday or working-day settings changes
+    Bumps the shared version, so other processes drop their copies too
+    """
+    get_next_sequence(CALENDAR_VERSION_SEQUENCE)
+    calendars.invalidate(company_id)
+
+
+def count_leave_days(company_id, start, end):
+    """Days a leave from start to end (inclusive) consumes"""
+    return int(calendars.get(company_id).count([start], [end])[0])
+
+
+def count_leave_days_bulk(company_id, starts, ends):
+    """Vectorized count_leave_days for many ranges of one company"""
+    if not len(starts):
+        return np.array([], dtype=np.int64)
+    return calendars.get(company_id).count(starts, ends)
+
+
+def count_working_days(company_id, start, end):
+    """Days attendance is expected between start and end (inclusive)"""
+    return int(calendars.get(company_id).count([start], [end], kind='work')[0])
+
+
+def working_day_flags(company_id, start, end):
+    """Per-day working-day flags for [start, end], as a list of bools"""
+    return calendars.get(company_id).flags(start, end).tolist()
+
+
+def recount_pending_leave_days(progress=None, company_id=None):
+    """
+    Recount days of pending leaves after holidays or working days changed
+    Counts come from one vectorized call per company and chunk; approved
+    leaves are left alone since they are already charged to the ledger.
+    """
+    db = get_db()
+    query = {'status': 'pending', 'start_at': {'$ne': None}, 'end_at': {'$ne': None}}
+    if company_id is not None:
+        query['company_id'] = company_id
+
+    total = db.leaves.count_documents(query)
+    if progress:
+        progress(0, total)
+
+    processed = 0
+    updated = 0
+    cursor = db.leaves.find(query, {'company_id': 1, 'start_at': 1, 'end_at': 1, 'days': 1}, batch_size=RECOUNT_CHUNK_SIZE)
+    chunk = []
+
+    def flush():
+        nonlocal processed, updated
+        by_company = {}
+        for leave in chunk:
+            by_company.setdefault(leave.get('company_id'), []).append(leave)
+
+        operations = []
+        changed_companies = set()
+        for leave_company_id, leaves in by_company.items():
+            counts = count_leave_days_bulk(
+                leave_company_id,
+                [leave['start_at'] for leave in leaves],
+                [leave['end_at'] for leave in leaves]
+            )
+            for leave, days in zip(leaves, counts.tolist()):
+                if leave.get('days') != days:
+                    operations.append(UpdateOne(
+                        {'_id': leave['_id'], 'status': 'pending'},
+                        {'$set': {'days': days, 'updated_at': datetime.utcnow()}}
+                    ))
+                    changed_companies.add(leave_company_id)
+
+        if operations:
+            updated += db.leaves.bulk_write(operations, ordered=False).modified_count
+            for changed_company_id in changed_companies:
+                leave_changed(changed_company_id)
+        processed += len(chunk)
+        chunk.clear()
+        if progress:
+            progress(processed, total)
+
+    for leave in cursor:
+        chunk.append(leave)
+        if len(chunk) >= RECOUNT_CHUNK_SIZE:
+            flush()
+    flush()
+
+    logger.info(f"Recounted {processed} pending leaves ({updated} changed)")
+    return {'processed': processed, 'updated': updated}
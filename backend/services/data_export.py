@@ -0,0 +1,184 @@
+"""
+Data Export Service - Streams collections as NDJSON or CSV inside a ZIP
+Documents are read from batched cursors, converted on the fly and written
+straight into the archive, which is yielded to the response in chunks, so
+memory stays flat whatever the database size.
+"""
+from database import get_db
+from bson.objectid import ObjectId
+from bson.decimal128 import Decimal128
+from datetime import datetime, date
+import zipfile
+import base64
+import json
+import csv
+import io
+import logging
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+
+EXPORT_BATCH_SIZE = 1000
+
+# Bytes buffered before a chunk is handed to the response
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+# Fields never exported, per collection
+EXPORT_EXCLUDED_FIELDS = {
+    'users': ['password']
+}
+
+
+def _bson_default(value):
+    """JSON encoding for BSON types"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal128):
+        return str(value.to_decimal())
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode('ascii')
+    return str(value)
+
+
+def _dumps(value):
+    return json.dumps(value, default=_bson_default, ensure_ascii=False, separators=(',', ':'))
+
+
+def _csv_cell(value):
+    """Scalars as text, nested documents/arrays as JSON"""
+    if value is None:
+        return ''
+    if isinstance(value, (dict, list)):
+        return _dumps(value)
+    if isinstance(value, (ObjectId, datetime, date, Decimal128, bytes)):
+        return _bson_default(value)
+    return value
+
+
+class _StreamBuffer:
+    """Write-only, non-seekable sink that zipfile writes into and we drain"""
+
+    def __init__(self):
+        self._chunks = []
+        self._size = 0
+        self._offset = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._size += len(data)
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def pending(self):
+        return self._size
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        self._size = 0
+        return data
+
+
+def get_exportable_collections(requested=None):
+    """Collection names to export (system collections are skipped)"""
+    db = get_db()
+    names = sorted(name for name in db.list_collection_names() if not name.startswith('system.'))
+    if requested:
+        names = [name for name in names if name in set(requested)]
+    return names
+
+
+def get_csv_headers(collection_name):
+    """Union of top-level field names, computed by the database"""
+    db = get_db()
+    excluded = EXPORT_EXCLUDED_FIELDS.get(collection_name, [])
+    keys = [
+        doc['_id'] for doc in db[collection_name].aggregate([
+            {'$project': {'keys': {'$objectToArray': '$$ROOT'}}},
+            {'$unwind': '$keys'},
+            {'$group': {'_id': '$keys.k'}}
+        ], allowDiskUse=True)
+        if doc['_id'] not in excluded
+    ]
+    return sorted(keys, key=lambda key: (key != '_id', key))
+
+
+def _collection_cursor(collection_name):
+    db = get_db()
+    excluded = EXPORT_EXCLUDED_FIELDS.get(collection_name)
+    projection = {field: 0 for field in excluded} if excluded else None
+    return db[collection_name].find({}, projection, batch_size=EXPORT_BATCH_SIZE, no_cursor_timeout=False)
+
+
+def _ndjson_lines(collection_name):
+    for doc in _collection_cursor(collection_name):
+        yield (_dumps(doc) + '\n').encode('utf-8')
+
+
+def _csv_lines(collection_name):
+    headers = get_csv_headers(collection_name)
+    line = io.StringIO()
+    writer = csv.writer(line)
+
+    def render(row):
+        writer.writerow(row)
+        data = line.getvalue().encode('utf-8')
+        line.seek(0)
+        line.truncate()
+        return data
+
+    yield render(headers)
+    for doc in _collection_cursor(collection_name):
+        yield render([_csv_cell(doc.get(key)) for key in headers])
+
+
+def stream_export(fmt='ndjson', collections=None):
+    """
+    Generate the bytes of a ZIP archive with one file per collection
+    plus a manifest with per-collection document counts
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+
+    names = get_exportable_collections(collections)
+    buffer = _StreamBuffer()
+    manifest = {
+        'exported_at': datetime.utcnow().isoformat(),
+        'format': fmt,
+        'collections': {}
+    }
+
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name in names:
+            count = 0
+            lines = _csv_lines(name) if fmt == 'csv' else _ndjson_lines(name)
+            try:
+                with archive.open(f'{name}.{fmt}', mode='w', force_zip64=True) as entry:
+                    for data in lines:
+                        entry.write(data)
+                        count += 1
+                        if buffer.pending() >= EXPORT_CHUNK_SIZE:
+                            yield buffer.drain()
+            except Exception as e:
+                logger.error(f"Error exporting collection {name}: {e}")
+                manifest['collections'][name] = {'error': str(e)}
+                continue
+
+            # The CSV header line is not a document
+            manifest['collections'][name] = {'count': count - 1 if fmt == 'csv' else count}
+            if buffer.pending():
+                yield buffer.drain()
+
+        archive.writestr('manifest.json', json.dumps(manifest, indent=2))
+
+    yield buffer.drain()
+    logger.info(f"Exported {len(names)} collections as {fmt}")
@@ -0,0 +1,302 @@
+"""
+Database Backup - Parallel per-collection BSON dumps and restores
+Each backup is a directory with one gzipped BSON file per collection and a
+manifest (counts, indexes, watermark). Incremental backups only contain
+documents whose updated_at/created_at moved past the watermark of the
+latest backup containing their collection; restore replays each
+collection's chain from its last whole dump. Writes only reach incremental
+backups if they set updated_at (user writes get it from user_changed).
+"""
+from bson import json_util
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from pymongo import InsertOne, ReplaceOne
+from pymongo.errors import BulkWriteError
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import bson
+import gzip
+import os
+import shutil
+import logging
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = 'manifest.json'
+
+# Raw documents are copied byte-for-byte, never decoded into dicts
+RAW_CODEC_OPTIONS = CodecOptions(document_class=RawBSONDocument)
+
+BACKUP_BATCH_SIZE = 1000
+
+# gzip level 6 is ~3x faster than the default 9 for a few % larger files
+BACKUP_COMPRESS_LEVEL = 6
+
+BACKUP_TIMESTAMP_FIELDS = ('updated_at', 'created_at')
+
+# Index options that describe the index rather than configure it
+INDEX_METADATA_FIELDS = ('v', 'key', 'name', 'ns')
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+def _read_manifest(path):
+    with open(os.path.join(path, MANIFEST_FILE), encoding='utf-8') as f:
+        return json_util.loads(f.read())
+
+
+def _write_manifest(path, manifest):
+    with open(os.path.join(path, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        f.write(json_util.dumps(manifest, indent=2))
+
+
+def list_backups(root):
+    """Completed backups under root, oldest first, as (name, manifest)"""
+    if not os.path.isdir(root):
+        return []
+    backups = []
+    for name in sorted(os.listdir(root)):
+        path = os.path.join(root, name)
+        if name.startswith('.') or not os.path.isfile(os.path.join(path, MANIFEST_FILE)):
+            continue
+        backups.append((name, _read_manifest(path)))
+    return backups
+
+
+def _changed_since_query(collection, since):
+    """
+    Filter for documents changed after since, or None when the collection
+    has no timestamp fields (small config collections are always dumped whole)
+    """
+    if since is None:
+        return {}
+    if not collection.find_one({'$or': [{field: {'$exists': True}} for field in BACKUP_TIMESTAMP_FIELDS]}, {'_id': 1}):
+        return None
+    return {'$or': [{field: {'$gt': since}} for field in BACKUP_TIMESTAMP_FIELDS]}
+
+
+def _dump_collection(db, name, path, since):
+    collection = db.get_collection(name, codec_options=RAW_CODEC_OPTIONS)
+    query = _changed_since_query(collection, since)
+    whole = since is None or query is None
+
+    filename = f'{name}.bson.gz'
+    count = 0
+    with gzip.open(os.path.join(path, filename), 'wb', compresslevel=BACKUP_COMPRESS_LEVEL) as f:
+        for doc in collection.find(query or {}, batch_size=BACKUP_BATCH_SIZE):
+            f.write(doc.raw)
+            count += 1
+
+    indexes = []
+    for index in db[name].list_indexes():
+        if index['name'] == '_id_':
+            continue
+        options = {key: value for key, value in index.items() if key not in INDEX_METADATA_FIELDS}
+        indexes.append({'name': index['name'], 'key': list(index['key'].items()), 'options': options})
+
+    logger.info(f"Dumped {count} documents from {name}")
+    return {
+        'file': filename,
+        'count': count,
+        'bytes': os.path.getsize(os.path.join(path, filename)),
+        'whole': whole,
+        'indexes': indexes
+    }
+
+
+def _incremental_bases(previous, names):
+    """
+    {collection: (base backup, since)} from the latest backup containing each
+    collection, so a --collections backup never becomes the base of the others
+    """
+    bases = {}
+    for backup, manifest in reversed(previous):
+        for name in names:
+            if name not in bases and name in manifest['collections']:
+                # The base's start time: writes made while it ran are picked up again
+                bases[name] = (backup, manifest['started_at'])
+        if len(bases) == len(names):
+            break
+    return bases
+
+
+def _claim_backup_dir(root, started_at):
+    """
+    Create the hidden staging directory of a new backup
+    Names have microsecond precision and are claimed with makedirs, so two
+    dumps started together never share a directory.
+    Returns (backup_name, staging_path)
+    """
+    os.makedirs(root, exist_ok=True)
+    while True:
+        backup_name = started_at.strftime('%Y%m%dT%H%M%S%fZ')
+        staging = os.path.join(root, f'.{backup_name}.partial')
+        if not os.path.exists(os.path.join(root, backup_name)):
+            try:
+                os.mkdir(staging)
+                return backup_name, staging
+            except FileExistsError:
+                pass
+        started_at = datetime.utcnow()
+
+
+def create_backup(db, root, incremental=False, collections=None, workers=4):
+    """
+    Dump collections in parallel into a new directory under root
+    Each collection of an incremental backup is based on the latest backup
+    that contains it; collections no earlier backup has are dumped whole.
+    Returns (backup_name, manifest)
+    """
+    started_at = datetime.utcnow()
+
+    names = sorted(name for name in db.list_collection_names() if not name.startswith('system.'))
+    if collections:
+        names = [name for name in names if name in set(collections)]
+
+    bases = {}
+    if incremental:
+        bases = _incremental_bases(list_backups(root), names)
+        if not bases:
+            logger.warning("No previous backup found, taking a full backup")
+
+    # Written under a hidden name and renamed once complete, so a failed
+    # run never becomes the base of the next incremental backup
+    backup_name, staging = _claim_backup_dir(root, started_at)
+    path = os.path.join(root, backup_name)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(names) or 1))) as executor:
+            futures = {
+                name: executor.submit(_dump_collection, db, name, staging, bases.get(name, (None, None))[1])
+                for name in names
+            }
+            results = {name: future.result() for name, future in futures.items()}
+
+        for name, info in results.items():
+            base, since = bases.get(name, (None, None))
+            info['base'] = None if info['whole'] else base
+            info['since'] = None if info['whole'] else since
+
+        manifest = {
+            'database': db.name,
+            'mode': 'incremental' if bases else 'full',
+            # Most recent base, for reference; restore follows the per-collection ones
+            'base': max((base for base, _ in bases.values()), default=None),
+            'since': max((since for _, since in bases.values()), default=None),
+            'started_at': started_at,
+            'finished_at': datetime.utcnow(),
+            'collections': results
+        }
+        _write_manifest(staging, manifest)
+        os.rename(staging, path)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    return backup_name, manifest
+
+
+def _collection_base(manifest, info):
+    """Base backup of one collection's dump (manifests before per-collection bases used the backup's)"""
+    if info['whole']:
+        return None
+    return info['base'] if 'base' in info else manifest['base']
+
+
+def backup_chain(root, name=None):
+    """
+    Dumps to restore up to backup name (default: latest), per collection:
+    {collection: [(backup, info), ...]} from the last whole dump onwards
+    """
+    backups = dict(list_backups(root))
+    if not backups:
+        raise ValueError(f"No backups found in {root}")
+    name = name or sorted(backups)[-1]
+    if name not in backups:
+        raise ValueError(f"Backup {name} not found in {root}")
+
+    chains = {}
+    for collection in backups[name]['collections']:
+        chain = []
+        backup = name
+        while backup:
+            if backup not in backups:
+                raise ValueError(f"Base backup {backup} of {collection} is missing from {root}")
+            info = backups[backup]['collections'].get(collection)
+            if info is None:
+                raise ValueError(f"Base backup {backup} has no dump of {collection}")
+            chain.append((backup, info))
+            backup = _collection_base(backups[backup], info)
+        chains[collection] = list(reversed(chain))
+    return chains
+
+
+def _read_documents(filename):
+    """Raw documents of a dump file, in batches"""
+    batch = []
+    with gzip.open(filename, 'rb') as f:
+        for doc in bson.decode_file_iter(f, codec_options=RAW_CODEC_OPTIONS):
+            batch.append(doc)
+            if len(batch) >= BACKUP_BATCH_SIZE:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def _restore_collection(db, name, files, indexes, drop):
+    """Load dump files in order: whole dumps insert, incremental ones upsert"""
+    collection = db.get_collection(name, codec_options=RAW_CODEC_OPTIONS)
+    if drop:
+        collection.drop()
+
+    written = 0
+    for filename, whole in files:
+        for batch in _read_documents(filename):
+            if whole:
+                requests = [InsertOne(doc) for doc in batch]
+            else:
+                requests = [ReplaceOne({'_id': doc['_id']}, doc, upsert=True) for doc in batch]
+            try:
+                result = collection.bulk_write(requests, ordered=False)
+                written += result.inserted_count + result.upserted_count + result.modified_count
+            except BulkWriteError as e:
+                # Documents already present (restoring over existing data) are kept
+                errors = e.details.get('writeErrors', [])
+                if any(error.get('code') != DUPLICATE_KEY_ERROR for error in errors):
+                    raise
+                written += e.details.get('nInserted', 0) + e.details.get('nUpserted', 0) + e.details.get('nModified', 0)
+
+    # Indexes are built once the data is in, in the order they were dumped
+    for index in indexes:
+        db[name].create_index([tuple(part) for part in index['key']], name=index['name'], **index['options'])
+
+    logger.info(f"Restored {written} documents into {name}")
+    return written
+
+
+def restore_backup(db, root, name=None, collections=None, drop=False, workers=4):
+    """
+    Restore a backup (and the chain it is based on) into db
+    Returns {collection: documents written}
+    """
+    chains = backup_chain(root, name)
+
+    plan = {}
+    for collection, chain in chains.items():
+        if collections and collection not in collections:
+            continue
+        plan[collection] = {
+            'files': [(os.path.join(root, backup, info['file']), info['whole']) for backup, info in chain],
+            'indexes': chain[-1][1]['indexes']
+        }
+
+    backups = sorted({backup for collection in plan for backup, _ in chains[collection]})
+    logger.info(f"Restoring {', '.join(backups)} into {db.name}")
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(plan) or 1))) as executor:
+        futures = {
+            collection: executor.submit(_restore_collection, db, collection, entry['files'], entry['indexes'], drop)
+            for collection, entry in plan.items()
+        }
+        return {collection: future.result() for collection, future in futures.items()}
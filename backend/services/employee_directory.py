@@ -0,0 +1,150 @@
+"""
+Employee Directory - In-process lookup table for terminal hot paths
+Keeps only the fields terminals need, indexed by employee_id and biometric_id,
+so attendance punches never have to fetch user documents from MongoDB.
+"""
+from database import get_db
+from models.user_model import on_user_changed
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+DIRECTORY_FIELDS = (
+    'employee_id', 'biometric_id', 'first_name', 'last_name', 'department',
+    'position', 'company_id', 'is_active', 'has_fingerprint', 'fingerprint_status'
+)
+
+DIRECTORY_PROJECTION = {field: 1 for field in DIRECTORY_FIELDS}
+
+
+def _biometric_key(value):
+    """Normalize biometric IDs (stored as int or numeric string) to int"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class DirectoryEntry:
+    """Compact record for one employee"""
+    __slots__ = ('user_id',) + DIRECTORY_FIELDS
+
+    def __init__(self, user):
+        self.user_id = str(user['_id'])
+        for field in DIRECTORY_FIELDS:
+            setattr(self, field, user.get(field))
+
+    @property
+    def full_name(self):
+        return f"{self.first_name or ''} {self.last_name or ''}".strip()
+
+    def to_dict(self):
+        data = {'_id': self.user_id}
+        for field in DIRECTORY_FIELDS:
+            data[field] = getattr(self, field)
+        return data
+
+
+class EmployeeDirectory:
+    """Thread-safe employee directory with two indexes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_user_id = {}
+        self._by_employee_id = {}
+        self._by_biometric_id = {}
+
+    def warm(self):
+        """Load every user into the directory"""
+        db = get_db()
+        by_user_id = {}
+        by_employee_id = {}
+        by_biometric_id = {}
+
+        for user in db.users.find({}, DIRECTORY_PROJECTION):
+            entry = DirectoryEntry(user)
+            by_user_id[entry.user_id] = entry
+            if entry.employee_id:
+                by_employee_id[entry.employee_id] = entry
+            key = _biometric_key(entry.biometric_id)
+            if key is not None:
+                by_biometric_id[key] = entry
+
+        with self._lock:
+            self._by_user_id = by_user_id
+            self._by_employee_id = by_employee_id
+            self._by_biometric_id = by_biometric_id
+
+        logger.info(f"Employee directory warmed with {len(by_user_id)} users")
+
+    def apply(self, users):
+        """Insert or replace entries for changed user documents"""
+        with self._lock:
+            for user in users:
+                entry = DirectoryEntry(user)
+                previous = self._by_user_id.get(entry.user_id)
+                if previous:
+                    if self._by_employee_id.get(previous.employee_id) is previous:
+                        del self._by_employee_id[previous.employee_id]
+                    key = _biometric_key(previous.biometric_id)
+                    if self._by_biometric_id.get(key) is previous:
+                        del self._by_biometric_id[key]
+
+                self._by_user_id[entry.user_id] = entry
+                if entry.employee_id:
+                    self._by_employee_id[entry.employee_id] = entry
+                key = _biometric_key(entry.biometric_id)
+                if key is not None:
+                    self._by_biometric_id[key] = entry
+
+    def _load(self, query):
+        """Fallback for users created by another worker since warm-up"""
+        user = get_db().users.find_one(query, DIRECTORY_PROJECTION)
+        if not user:
+            return None
+        self.apply([user])
+        return self._by_user_id.get(str(user['_id']))
+
+    def get_by_employee_id(self, employee_id):
+        entry = self._by_employee_id.get(employee_id)
+        if entry is None:
+            entry = self._load({'employee_id': employee_id})
+        return entry
+
+    def get_by_biometric_id(self, biometric_id):
+        key = _biometric_key(biometric_id)
+        if key is None:
+            return None
+        entry = self._by_biometric_id.get(key)
+        if entry is None:
+            entry = self._load({'biometric_id': {'$in': [key, str(key)]}})
+        return entry
+
+    def __len__(self):
+        return len(self._by_user_id)
+
+
+directory = EmployeeDirectory()
+
+# Keep the directory in sync with writes made through user_model and the
+# fingerprint routes
+on_user_changed(directory.apply)
+
+
+def warm_directory():
+    """Populate the directory at startup"""
+    try:
+        directory.warm()
+    except Exception as e:
+        logger.error(f"Error warming employee directory: {e}")
+
+
+def find_by_employee_id(employee_id):
+    """Get a DirectoryEntry by employee ID (None if unknown)"""
+    return directory.get_by_employee_id(employee_id)
+
+
+def find_by_biometric_id(biometric_id):
+    """Get a DirectoryEntry by biometric ID (None if unknown)"""
+    return directory.get_by_biometric_id(biometric_id)
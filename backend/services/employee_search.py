@@ -0,0 +1,311 @@
+"""
+Employee Search - In-process prefix/trigram index for search-as-you-type
+Names, email, employee_id and position are tokenized once; queries find
+candidates through the token vocabulary and only score those, so lookups
+never scan the users collection.
+"""
+from database import get_db
+from models.user_model import on_user_changed
+from collections import Counter
+import threading
+import bisect
+import heapq
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Searchable fields and their weight in the ranking
+SEARCH_FIELDS = {
+    'first_name': 1.0,
+    'last_name': 1.0,
+    'employee_id': 1.0,
+    'email': 0.8,
+    'position': 0.5
+}
+
+RESULT_FIELDS = ('employee_id', 'first_name', 'last_name', 'email', 'position', 'department', 'role', 'company_id', 'is_active')
+
+SEARCH_PROJECTION = {field: 1 for field in RESULT_FIELDS}
+
+# Users scored per query; prefix matches are collected before fuzzy ones
+MAX_CANDIDATES = 200
+
+# Minimum trigram overlap (Jaccard) for a typo match
+FUZZY_THRESHOLD = 0.2
+
+_token_pattern = re.compile(r'[a-z]+|\d+')
+
+
+def _tokens(value):
+    """Lowercase word/number tokens, plus the whole alphanumeric value and unpadded numbers"""
+    if value is None:
+        return set()
+    text = str(value).lower()
+    tokens = set(_token_pattern.findall(text))
+    for token in list(tokens):
+        if token.isdigit() and token.lstrip('0'):
+            tokens.add(token.lstrip('0'))
+    compact = re.sub(r'[^a-z0-9]', '', text)
+    if compact:
+        tokens.add(compact)
+    return tokens
+
+
+def _trigrams(token):
+    """Trigrams with a start marker, so prefixes share their leading grams"""
+    padded = f'^{token}'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _similarity(query, token):
+    """How well one query token matches one indexed token, without typos (0..1)"""
+    if token == query:
+        return 1.0
+    if token.startswith(query):
+        return 0.8
+    if query in token:
+        return 0.6
+    return 0.0
+
+
+def _fuzzy_similarity(query, token):
+    """Trigram overlap score for near-misses (0..0.5)"""
+    query_grams = _trigrams(query)
+    token_grams = _trigrams(token)
+    if not query_grams or not token_grams:
+        return 0.0
+    overlap = len(query_grams & token_grams) / len(query_grams | token_grams)
+    return overlap * 0.5 if overlap >= FUZZY_THRESHOLD else 0.0
+
+
+class SearchEntry:
+    """Indexed tokens and display fields for one employee"""
+    __slots__ = ('user_id', 'tokens', 'data')
+
+    def __init__(self, user):
+        self.user_id = str(user['_id'])
+        # token -> best field weight
+        self.tokens = {}
+        for field, weight in SEARCH_FIELDS.items():
+            for token in _tokens(user.get(field)):
+                self.tokens[token] = max(weight, self.tokens.get(token, 0))
+        self.data = {'_id': self.user_id}
+        for field in RESULT_FIELDS:
+            self.data[field] = user.get(field)
+        self.data['is_active'] = user.get('is_active', True)
+
+    def matches(self, company_id, include_inactive):
+        if company_id and self.data.get('company_id') != company_id:
+            return False
+        return include_inactive or self.data.get('is_active') is not False
+
+    def score(self, query_tokens, fuzzy=_fuzzy_similarity):
+        """Sum of each query token's best weighted match; 0 if any token misses"""
+        total = 0.0
+        for query in query_tokens:
+            best = max((_similarity(query, token) * weight for token, weight in self.tokens.items()), default=0.0)
+            if not best:
+                # Typo tolerance only when nothing matches directly
+                best = max((fuzzy(query, token) * weight for token, weight in self.tokens.items()), default=0.0)
+            if not best:
+                return 0.0
+            total += best
+        return total
+
+
+class EmployeeSearchIndex:
+    """
+    Thread-safe token index over employees
+    A sorted token vocabulary answers prefix queries with a bisect; trigram
+    postings over the vocabulary find near-misses (typos) when prefixes
+    don't fill the page.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._token_users = {}
+        self._sorted_tokens = []
+        self._trigram_tokens = {}
+
+    def _index(self, entry):
+        for token in entry.tokens:
+            users = self._token_users.get(token)
+            if users is None:
+                users = self._token_users[token] = set()
+                bisect.insort(self._sorted_tokens, token)
+                for gram in _trigrams(token):
+                    self._trigram_tokens.setdefault(gram, set()).add(token)
+            users.add(entry.user_id)
+
+    def _unindex(self, entry):
+        for token in entry.tokens:
+            users = self._token_users.get(token)
+            if users is None:
+                continue
+            users.discard(entry.user_id)
+            if users:
+                continue
+            del self._token_users[token]
+            position = bisect.bisect_left(self._sorted_tokens, token)
+            if position < len(self._sorted_tokens) and self._sorted_tokens[position] == token:
+                del self._sorted_tokens[position]
+            for gram in _trigrams(token):
+                tokens = self._trigram_tokens.get(gram)
+                if tokens:
+                    tokens.discard(token)
+                    if not tokens:
+                        del self._trigram_tokens[gram]
+
+    def build(self):
+        """Index every user"""
+        db = get_db()
+        projection = dict(SEARCH_PROJECTION)
+        projection.update({field: 1 for field in SEARCH_FIELDS})
+
+        entries = [SearchEntry(user) for user in db.users.find({}, projection)]
+
+        with self._lock:
+            self._entries = {}
+            self._token_users = {}
+            self._sorted_tokens = []
+            self._trigram_tokens = {}
+            for entry in entries:
+                self._entries[entry.user_id] = entry
+                for token in entry.tokens:
+                    self._token_users.setdefault(token, set()).add(entry.user_id)
+            self._sorted_tokens = sorted(self._token_users)
+            for token in self._sorted_tokens:
+                for gram in _trigrams(token):
+                    self._trigram_tokens.setdefault(gram, set()).add(token)
+
+        logger.info(f"Employee search index built with {len(self._entries)} users, "
+                    f"{len(self._sorted_tokens)} tokens")
+
+    def apply(self, users):
+        """Re-index changed user documents"""
+        with self._lock:
+            for user in users:
+                entry = SearchEntry(user)
+                previous = self._entries.get(entry.user_id)
+                if previous:
+                    self._unindex(previous)
+                self._entries[entry.user_id] = entry
+                self._index(entry)
+
+    def _collect(self, tokens, candidates, accept):
+        """Add users of tokens (in order) to candidates until the cap"""
+        for token in tokens:
+            for user_id in self._token_users.get(token, ()):
+                if user_id not in candidates and accept(self._entries[user_id]):
+                    candidates.add(user_id)
+                    if len(candidates) >= MAX_CANDIDATES:
+                        return
+
+    def _prefix_tokens(self, query):
+        """Vocabulary tokens starting with query, exact match first"""
+        position = bisect.bisect_left(self._sorted_tokens, query)
+        while position < len(self._sorted_tokens) and self._sorted_tokens[position].startswith(query):
+            yield self._sorted_tokens[position]
+            position += 1
+
+    def _prefix_users(self, query):
+        """Users having a token that starts with query"""
+        users = set()
+        for token in self._prefix_tokens(query):
+            users.update(self._token_users.get(token, ()))
+        return users
+
+    def _fuzzy_tokens(self, query):
+        """Vocabulary tokens sharing enough trigrams with query, best first"""
+        grams = _trigrams(query)
+        if not grams:
+            return []
+        counts = Counter()
+        for gram in grams:
+            counts.update(self._trigram_tokens.get(gram, ()))
+        # Jaccard from the shared-gram count (a token has len - 1 padded grams)
+        scored = []
+        for token, count in counts.items():
+            overlap = count / (len(grams) + max(len(token) - 1, 1) - count)
+            if overlap >= FUZZY_THRESHOLD:
+                scored.append((overlap, token))
+        scored.sort(reverse=True)
+        return [token for _, token in scored]
+
+    def search(self, text, limit=10, company_id=None, include_inactive=False):
+        """
+        Ranked top-k matches for a search box query
+        """
+        query_tokens = sorted(set(_token_pattern.findall(str(text or '').lower())), key=len, reverse=True)
+        if not query_tokens:
+            return []
+
+        def accept(entry):
+            return entry.matches(company_id, include_inactive)
+
+        with self._lock:
+            # Candidates come from the query token with the fewest prefix
+            # matches and must prefix-match every other token before the
+            # cap applies, so common first tokens can't crowd out the hit
+            candidates = set()
+            if len(query_tokens) == 1:
+                self._collect(self._prefix_tokens(query_tokens[0]), candidates, accept)
+            else:
+                postings = sorted(
+                    ((self._prefix_users(token), token) for token in query_tokens),
+                    key=lambda item: len(item[0])
+                )
+                others = [users for users, _ in postings[1:]]
+                self._collect(
+                    self._prefix_tokens(postings[0][1]), candidates,
+                    lambda entry: all(entry.user_id in users for users in others) and accept(entry)
+                )
+            # Typo fallback from the longest token; scoring still requires every token to match
+            anchor = query_tokens[0]
+            if len(candidates) < limit and len(anchor) >= 3:
+                self._collect(self._fuzzy_tokens(anchor), candidates, accept)
+
+            # Vocabulary tokens repeat across users (domains, positions,
+            # common names), so trigram scores are computed once per query
+            fuzzy_scores = {}
+
+            def fuzzy(query, token):
+                key = (query, token)
+                if key not in fuzzy_scores:
+                    fuzzy_scores[key] = _fuzzy_similarity(query, token)
+                return fuzzy_scores[key]
+
+            scored = []
+            for user_id in candidates:
+                entry = self._entries[user_id]
+                score = entry.score(query_tokens, fuzzy)
+                if score:
+                    scored.append((score, entry))
+
+            top = heapq.nlargest(limit, scored, key=lambda item: item[0])
+
+        return [dict(entry.data, score=round(score, 3)) for score, entry in top]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+search_index = EmployeeSearchIndex()
+
+# Re-index on every write made through user_model
+on_user_changed(search_index.apply)
+
+
+def build_search_index():
+    """Populate the search index at startup"""
+    try:
+        search_index.build()
+    except Exception as e:
+        logger.error(f"Error building employee search index: {e}")
+
+
+def search_employees(text, limit=10, company_id=None, include_inactive=False):
+    """Ranked employee matches for search-as-you-type"""
+    return search_index.search(text, limit, company_id, include_inactive)
@@ -0,0 +1,83 @@
+"""
+Job Runner - Runs long operations on background threads
+Requests get a job id back immediately (202); the job records its progress
+in the jobs collection, which clients poll through /api/jobs/<job_id>.
+"""
+from models.job_model import (
+    create_job, start_job, update_job_progress, complete_job, fail_job, find_active_job,
+    request_job_rerun, take_job_rerun
+)
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = 2
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='job')
+
+
+def _run(job_id, job_type, fn, created_by, params):
+    try:
+        start_job(job_id)
+
+        def progress(processed, total=None):
+            update_job_progress(job_id, processed, total)
+
+        result = fn(progress=progress, **params)
+        complete_job(job_id, result)
+        logger.info(f"Job {job_type} {job_id} completed")
+    except Exception as e:
+        logger.error(f"Job {job_type} {job_id} failed: {e}", exc_info=True)
+        fail_job(job_id, e)
+
+    try:
+        if take_job_rerun(job_id):
+            logger.info(f"Job {job_type} {job_id} rerun requested, resubmitting")
+            submit_job(job_type, fn, created_by=created_by, **params)
+    except Exception as e:
+        logger.error(f"Error resubmitting job {job_type}: {e}")
+
+
+def submit_job(job_type, fn, created_by=None, requeue=False, **params):
+    """
+    Queue fn(progress=..., **params) unless a job of the same type is already active
+    requeue: the active job may have read its input before the caller's
+    change, so have it run once more when it finishes (repeated requests
+    while it runs collapse into a single rerun)
+    Returns (job_id, created)
+    """
+    while True:
+        active = find_active_job(job_type)
+        if not active:
+            break
+        if not requeue or request_job_rerun(active['_id']):
+            return active['_id'], False
+        # Finished between the two reads: submit a fresh job instead
+
+    job_id = create_job(job_type, created_by, params)
+    _executor.submit(_run, job_id, job_type, fn, created_by, params)
+    return job_id, True
+
+
+def schedule_job(job_type, fn, interval_seconds, initial_delay=60, **params):
+    """
+    Submit fn every interval_seconds from a daemon thread
+    Scheduled functions must be idempotent: every app process runs the
+    schedule, and only the active-job check keeps runs from overlapping.
+    """
+    def loop():
+        delay = initial_delay
+        while True:
+            time.sleep(delay)
+            delay = interval_seconds
+            try:
+                submit_job(job_type, fn, created_by='scheduler', **params)
+            except Exception as e:
+                logger.error(f"Error scheduling job {job_type}: {e}")
+
+    thread = threading.Thread(target=loop, name=f'schedule-{job_type}', daemon=True)
+    thread.start()
+    return thread
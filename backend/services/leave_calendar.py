@@ -0,0 +1,232 @@
+"""
+Leave Calendar - Per-company interval trees over pending/approved leaves
+Each company's recent leaves are loaded once into a centered interval tree
+(dates as day ordinals); "who is off between A and B" then visits only the
+intervals that can overlap. Trees are dropped on every leave write and
+rebuilt lazily on the next query.
+"""
+from database import get_db
+from models.leave_model import on_leave_changed
+from bson.objectid import ObjectId
+from datetime import datetime, timedelta
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+CALENDAR_STATUSES = ('pending', 'approved')
+
+# Trees hold leaves ending within this many days in the past (and all
+# future ones); older ranges are answered straight from the index
+CALENDAR_HISTORY_DAYS = 400
+
+# Backstop for writes made by other processes
+CALENDAR_TTL_SECONDS = 60
+
+MAX_CALENDAR_RANGE_DAYS = 366
+
+LEAVE_FIELDS = ('user_id', 'user_name', 'leave_type', 'status', 'start_date', 'end_date', 'days', 'start_at', 'end_at')
+
+
+class LeaveInterval:
+    """One leave as an inclusive [start, end] range of day ordinals"""
+    __slots__ = ('start', 'end', 'leave')
+
+    def __init__(self, start, end, leave):
+        self.start = start
+        self.end = end
+        self.leave = leave
+
+
+class IntervalNode:
+    """Intervals containing center, sorted both ways, plus the subtrees on either side"""
+    __slots__ = ('center', 'by_start', 'by_end', 'left', 'right')
+
+    def __init__(self, intervals):
+        points = sorted(point for interval in intervals for point in (interval.start, interval.end))
+        self.center = points[len(points) // 2]
+
+        here, left, right = [], [], []
+        for interval in intervals:
+            if interval.end < self.center:
+                left.append(interval)
+            elif interval.start > self.center:
+                right.append(interval)
+            else:
+                here.append(interval)
+
+        self.by_start = sorted(here, key=lambda interval: interval.start)
+        self.by_end = sorted(here, key=lambda interval: interval.end, reverse=True)
+        self.left = IntervalNode(left) if left else None
+        self.right = IntervalNode(right) if right else None
+
+    def query(self, low, high, found):
+        node = self
+        while node:
+            if high < node.center:
+                # Every interval here reaches center > high, so it overlaps iff it starts by high
+                for interval in node.by_start:
+                    if interval.start > high:
+                        break
+                    found.append(interval)
+                node = node.left
+            elif low > node.center:
+                for interval in node.by_end:
+                    if interval.end < low:
+                        break
+                    found.append(interval)
+                node = node.right
+            else:
+                found.extend(node.by_start)
+                if node.left:
+                    node.left.query(low, high, found)
+                node = node.right
+        return found
+
+
+class IntervalTree:
+    def __init__(self, intervals):
+        self.size = len(intervals)
+        self.root = IntervalNode(intervals) if intervals else None
+
+    def overlapping(self, low, high):
+        """Intervals intersecting the inclusive day range [low, high]"""
+        if not self.root:
+            return []
+        return self.root.query(low, high, [])
+
+
+def _day(value):
+    return value.toordinal()
+
+
+def _load_intervals(company_id, since=None, low=None, high=None):
+    """Pending/approved leaves of a company as intervals, with the employee's department"""
+    db = get_db()
+    query = {'company_id': company_id, 'status': {'$in': list(CALENDAR_STATUSES)}, 'start_at': {'$ne': None}}
+    if since:
+        query['end_at'] = {'$gte': since}
+    if low and high:
+        query['start_at'] = {'$lte': high}
+        query['end_at'] = {'$gte': low}
+
+    leaves = list(db.leaves.find(query, {field: 1 for field in LEAVE_FIELDS}))
+
+    user_ids = {leave.get('user_id') for leave in leaves if leave.get('user_id')}
+    object_ids = [ObjectId(user_id) for user_id in user_ids if ObjectId.is_valid(user_id)]
+    departments = {
+        str(user['_id']): user.get('department')
+        for user in db.users.find({'_id': {'$in': object_ids}}, {'department': 1})
+    } if object_ids else {}
+
+    intervals = []
+    for leave in leaves:
+        if not leave.get('end_at') or leave['end_at'] < leave['start_at']:
+            continue
+        leave['_id'] = str(leave['_id'])
+        leave['department'] = departments.get(leave.get('user_id'))
+        intervals.append(LeaveInterval(_day(leave['start_at']), _day(leave['end_at']), leave))
+    return intervals
+
+
+class LeaveCalendar:
+    """Lazily built interval tree per company"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._trees = {}
+
+    def invalidate(self, company_id=None):
+        with self._lock:
+            if company_id is None:
+                self._trees.clear()
+            else:
+                self._trees.pop(company_id, None)
+
+    def _tree(self, company_id):
+        with self._lock:
+            cached = self._trees.get(company_id)
+        if cached and time.monotonic() - cached[1] < CALENDAR_TTL_SECONDS:
+            return cached[0], cached[2]
+
+        since = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=CALENDAR_HISTORY_DAYS)
+        tree = IntervalTree(_load_intervals(company_id, since=since))
+        with self._lock:
+            self._trees[company_id] = (tree, time.monotonic(), since)
+        return tree, since
+
+    def overlapping(self, company_id, start, end):
+        """Leave intervals of company_id intersecting [start, end] (datetimes)"""
+        tree, since = self._tree(company_id)
+        if start >= since:
+            return tree.overlapping(_day(start), _day(end))
+        # Older than the tree's window: straight from the (company_id, start_at, end_at) index
+        return _load_intervals(company_id, low=start, high=end)
+
+
+leave_calendar = LeaveCalendar()
+
+# Rebuild a company's tree after any leave write made through leave_model
+on_leave_changed(leave_calendar.invalidate)
+
+
+def _filter(intervals, include_pending=True, department=None, exclude_user_id=None):
+    return [
+        interval for interval in intervals
+        if (include_pending or interval.leave['status'] == 'approved')
+        and (not department or interval.leave.get('department') == department)
+        and (not exclude_user_id or interval.leave.get('user_id') != exclude_user_id)
+    ]
+
+
+def _daily_counts(intervals, start, end):
+    """Distinct employees off on each day of [start, end]"""
+    low, high = _day(start), _day(end)
+    off = [set() for _ in range(high - low + 1)]
+    for interval in intervals:
+        for day in range(max(interval.start, low), min(interval.end, high) + 1):
+            off[day - low].add(interval.leave.get('user_id'))
+    return [
+        {'date': (start + timedelta(days=offset)).strftime('%Y-%m-%d'), 'count': len(users)}
+        for offset, users in enumerate(off)
+    ]
+
+
+def _serialize(interval):
+    leave = dict(interval.leave)
+    leave.pop('start_at', None)
+    leave.pop('end_at', None)
+    return leave
+
+
+def get_team_calendar(company_id, start, end, include_pending=True, department=None):
+    """
+    Leaves overlapping [start, end] and the number of people off per day
+    """
+    intervals = _filter(leave_calendar.overlapping(company_id, start, end), include_pending, department)
+    intervals.sort(key=lambda interval: (interval.start, interval.leave.get('user_name') or ''))
+    return {
+        'leaves': [_serialize(interval) for interval in intervals],
+        'days': _daily_counts(intervals, start, end)
+    }
+
+
+def check_leave_overlap(company_id, start, end, user_id=None, include_pending=False, department=None, max_concurrent=None):
+    """
+    Teammates' leaves overlapping a proposed leave, and the peak number of
+    them off on a single day of it
+    """
+    intervals = _filter(
+        leave_calendar.overlapping(company_id, start, end),
+        include_pending, department, exclude_user_id=user_id
+    )
+    days = _daily_counts(intervals, start, end)
+    peak = max((day['count'] for day in days), default=0)
+    return {
+        'overlapping': [_serialize(interval) for interval in intervals],
+        'overlapping_employees': len({interval.leave.get('user_id') for interval in intervals}),
+        'peak_concurrent': peak,
+        'busiest_days': [day['date'] for day in days if peak and day['count'] == peak],
+        'exceeds_limit': max_concurrent is not None and peak >= max_concurrent
+    }
@@ -0,0 +1,144 @@
+"""
+Terminal Snapshot Service - Slim, versioned user directory for terminals
+Terminals only need IDs, a display name and enrollment state, so the
+snapshot is a compact columnar payload, pre-serialized and gzip-compressed
+once per users-collection version.
+"""
+from database import get_db
+from models.counter_model import get_stamped_users_version
+import threading
+import json
+import gzip
+import logging
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FIELDS = ['employee_id', 'biometric_id', 'name', 'enrolled', 'is_active']
+
+SNAPSHOT_PROJECTION = {
+    'employee_id': 1,
+    'biometric_id': 1,
+    'first_name': 1,
+    'last_name': 1,
+    'full_name': 1,
+    'has_fingerprint': 1,
+    'fingerprint_status': 1,
+    'is_active': 1,
+    '_id': 0
+}
+
+# Latest full snapshot per sync scope (all users, or one company/site)
+_cache_lock = threading.Lock()
+_cached_snapshots = {}
+
+
+class SnapshotPayload:
+    """Serialized snapshot ready to be written to the response"""
+    __slots__ = ('version', 'body', 'gzipped', 'count')
+
+    def __init__(self, version, body, count):
+        self.version = version
+        self.body = body
+        self.gzipped = gzip.compress(body, compresslevel=6)
+        self.count = count
+
+
+def _snapshot_row(user):
+    """Compact row matching SNAPSHOT_FIELDS"""
+    name = user.get('full_name') or f"{user.get('first_name', '')} {user.get('last_name', '')}".strip()
+    enrolled = bool(user.get('has_fingerprint')) or user.get('fingerprint_status') == 'ENROLLED'
+    return [
+        user.get('employee_id'),
+        user.get('biometric_id'),
+        name,
+        enrolled,
+        user.get('is_active', True)
+    ]
+
+
+def _serialize(version, rows, delta):
+    payload = {
+        'version': version,
+        'delta': delta,
+        'fields': SNAPSHOT_FIELDS,
+        'users': rows
+    }
+    body = json.dumps(payload, separators=(',', ':'), default=str).encode('utf-8')
+    return SnapshotPayload(version, body, len(rows))
+
+
+def get_users_version():
+    """
+    Users-collection version snapshots and deltas report: the latest one
+    whose sync_version stamps are all written
+    """
+    return get_stamped_users_version()
+
+
+def _scope_key(scope):
+    # Scope values may be operator documents (e.g. site_id $in), which aren't hashable
+    return tuple((field, repr(value)) for field, value in sorted(scope.items())) if scope else ()
+
+
+def get_full_snapshot(scope=None):
+    """
+    Snapshot of all active users (optionally limited to a device's
+    company/site), rebuilt only when the users version moves
+    """
+    version = get_users_version()
+    key = _scope_key(scope)
+    cached = _cached_snapshots.get(key)
+    if cached and cached.version == version:
+        return cached
+
+    db = get_db()
+    query = {'is_active': {'$ne': False}}
+    if scope:
+        query.update(scope)
+
+    rows = [_snapshot_row(user) for user in db.users.find(query, SNAPSHOT_PROJECTION)]
+    snapshot = _serialize(version, rows, delta=False)
+
+    with _cache_lock:
+        current = _cached_snapshots.get(key)
+        if not current or current.version <= version:
+            _cached_snapshots[key] = snapshot
+
+    logger.info(f"Terminal snapshot rebuilt for scope {key or 'all'}: {snapshot.count} users, "
+                f"{len(snapshot.body)} bytes ({len(snapshot.gzipped)} gzipped), version {version}")
+    return snapshot
+
+
+def get_delta_snapshot(since, scope=None):
+    """
+    Users changed after version `since`, including deactivated ones so
+    terminals can drop them
+    With a scope, only users in it or that were in it (previous_scopes,
+    recorded when a user moves to another company or site) are read; the
+    ones that left are sent as inactive rows without a name, so the
+    terminal drops them too.
+    """
+    version = get_users_version()
+    if since >= version:
+        return _serialize(version, [], delta=True)
+
+    db = get_db()
+    query = {'sync_version': {'$gt': since}}
+    if scope:
+        query['$or'] = [scope, {'previous_scopes': {'$elemMatch': scope}}]
+    changed = list(db.users.find(query, dict(SNAPSHOT_PROJECTION, _id=1)))
+
+    in_scope = None
+    if scope and changed:
+        in_scope = {
+            user['_id'] for user in
+            db.users.find(dict(scope, sync_version={'$gt': since}), {'_id': 1})
+        }
+
+    rows = []
+    for user in changed:
+        if in_scope is not None and user['_id'] not in in_scope:
+            rows.append([user.get('employee_id'), user.get('biometric_id'), '', False, False])
+        else:
+            rows.append(_snapshot_row(user))
+    return _serialize(version, rows, delta=True)
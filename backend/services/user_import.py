@@ -0,0 +1,219 @@
+"""
+User Import Service - Bulk employee onboarding from CSV or NDJSON
+All rows are validated up front; employee numbers are reserved in one
+allocator call, passwords are hashed on a process pool and the users are
+written with a single unordered insert_many.
+"""
+from models.counter_model import (
+    EMPLOYEE_SEQUENCE, MIN_EMPLOYEE_NUMBER, bump_sequence, format_employee_id, reserve_employee_numbers
+)
+from models.user_model import create_users_bulk
+from utils.password_utils import hash_passwords_in_processes, is_password_hash
+from config import Config
+from datetime import datetime
+import csv
+import io
+import json
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+
+REQUIRED_FIELDS = ('email', 'first_name', 'last_name')
+
+# Columns copied from the file; anything else is ignored
+IMPORT_FIELDS = (
+    'email', 'password', 'first_name', 'last_name', 'employee_id', 'role',
+    'department', 'position', 'phone', 'hire_date', 'site_id'
+)
+
+IMPORT_ROLES = ('employee', 'supervisor', 'admin')
+
+MAX_IMPORT_ROWS = 50000
+
+_email_pattern = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+
+def detect_format(filename=None, content_type=None, explicit=None):
+    """Pick csv or ndjson from an explicit value, file extension or content type"""
+    if explicit:
+        return explicit.lower()
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith('.ndjson') or name.endswith('.jsonl'):
+        return 'ndjson'
+    if content_type and 'csv' in content_type:
+        return 'csv'
+    return 'ndjson'
+
+
+def parse_rows(text, fmt):
+    """
+    Parse CSV (header row required) or NDJSON text into row dicts
+    Returns (rows, errors); rows are numbered from 1 in file order
+    """
+    rows = []
+    errors = []
+
+    if fmt == 'csv':
+        reader = csv.DictReader(io.StringIO(text))
+        for number, row in enumerate(reader, start=1):
+            rows.append((number, {key.strip(): (value or '').strip() for key, value in row.items() if key}))
+    elif fmt == 'ndjson':
+        number = 0
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            number += 1
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                errors.append({'row': number, 'error': f'Invalid JSON: {e}'})
+                continue
+            if not isinstance(row, dict):
+                errors.append({'row': number, 'error': 'Each line must be a JSON object'})
+                continue
+            rows.append((number, row))
+    else:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+    return rows, errors
+
+
+def validate_rows(rows, default_password=None, allowed_roles=IMPORT_ROLES):
+    """
+    Check every row before anything is written
+    Returns (valid, errors) where valid is a list of (row_number, user_data)
+    """
+    valid = []
+    errors = []
+    seen_emails = set()
+    seen_employee_ids = set()
+
+    for number, row in rows:
+        user_data = {
+            field: str(row[field]).strip() for field in IMPORT_FIELDS
+            if row.get(field) not in (None, '')
+        }
+        user_data.setdefault('role', 'employee')
+        if not user_data.get('password') and default_password:
+            user_data['password'] = default_password
+
+        missing = [field for field in REQUIRED_FIELDS + ('password',) if not user_data.get(field)]
+        if missing:
+            errors.append({'row': number, 'error': f"Missing required fields: {', '.join(missing)}"})
+            continue
+        if not _email_pattern.match(user_data['email']):
+            errors.append({'row': number, 'error': 'Invalid email'})
+            continue
+        if user_data['role'] not in allowed_roles:
+            errors.append({'row': number, 'error': f"Role must be one of: {', '.join(allowed_roles)}"})
+            continue
+        if user_data['email'] in seen_emails:
+            errors.append({'row': number, 'error': 'Duplicate email in file'})
+            continue
+        if user_data.get('employee_id') and user_data['employee_id'] in seen_employee_ids:
+            errors.append({'row': number, 'error': 'Duplicate employee ID in file'})
+            continue
+
+        seen_emails.add(user_data['email'])
+        if user_data.get('employee_id'):
+            seen_employee_ids.add(user_data['employee_id'])
+        valid.append((number, user_data))
+
+    return valid, errors
+
+
+def _explicit_number(employee_id):
+    """Employee number of an explicit EMP#### id usable as biometric ID, else None"""
+    if employee_id and employee_id.startswith('EMP'):
+        try:
+            number = int(employee_id[3:])
+        except ValueError:
+            return None
+        if number >= MIN_EMPLOYEE_NUMBER:
+            return number
+    return None
+
+
+def import_users(text, fmt, company_id, default_password=None, allowed_roles=IMPORT_ROLES, dry_run=False):
+    """
+    Import users from CSV/NDJSON text into company_id
+    Returns a summary with per-row errors (row numbers follow the file)
+    """
+    if fmt not in IMPORT_FORMATS:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+    rows, parse_errors = parse_rows(text, fmt)
+    if len(rows) > MAX_IMPORT_ROWS:
+        raise ValueError(f"Imports are limited to {MAX_IMPORT_ROWS} rows")
+
+    valid, validation_errors = validate_rows(rows, default_password, allowed_roles)
+    errors = parse_errors + validation_errors
+
+    summary = {
+        'total': len(rows) + len(parse_errors),
+        'valid': len(valid),
+        'created': 0,
+        'failed': 0,
+        'dry_run': dry_run,
+        'errors': errors,
+        'users': []
+    }
+
+    if dry_run or not valid:
+        errors.sort(key=lambda error: error['row'])
+        summary['failed'] = len(errors)
+        return summary
+
+    # Explicit EMP#### ids keep their number; everything else comes from
+    # one reserved block (explicit numbers are excluded from reuse first)
+    explicit_numbers = [_explicit_number(user_data.get('employee_id')) for _, user_data in valid]
+    highest_explicit = max((n for n in explicit_numbers if n), default=None)
+    if highest_explicit:
+        bump_sequence(EMPLOYEE_SEQUENCE, highest_explicit)
+
+    needed = sum(1 for n in explicit_numbers if not n)
+    reserved = iter(reserve_employee_numbers(needed)) if needed else iter(())
+
+    now = datetime.utcnow()
+    for (_, user_data), explicit in zip(valid, explicit_numbers):
+        number = explicit or next(reserved)
+        user_data.setdefault('employee_id', format_employee_id(number))
+        user_data['biometric_id'] = number
+        user_data['company_id'] = company_id
+        user_data['created_at'] = now
+        user_data['imported_at'] = now
+
+    # Distinct passwords are hashed once each, in parallel processes
+    hashed = hash_passwords_in_processes(
+        [user_data['password'] for _, user_data in valid if not is_password_hash(user_data['password'])],
+        rounds=Config.PASSWORD_IMPORT_HASH_ROUNDS
+    )
+    for _, user_data in valid:
+        user_data['password'] = hashed.get(user_data['password'], user_data['password'])
+
+    results = create_users_bulk([user_data for _, user_data in valid])
+
+    for (number, user_data), result in zip(valid, results):
+        if result['success']:
+            summary['created'] += 1
+            summary['users'].append({
+                'row': number,
+                'user_id': result['user_id'],
+                'email': user_data['email'],
+                'employee_id': result['employee_id'],
+                'biometric_id': result['biometric_id']
+            })
+        else:
+            errors.append({'row': number, 'error': result['error']})
+
+    errors.sort(key=lambda error: error['row'])
+    summary['failed'] = len(errors)
+
+    logger.info(f"Imported {summary['created']} users into company {company_id} "
+                f"({summary['failed']} rows failed)")
+    return summary
@@ -0,0 +1,311 @@
+"""
+Vacation Balance Service - Ledger of earned/used/balance days per employee
+vacation_used/vacation_balance are moved with $inc when annual leave is
+approved, cancelled or deleted; vacation_earned grows through the monthly
+accrual job (keyed on vacation_accrued_through). Full recalculation
+rebuilds the ledger and reconciliation checks it against the leaves.
+Used days come from one $group over approved annual leaves and updates go
+out in chunked bulk writes.
+"""
+from database import get_db
+from models.settings_model import get_settings
+from models.user_model import user_invalidated
+from services.job_runner import schedule_job
+from pymongo import UpdateOne
+from datetime import datetime, timedelta
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+RECALCULATE_BALANCES_JOB = 'recalculate_vacation_balances'
+ACCRUE_BALANCES_JOB = 'accrue_vacation_days'
+RECONCILE_BALANCES_JOB = 'reconcile_vacation_ledger'
+
+# Accrual only touches employees not yet accrued this month, so it can run often
+ACCRUAL_INTERVAL_SECONDS = 6 * 3600
+RECONCILIATION_INTERVAL_SECONDS = 24 * 3600
+
+RECALCULATION_CHUNK_SIZE = 1000
+
+DEFAULT_MONTHLY_VACATION_DAYS = 2.5
+
+DEFAULT_PROBATION_MONTHS = 3
+
+# Reconciliation is low priority: small chunks with a pause between them
+RECONCILIATION_CHUNK_SIZE = 200
+RECONCILIATION_PAUSE_SECONDS = 0.2
+
+# Float drift below this is not worth a write
+LEDGER_TOLERANCE = 0.001
+
+# Reviews change a leave's status before they $inc the ledger; employees
+# with an annual leave reviewed this recently are left to the next run
+RECONCILIATION_SETTLE_SECONDS = 300
+
+EMPLOYEES_WITH_HIRE_DATE = {'role': 'employee', 'hire_date': {'$exists': True, '$nin': [None, '']}}
+
+
+def parse_hire_date(value):
+    """hire_date as a datetime (stored as datetime or ISO string), None if unusable"""
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, str) and value:
+        try:
+            return datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    return None
+
+
+def accrual_month(today=None):
+    """Ledger month key, e.g. '2026-10'"""
+    return (today or datetime.utcnow()).strftime('%Y-%m')
+
+
+def calculate_earned_days(hire_date, settings, today=None):
+    """
+    Vacation days earned since hire_date, excluding the probation period
+    Returns (earned_days, months_service, months_after_probation)
+    """
+    today = today or datetime.utcnow()
+    months_service = (today.year - hire_date.year) * 12 + (today.month - hire_date.month)
+    months_after_probation = max(0, months_service - settings.get('probation_period_months', DEFAULT_PROBATION_MONTHS))
+    earned_days = months_after_probation * settings.get('monthly_vacation_days', DEFAULT_MONTHLY_VACATION_DAYS)
+    return earned_days, months_service, months_after_probation
+
+
+def get_used_vacation_days(user_ids=None):
+    """Approved annual leave days per user_id (string), in one aggregation"""
+    db = get_db()
+    match = {'status': 'approved', 'leave_type': 'annual'}
+    if user_ids is not None:
+        match['user_id'] = {'$in': [str(user_id) for user_id in user_ids]}
+    return {
+        row['_id']: row['days'] for row in db.leaves.aggregate([
+            {'$match': match},
+            {'$group': {'_id': '$user_id', 'days': {'$sum': '$days'}}}
+        ])
+    }
+
+
+def _chunks(cursor, size):
+    chunk = []
+    for doc in cursor:
+        chunk.append(doc)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _recently_reviewed(user_ids, now):
+    """user_ids (strings) with an annual leave reviewed within the settle window"""
+    db = get_db()
+    return set(db.leaves.distinct('user_id', {
+        'user_id': {'$in': [str(user_id) for user_id in user_ids]},
+        'leave_type': 'annual',
+        'reviewed_at': {'$gte': now - timedelta(seconds=RECONCILIATION_SETTLE_SECONDS)}
+    }))
+
+
+def _ledger_written(user_ids):
+    """Drop cached principals of a chunk of ledger writes (terminals never see the ledger)"""
+    user_invalidated(user_ids)
+
+
+def _ledger_reset(employee, earned, used, month, now):
+    """Overwrite an employee's ledger with freshly computed values"""
+    return UpdateOne(
+        {'_id': employee['_id']},
+        {'$set': {
+            'vacation_balance': earned - used,
+            'vacation_earned': earned,
+            'vacation_used': used,
+            'vacation_accrued_through': month,
+            'updated_at': now
+        }}
+    )
+
+
+def recalculate_vacation_balances(progress=None, settings=None):
+    """
+    Rebuild the ledger of every employee with a hire date
+    progress(processed, total) is called after each chunk
+    """
+    db = get_db()
+    settings = settings or get_settings()
+    if not settings:
+        raise ValueError('Settings not found')
+
+    total = db.users.count_documents(EMPLOYEES_WITH_HIRE_DATE)
+    if progress:
+        progress(0, total)
+
+    used_days = get_used_vacation_days()
+    today = datetime.utcnow()
+    month = accrual_month(today)
+
+    processed = 0
+    updated = 0
+    skipped = 0
+    cursor = db.users.find(EMPLOYEES_WITH_HIRE_DATE, {'hire_date': 1}, batch_size=RECALCULATION_CHUNK_SIZE)
+    for chunk in _chunks(cursor, RECALCULATION_CHUNK_SIZE):
+        operations = []
+        for employee in chunk:
+            hire_date = parse_hire_date(employee.get('hire_date'))
+            if not hire_date:
+                skipped += 1
+                continue
+            earned, _, _ = calculate_earned_days(hire_date, settings, today)
+            operations.append(_ledger_reset(employee, earned, used_days.get(str(employee['_id']), 0), month, today))
+
+        if operations:
+            updated += db.users.bulk_write(operations, ordered=False).modified_count
+            _ledger_written(employee['_id'] for employee in chunk)
+        processed += len(chunk)
+        if progress:
+            progress(processed, total)
+
+    logger.info(f"Recalculated vacation balances for {processed - skipped} employees")
+    return {'processed': processed, 'updated': updated, 'skipped': skipped}
+
+
+def accrue_vacation_days(progress=None, settings=None):
+    """
+    Monthly accrual: add the days earned since each employee's last accrued
+    month with $inc (so concurrent approvals are never overwritten)
+    Employees already accrued for this month are not touched; employees
+    without a ledger yet get it initialized from their leaves.
+    """
+    db = get_db()
+    settings = settings or get_settings()
+    if not settings:
+        raise ValueError('Settings not found')
+
+    today = datetime.utcnow()
+    month = accrual_month(today)
+    query = dict(EMPLOYEES_WITH_HIRE_DATE, vacation_accrued_through={'$ne': month})
+    projection = {'hire_date': 1, 'vacation_earned': 1, 'vacation_accrued_through': 1}
+
+    total = db.users.count_documents(query)
+    if progress:
+        progress(0, total)
+
+    processed = 0
+    accrued = 0
+    initialized = 0
+    cursor = db.users.find(query, projection, batch_size=RECALCULATION_CHUNK_SIZE)
+    for chunk in _chunks(cursor, RECALCULATION_CHUNK_SIZE):
+        uninitialized = [employee['_id'] for employee in chunk if 'vacation_accrued_through' not in employee]
+        used_days = get_used_vacation_days(uninitialized) if uninitialized else {}
+
+        operations = []
+        for employee in chunk:
+            hire_date = parse_hire_date(employee.get('hire_date'))
+            if not hire_date:
+                continue
+            earned, _, _ = calculate_earned_days(hire_date, settings, today)
+
+            if 'vacation_accrued_through' not in employee:
+                operations.append(_ledger_reset(employee, earned, used_days.get(str(employee['_id']), 0), month, today))
+                initialized += 1
+                continue
+
+            delta = earned - employee.get('vacation_earned', 0)
+            # Conditional on the month we read: a concurrent run can't accrue twice
+            operations.append(UpdateOne(
+                {'_id': employee['_id'], 'vacation_accrued_through': employee['vacation_accrued_through']},
+                {
+                    '$inc': {'vacation_earned': delta, 'vacation_balance': delta},
+                    '$set': {'vacation_accrued_through': month, 'updated_at': today}
+                }
+            ))
+            accrued += 1
+
+        if operations:
+            db.users.bulk_write(operations, ordered=False)
+            _ledger_written(employee['_id'] for employee in chunk)
+        processed += len(chunk)
+        if progress:
+            progress(processed, total)
+
+    logger.info(f"Vacation accrual for {month}: {accrued} accrued, {initialized} initialized")
+    return {'month': month, 'processed': processed, 'accrued': accrued, 'initialized': initialized}
+
+
+def reconcile_vacation_ledger(progress=None, fix=True, pause=RECONCILIATION_PAUSE_SECONDS):
+    """
+    Check vacation_used against the approved annual leaves and
+    vacation_balance against earned - used, correcting drift with $inc
+    Runs in small throttled chunks so it can share the database with traffic.
+    Employees whose leaves were just reviewed are skipped: the review's own
+    $inc may not have landed yet, and correcting for it would charge twice.
+    """
+    db = get_db()
+    query = {'role': 'employee', 'vacation_accrued_through': {'$exists': True}}
+    projection = {'vacation_earned': 1, 'vacation_used': 1, 'vacation_balance': 1}
+
+    total = db.users.count_documents(query)
+    if progress:
+        progress(0, total)
+
+    processed = 0
+    drifted = []
+    fixed = 0
+    settling = 0
+    cursor = db.users.find(query, projection, batch_size=RECONCILIATION_CHUNK_SIZE)
+    for chunk in _chunks(cursor, RECONCILIATION_CHUNK_SIZE):
+        chunk_ids = [employee['_id'] for employee in chunk]
+        used_days = get_used_vacation_days(chunk_ids)
+        reviewed = _recently_reviewed(chunk_ids, datetime.utcnow())
+
+        operations = []
+        chunk_drifted = []
+        for employee in chunk:
+            if str(employee['_id']) in reviewed:
+                settling += 1
+                continue
+            ledger_used = employee.get('vacation_used', 0)
+            ledger_balance = employee.get('vacation_balance', 0)
+            expected_used = used_days.get(str(employee['_id']), 0)
+            expected_balance = employee.get('vacation_earned', 0) - expected_used
+
+            used_drift = expected_used - ledger_used
+            balance_drift = expected_balance - ledger_balance
+            if abs(used_drift) < LEDGER_TOLERANCE and abs(balance_drift) < LEDGER_TOLERANCE:
+                continue
+
+            drifted.append({'user_id': str(employee['_id']), 'used_drift': used_drift, 'balance_drift': balance_drift})
+            chunk_drifted.append(employee)
+            # Skipped if an approval/cancellation moved the ledger since we read it
+            operations.append(UpdateOne(
+                {'_id': employee['_id'], 'vacation_used': ledger_used, 'vacation_balance': ledger_balance},
+                {
+                    '$inc': {'vacation_used': used_drift, 'vacation_balance': balance_drift},
+                    '$set': {'updated_at': datetime.utcnow()}
+                }
+            ))
+
+        if fix and operations:
+            fixed += db.users.bulk_write(operations, ordered=False).modified_count
+            _ledger_written(employee['_id'] for employee in chunk_drifted)
+        processed += len(chunk)
+        if progress:
+            progress(processed, total)
+        if pause:
+            time.sleep(pause)
+
+    if drifted:
+        logger.warning(f"Vacation ledger drift on {len(drifted)} employees ({fixed} fixed)")
+    return {
+        'processed': processed, 'drifted': len(drifted), 'fixed': fixed,
+        'skipped_settling': settling, 'samples': drifted[:20]
+    }
+
+
+def schedule_balance_jobs():
+    """Start the periodic accrual and reconciliation jobs"""
+    schedule_job(ACCRUE_BALANCES_JOB, accrue_vacation_days, ACCRUAL_INTERVAL_SECONDS)
+    schedule_job(RECONCILE_BALANCES_JOB, reconcile_vacation_ledger, RECONCILIATION_INTERVAL_SECONDS, initial_delay=3600)
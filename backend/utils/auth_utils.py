@@ -1,19 +1,97 @@
 """
 Authentication Utilities
 """
-from flask_jwt_extended import get_jwt_identity
-from models.user_model import find_user_by_id
+from flask_jwt_extended import get_jwt, get_jwt_identity
+from models.user_model import find_user_by_id, on_user_changed, on_user_invalidated
+from models.token_revocation_model import TOKEN_CLAIM_FIELDS, TOKEN_VERSION_CLAIM
 from functools import wraps
-from flask import jsonify
+from flask import jsonify, g
+import threading
+import copy
+import time
+
+# Authenticated users are cached briefly per process; writes through
+# user_model invalidate their entry immediately
+PRINCIPAL_CACHE_TTL = 30
+PRINCIPAL_CACHE_MAX_SIZE = 10000
+
+_principal_cache = {}
+_principal_lock = threading.Lock()
+
+def _load_principal(user_id):
+    """Get a user from the process cache, falling back to one database read"""
+    now = time.monotonic()
+    cached = _principal_cache.get(user_id)
+    if cached and cached[0] > now:
+        return copy.deepcopy(cached[1])
+
+    user = find_user_by_id(user_id)
+    if user:
+        # Password hashes never need to live in the cache
+        user.pop('password', None)
+        with _principal_lock:
+            if len(_principal_cache) >= PRINCIPAL_CACHE_MAX_SIZE:
+                _principal_cache.clear()
+            _principal_cache[user_id] = (now + PRINCIPAL_CACHE_TTL, copy.deepcopy(user))
+    return user
+
+@on_user_changed
+def invalidate_principals(users):
+    """Drop cached principals for users that were just written"""
+    drop_principals(str(user['_id']) for user in users)
+
+@on_user_invalidated
+def drop_principals(user_ids):
+    """Drop cached principals by user id"""
+    with _principal_lock:
+        for user_id in user_ids:
+            _principal_cache.pop(user_id, None)
+
+def get_current_user():
+    """
+    Get the authenticated user, loaded at most once per request
+    """
+    if 'current_user' not in g:
+        g.current_user = _load_principal(get_jwt_identity())
+    return g.current_user
+
+def build_token_claims(user, token_version):
+    """
+    Additional access token claims used for authorization checks
+    token_version comes from get_token_version(), read before user was loaded
+    """
+    claims = {TOKEN_VERSION_CLAIM: token_version}
+    for field in TOKEN_CLAIM_FIELDS:
+        value = user.get(field)
+        claims[field] = str(value) if value is not None else None
+    return claims
+
+def get_current_principal():
+    """
+    Get the authenticated user's id, role and company_id, from the token
+    claims when present (no database read), else from the user document
+    """
+    claims = get_jwt()
+    if all(field in claims for field in TOKEN_CLAIM_FIELDS):
+        principal = {field: claims[field] for field in TOKEN_CLAIM_FIELDS}
+        principal['_id'] = get_jwt_identity()
+        return principal
+    
+    # Tokens issued before claims were embedded
+    current_user = get_current_user()
+    if not current_user:
+        return None
+    principal = {field: current_user.get(field) for field in TOKEN_CLAIM_FIELDS}
+    principal['_id'] = current_user['_id']
+    return principal
 
 def admin_required(fn):
     """Decorator to require admin role"""
     @wraps(fn)
     def wrapper(*args, **kwargs):
-        current_user_id = get_jwt_identity()
-        current_user = find_user_by_id(current_user_id)
+        principal = get_current_principal()
         
-        if not current_user or current_user.get('role') != 'admin':
+        if not principal or principal.get('role') != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
         return fn(*args, **kwargs)
@@ -24,10 +102,9 @@ def admin_or_supervisor_required(fn):
     """Decorator to require admin or supervisor role"""
     @wraps(fn)
     def wrapper(*args, **kwargs):
-        current_user_id = get_jwt_identity()
-        current_user = find_user_by_id(current_user_id)
+        principal = get_current_principal()
         
-        if not current_user or current_user.get('role') not in ['admin', 'supervisor']:
+        if not principal or principal.get('role') not in ['admin', 'supervisor']:
             return jsonify({'error': 'Admin or Supervisor access required'}), 403
         
         return fn(*args, **kwargs)
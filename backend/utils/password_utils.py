@@ -0,0 +1,165 @@
+"""
+Password Hashing Utilities
+bcrypt/scrypt run on a bounded worker pool (bcrypt releases the GIL), so a
+login burst is limited to a fixed number of concurrent hashes instead of
+oversubscribing the CPU from every request thread. Requests that cannot get
+a slot in time are shed instead of queueing without bound.
+"""
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from config import Config
+import multiprocessing
+import threading
+import time
+import logging
+import bcrypt
+
+logger = logging.getLogger(__name__)
+
+BCRYPT_PREFIXES = ('$2b$', '$2a$')
+
+
+class PasswordHashingBusy(Exception):
+    """Raised when the hashing queue is full"""
+
+
+_executor = ThreadPoolExecutor(max_workers=Config.PASSWORD_HASH_WORKERS, thread_name_prefix='password-hash')
+_slots = threading.BoundedSemaphore(Config.PASSWORD_HASH_WORKERS + Config.PASSWORD_HASH_MAX_QUEUE)
+_metrics_lock = threading.Lock()
+_metrics = {
+    'in_flight': 0,
+    'peak_in_flight': 0,
+    'completed': 0,
+    'rejected': 0,
+    'total_wait_ms': 0.0,
+    'max_wait_ms': 0.0
+}
+
+
+def _run(fn, *args, block=False):
+    """Run fn on the hashing pool and wait for its result"""
+    acquired = _slots.acquire() if block else _slots.acquire(timeout=Config.PASSWORD_HASH_QUEUE_TIMEOUT)
+    if not acquired:
+        with _metrics_lock:
+            _metrics['rejected'] += 1
+        raise PasswordHashingBusy('Password hashing queue is full')
+
+    queued_at = time.monotonic()
+    with _metrics_lock:
+        _metrics['in_flight'] += 1
+        _metrics['peak_in_flight'] = max(_metrics['peak_in_flight'], _metrics['in_flight'])
+
+    def task():
+        wait_ms = (time.monotonic() - queued_at) * 1000
+        with _metrics_lock:
+            _metrics['total_wait_ms'] += wait_ms
+            _metrics['max_wait_ms'] = max(_metrics['max_wait_ms'], wait_ms)
+        return fn(*args)
+
+    try:
+        return _executor.submit(task).result()
+    finally:
+        _slots.release()
+        with _metrics_lock:
+            _metrics['in_flight'] -= 1
+            _metrics['completed'] += 1
+
+
+def _hash(password, rounds=None):
+    salt = bcrypt.gensalt(rounds=rounds or Config.PASSWORD_HASH_ROUNDS)
+    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+
+
+def _check(password, stored_password):
+    if isinstance(stored_password, bytes):
+        return bcrypt.checkpw(password.encode('utf-8'), stored_password)
+    if stored_password.startswith(BCRYPT_PREFIXES):
+        return bcrypt.checkpw(password.encode('utf-8'), stored_password.encode('utf-8'))
+    if stored_password.startswith('scrypt:') or stored_password.startswith('pbkdf2:'):
+        from werkzeug.security import check_password_hash
+        return check_password_hash(stored_password, password)
+    # Legacy plaintext; replaced by a proper hash on the next successful login
+    logger.warning("Using plain text password comparison - password will be rehashed on login")
+    return stored_password == password
+
+
+def is_password_hash(value):
+    """True if value is already a bcrypt hash"""
+    return isinstance(value, str) and value.startswith(BCRYPT_PREFIXES)
+
+
+def hash_password(password):
+    """
+    Hash a password with the configured bcrypt cost on the hashing pool
+    """
+    return _run(_hash, password)
+
+
+def hash_passwords(passwords):
+    """
+    Hash several passwords, waiting for pool slots instead of shedding
+    Returns {password: hash}
+    """
+    unique = list(dict.fromkeys(passwords))
+    results = {}
+    with ThreadPoolExecutor(max_workers=min(len(unique), Config.PASSWORD_HASH_WORKERS) or 1) as submitter:
+        futures = {password: submitter.submit(_run, _hash, password, block=True) for password in unique}
+        for password, future in futures.items():
+            results[password] = future.result()
+    return results
+
+
+def hash_passwords_in_processes(passwords, rounds=None, workers=None):
+    """
+    Hash many passwords on a process pool (bulk imports); identical
+    passwords are hashed once. Returns {password: hash}
+    """
+    unique = list(dict.fromkeys(passwords))
+    if not unique:
+        return {}
+    rounds = rounds or Config.PASSWORD_HASH_ROUNDS
+    workers = min(len(unique), workers or Config.PASSWORD_IMPORT_WORKERS)
+
+    if workers <= 1:
+        return {password: _hash(password, rounds) for password in unique}
+
+    # spawn: the parent holds MongoDB and thread pools that must not be forked
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        hashes = pool.map(_hash, unique, [rounds] * len(unique), chunksize=max(1, len(unique) // (workers * 4)))
+        return dict(zip(unique, hashes))
+
+
+def check_password(password, stored_password):
+    """
+    Check a password against a bcrypt, Werkzeug or legacy plaintext value
+    on the hashing pool
+    """
+    if not stored_password or not isinstance(stored_password, (str, bytes)):
+        return False
+    return _run(_check, password, stored_password)
+
+
+def needs_rehash(stored_password):
+    """
+    True unless the stored value is a bcrypt hash with the configured cost
+    """
+    if not is_password_hash(stored_password):
+        return True
+    try:
+        return int(stored_password.split('$')[2]) != Config.PASSWORD_HASH_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+
+def get_hashing_metrics():
+    """
+    Snapshot of hashing pool load
+    """
+    with _metrics_lock:
+        metrics = dict(_metrics)
+    metrics['workers'] = Config.PASSWORD_HASH_WORKERS
+    metrics['max_queue'] = Config.PASSWORD_HASH_MAX_QUEUE
+    metrics['queue_depth'] = max(0, metrics['in_flight'] - Config.PASSWORD_HASH_WORKERS)
+    metrics['avg_wait_ms'] = round(metrics['total_wait_ms'] / metrics['completed'], 2) if metrics['completed'] else 0.0
+    metrics['rounds'] = Config.PASSWORD_HASH_ROUNDS
+    return metrics
@@ -0,0 +1,61 @@
+"""
+Projection Utilities - Sparse fieldsets (?fields=a,b,c) for list endpoints
+"""
+import re
+
+# Never returned by list endpoints, even when requested explicitly
+FORBIDDEN_FIELDS = {'password'}
+
+MAX_FIELDS = 50
+
+_field_pattern = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z0-9_]+)*$')
+
+
+def parse_fields(value):
+    """
+    Turn a comma-separated fields parameter into a Mongo inclusion projection
+    Returns None when no (valid) fields were requested; _id is always included
+    and subfields of an included field are dropped
+    """
+    if not value:
+        return None
+
+    fields = []
+    for field in str(value).split(','):
+        field = field.strip()
+        if not field or field.split('.')[0] == '_id' or not _field_pattern.match(field):
+            continue
+        if field.split('.')[0] in FORBIDDEN_FIELDS:
+            continue
+        if field not in fields:
+            fields.append(field)
+
+    # Mongo rejects a projection holding both a path and one of its
+    # children (path collision), whichever order they were requested in
+    requested = set(fields)
+    fields = [
+        field for field in fields
+        if not any('.'.join(field.split('.')[:depth]) in requested for depth in range(1, field.count('.') + 1))
+    ]
+
+    if not fields:
+        return None
+
+    projection = {field: 1 for field in fields[:MAX_FIELDS]}
+    projection['_id'] = 1
+    return projection
+
+
+def exclude_forbidden(projection=None):
+    """
+    Projection for collections holding secrets: the requested inclusion
+    projection, or everything except the forbidden fields
+    """
+    if projection:
+        return projection
+    return {field: 0 for field in FORBIDDEN_FIELDS}
+
+
+def includes(projection, *fields):
+    """True if any of fields is returned under projection (None = all fields)"""
+    return projection is None or any(field in projection for field in fields)
@@ -0,0 +1,75 @@
+"""
+Rate Limiting Utilities - In-process token buckets
+"""
+from collections import OrderedDict
+import threading
+import time
+
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `burst`"""
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, burst, now):
+        self.tokens = float(burst)
+        self.updated = now
+
+
+class RateLimiter:
+    """
+    Token bucket per key (device_id or client IP).
+    Least recently seen keys are evicted beyond max_keys so a flood of
+    spoofed ids cannot grow memory without bound.
+    """
+
+    def __init__(self, rate, burst, max_keys=10000):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self._allowed = 0
+        self._limited = 0
+        self._limited_by_key = {}
+
+    def consume(self, key, tokens=1):
+        """
+        Take tokens for key.
+        Returns (allowed, retry_after_seconds)
+        """
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(self.burst, now)
+                self._buckets[key] = bucket
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+                bucket.updated = now
+
+            if bucket.tokens >= tokens:
+                bucket.tokens -= tokens
+                self._allowed += 1
+                return True, 0
+
+            self._limited += 1
+            self._limited_by_key[key] = self._limited_by_key.get(key, 0) + 1
+            if len(self._limited_by_key) > self.max_keys:
+                self._limited_by_key.clear()
+            return False, (tokens - bucket.tokens) / self.rate
+
+    def stats(self, top=20):
+        """Counters for monitoring"""
+        with self._lock:
+            offenders = sorted(self._limited_by_key.items(), key=lambda item: item[1], reverse=True)[:top]
+            return {
+                'rate_per_second': self.rate,
+                'burst': self.burst,
+                'tracked_keys': len(self._buckets),
+                'allowed': self._allowed,
+                'limited': self._limited,
+                'top_limited': [{'key': key, 'limited': count} for key, count in offenders]
+            }